@@ -0,0 +1,93 @@
+import threading
+from typing import Any, Callable, Dict, List
+
+import telemetry
+from model_router import MODEL_ROUTING, ModelRouter
+
+# Lazily built autogen agents. autogen itself is only imported when the first
+# agent is built, so importing main or the Gradio apps stays cheap and worker
+# processes that never chat with an assistant never pay for it.
+
+AgentFactory = Callable[["AgentRegistry"], Any]
+
+class AgentRegistry:
+    """
+    Builds each agent on first use and hands out the same instance afterwards.
+
+    Factories take the registry, so they can read the (also lazily loaded)
+    llm_config or fetch other agents, e.g. a user proxy registering tools.
+    """
+
+    def __init__(self, llm_config_factory: Callable[[], Dict[str, Any]]):
+        self._llm_config_factory = llm_config_factory
+        self._llm_config = None
+        self._router = None
+        self._factories = {}
+        self._agents = {}
+        # Re-entrant, a factory may get() another agent while being built
+        self._lock = threading.RLock()
+
+    @property
+    def llm_config(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._llm_config is None:
+                self._llm_config = self._llm_config_factory()
+            return self._llm_config
+
+    @property
+    def router(self) -> ModelRouter:
+        """
+        The model router over llm_config, shared by the registry's assistants.
+        """
+        with self._lock:
+            if self._router is None:
+                self._router = ModelRouter(self.llm_config)
+            return self._router
+
+    def register(self, name: str, factory: AgentFactory) -> None:
+        with self._lock:
+            self._factories[name] = factory
+            self._agents.pop(name, None)
+
+    def factory(self, name: str) -> Callable[[AgentFactory], AgentFactory]:
+        """
+        Decorator form of register().
+        """
+        def decorator(factory: AgentFactory) -> AgentFactory:
+            self.register(name, factory)
+            return factory
+        return decorator
+
+    def get(self, name: str) -> Any:
+        with self._lock:
+            agent = self._agents.get(name)
+            if agent is None:
+                if name not in self._factories:
+                    raise KeyError(f"Unknown agent: {name}")
+                telemetry.instrument_autogen()
+                agent = self._factories[name](self)
+                self._agents[name] = agent
+            return agent
+
+    def built(self) -> List[str]:
+        """
+        Names of the agents that have been built so far.
+        """
+        with self._lock:
+            return list(self._agents)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._factories
+
+def assistant_factory(name: str, system_message: str) -> AgentFactory:
+    """
+    Factory for a plain AssistantAgent using the registry's llm_config, its
+    turns routed by the registry's model router unless MODEL_ROUTING is off.
+    """
+    def build(registry: AgentRegistry) -> Any:
+        from autogen import AssistantAgent
+        agent = AssistantAgent(name=name, llm_config=registry.llm_config, system_message=system_message)
+        if MODEL_ROUTING:
+            registry.router.attach(agent)
+        return agent
+    return build
@@ -0,0 +1,60 @@
+import os
+import secrets
+import tempfile
+import threading
+
+# Where the app keeps its private state: the application database, the PDF
+# and LLM caches and the install secret. LUCID_DATA_DIR moves all of it, by
+# default it is ~/.lucid. The directories hold applicants' documents and
+# conversations, so they are created readable by their owner only (0700).
+
+LUCID_DATA_DIR = os.getenv("LUCID_DATA_DIR", os.path.join(os.path.expanduser("~"), ".lucid"))
+
+def private_dir(path: str) -> str:
+    """
+    Create a directory readable by its owner only, tightening an existing one.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    os.chmod(path, 0o700)
+    return path
+
+def data_path(*parts: str) -> str:
+    """
+    A path inside LUCID_DATA_DIR, which is created first.
+    """
+    private_dir(LUCID_DATA_DIR)
+    return os.path.join(LUCID_DATA_DIR, *parts)
+
+_install_secret = None
+_install_secret_lock = threading.Lock()
+
+def install_secret() -> bytes:
+    """
+    A random key kept in LUCID_DATA_DIR (owner read/write only), created on
+    first use, for deriving cache keys from secrets such as PDF passwords.
+    """
+    global _install_secret
+    with _install_secret_lock:
+        if _install_secret is None:
+            path = data_path("install.key")
+            if not os.path.exists(path):
+                # The key is written in full to a temporary file first and then
+                # hard linked into place. The link fails if another process got
+                # there first, so concurrent first runs all read the one
+                # complete key that won.
+                fd, temporary = tempfile.mkstemp(prefix=".install.key.", dir=LUCID_DATA_DIR)
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(secrets.token_bytes(32))
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.link(temporary, path)
+                except FileExistsError:
+                    pass
+                finally:
+                    os.unlink(temporary)
+            with open(path, "rb") as f:
+                _install_secret = f.read()
+            if len(_install_secret) < 32:
+                raise ValueError(f"The install secret in {path} is shorter than 32 bytes")
+        return _install_secret
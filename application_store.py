@@ -0,0 +1,279 @@
+import atexit
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from app_paths import data_path
+
+# Where loan applications live. LUCID_STORE=memory keeps everything in
+# process, which is what tests and throwaway demos want. The SQLite database
+# is LUCID_DB_PATH, by default applications.db in the app's private data
+# directory (see app_paths).
+LUCID_STORE = os.getenv("LUCID_STORE", "sqlite")
+LUCID_DB_PATH = os.getenv("LUCID_DB_PATH", "")
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+class ApplicationStore(ABC):
+    """
+    Loan applications keyed by an application/session ID.
+
+    A record is {"application_id", "status", "email", "data", "created_at",
+    "updated_at"} where `data` holds the bank.json fields plus whatever the
+    verification steps add. Large artifacts (the TLSN proof, the raw email)
+    are stored next to the record rather than inside it.
+    """
+
+    @abstractmethod
+    def create(self, data: Dict[str, Any], application_id: str = None, status: str = "intake") -> str:
+        ...
+
+    @abstractmethod
+    def get(self, application_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def update(self, application_id: str, **fields) -> bool:
+        """
+        Atomically set individual data fields without rewriting the rest of the
+        record. Returns False if the application doesn't exist.
+        """
+
+    @abstractmethod
+    def set_status(self, application_id: str, status: str) -> bool:
+        ...
+
+    @abstractmethod
+    def find_by_email(self, email: str) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def find_by_status(self, status: str) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def save_artifact(self, application_id: str, kind: str, content: str) -> None:
+        ...
+
+    @abstractmethod
+    def get_artifact(self, application_id: str, kind: str) -> Optional[str]:
+        ...
+
+    def close(self) -> None:
+        """
+        Release what the store holds open, it may still be used afterwards.
+        """
+
+class InMemoryApplicationStore(ApplicationStore):
+    """
+    Dict backed store for tests, records are copied in and out.
+    """
+
+    def __init__(self):
+        self._records = {}
+        self._artifacts = {}
+        self._lock = threading.Lock()
+
+    def create(self, data: Dict[str, Any], application_id: str = None, status: str = "intake") -> str:
+        application_id = application_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._records[application_id] = {
+                "application_id": application_id,
+                "status": status,
+                "email": data.get("email"),
+                "data": copy.deepcopy(data),
+                "created_at": now,
+                "updated_at": now,
+            }
+        return application_id
+
+    def get(self, application_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(application_id)
+            return copy.deepcopy(record) if record is not None else None
+
+    def update(self, application_id: str, **fields) -> bool:
+        with self._lock:
+            record = self._records.get(application_id)
+            if record is None:
+                return False
+            record["data"].update(copy.deepcopy(fields))
+            if "email" in fields:
+                record["email"] = fields["email"]
+            record["updated_at"] = time.time()
+            return True
+
+    def set_status(self, application_id: str, status: str) -> bool:
+        with self._lock:
+            record = self._records.get(application_id)
+            if record is None:
+                return False
+            record["status"] = status
+            record["updated_at"] = time.time()
+            return True
+
+    def find_by_email(self, email: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [copy.deepcopy(r) for r in self._records.values() if r["email"] == email]
+
+    def find_by_status(self, status: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [copy.deepcopy(r) for r in self._records.values() if r["status"] == status]
+
+    def save_artifact(self, application_id: str, kind: str, content: str) -> None:
+        with self._lock:
+            self._artifacts[(application_id, kind)] = content
+
+    def get_artifact(self, application_id: str, kind: str) -> Optional[str]:
+        with self._lock:
+            return self._artifacts.get((application_id, kind))
+
+class SQLiteApplicationStore(ApplicationStore):
+    """
+    SQLite backed store. Each thread gets its own connection, the database
+    runs in WAL mode so readers don't block the writer, and partial updates
+    use json_set so only the touched fields change.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS applications (
+            application_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            email TEXT,
+            data TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_applications_email ON applications (email);
+        CREATE INDEX IF NOT EXISTS idx_applications_status ON applications (status);
+        CREATE TABLE IF NOT EXISTS artifacts (
+            application_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (application_id, kind)
+        );
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or LUCID_DB_PATH or data_path("applications.db")
+        self._local = threading.local()
+        # Every thread's connection, so they can be closed
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Only used by this thread, but closed from whichever thread calls close()
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                for thread in [thread for thread in self._connections if not thread.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def close(self) -> None:
+        """
+        Close every thread's connection, threads open a new one on their next call.
+        """
+        with self._connections_lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "application_id": row["application_id"],
+            "status": row["status"],
+            "email": row["email"],
+            "data": json.loads(row["data"]),
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def create(self, data: Dict[str, Any], application_id: str = None, status: str = "intake") -> str:
+        application_id = application_id or uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO applications (application_id, status, email, data, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (application_id, status, data.get("email"), json.dumps(data), now, now)
+            )
+        return application_id
+
+    def get(self, application_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute("SELECT * FROM applications WHERE application_id = ?", (application_id,)).fetchone()
+        return self._record(row) if row is not None else None
+
+    def update(self, application_id: str, **fields) -> bool:
+        if not fields:
+            return self.get(application_id) is not None
+        # json_set(data, '$."key"', json(value), ...) in a single statement
+        paths = ", ".join("?, json(?)" for _ in fields)
+        params = []
+        for key, value in fields.items():
+            if '"' in key:
+                raise ValueError(f"Invalid field name: {key}")
+            params.extend(['$."%s"' % key, json.dumps(value)])
+        assignments = f"data = json_set(data, {paths}), updated_at = ?"
+        params.append(time.time())
+        if "email" in fields:
+            assignments += ", email = ?"
+            params.append(fields["email"])
+        params.append(application_id)
+        with self._connection() as conn:
+            cursor = conn.execute(f"UPDATE applications SET {assignments} WHERE application_id = ?", params)
+        return cursor.rowcount > 0
+
+    def set_status(self, application_id: str, status: str) -> bool:
+        with self._connection() as conn:
+            cursor = conn.execute("UPDATE applications SET status = ?, updated_at = ? WHERE application_id = ?", (status, time.time(), application_id))
+        return cursor.rowcount > 0
+
+    def find_by_email(self, email: str) -> List[Dict[str, Any]]:
+        rows = self._connection().execute("SELECT * FROM applications WHERE email = ? ORDER BY created_at", (email,)).fetchall()
+        return [self._record(row) for row in rows]
+
+    def find_by_status(self, status: str) -> List[Dict[str, Any]]:
+        rows = self._connection().execute("SELECT * FROM applications WHERE status = ? ORDER BY created_at", (status,)).fetchall()
+        return [self._record(row) for row in rows]
+
+    def save_artifact(self, application_id: str, kind: str, content: str) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (application_id, kind, content, created_at) VALUES (?, ?, ?, ?)",
+                (application_id, kind, content, time.time())
+            )
+
+    def get_artifact(self, application_id: str, kind: str) -> Optional[str]:
+        row = self._connection().execute("SELECT content FROM artifacts WHERE application_id = ? AND kind = ?", (application_id, kind)).fetchone()
+        return row["content"] if row is not None else None
+
+def get_application_store() -> ApplicationStore:
+    """
+    Return the process wide application store, creating it on first use.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = InMemoryApplicationStore() if LUCID_STORE == "memory" else SQLiteApplicationStore()
+            atexit.register(_default_store.close)
+        return _default_store
@@ -0,0 +1,126 @@
+import functools
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Union
+
+from autogen.logger.base_logger import BaseLogger
+
+from telemetry import annotate, llm_cost, llm_duration, llm_tokens, tracer
+
+# autogen runtime logger that turns completions and tool calls into spans.
+# Kept apart from telemetry.py so that importing telemetry doesn't import autogen.
+
+def _source_name(source: Any) -> str:
+    return source if isinstance(source, str) else getattr(source, "name", None) or ""
+
+def _start_ns(start_time: str) -> int:
+    # autogen timestamps look like "2025-01-31 12:00:00.123456", in UTC
+    try:
+        return int(datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S.%f").replace(tzinfo=timezone.utc).timestamp() * 1e9)
+    except (TypeError, ValueError):
+        return time.time_ns()
+
+def _payload_size(value: Any) -> int:
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(str(value))
+
+class OpenTelemetryLogger(BaseLogger):
+    """
+    One llm.completion span per model call, with tokens, cost, cache hit and
+    request/response sizes. Tool calls only add their sizes to the agent.tool
+    span, autogen logs them after the fact and without a start time.
+    """
+
+    def start(self) -> str:
+        return str(uuid.uuid4())
+
+    def log_chat_completion(self, invocation_id: uuid.UUID, client_id: int, wrapper_id: int, source: Union[str, Any], request: Dict[str, Any], response: Any, is_cached: int, cost: float, start_time: str) -> None:
+        start_ns = _start_ns(start_time)
+        end_ns = time.time_ns()
+        agent = _source_name(source)
+        model = str(request.get("model", "")) if isinstance(request, dict) else ""
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+        span = tracer.start_span("llm.completion", start_time=start_ns, attributes={
+            "agent.name": agent,
+            "llm.model": model,
+            "llm.cached": bool(is_cached),
+            "llm.cost": float(cost or 0.0),
+            "llm.prompt_tokens": prompt_tokens,
+            "llm.completion_tokens": completion_tokens,
+            "llm.request_messages": len(request.get("messages") or []) if isinstance(request, dict) else 0,
+            "llm.request_bytes": _payload_size(request),
+            "llm.response_bytes": len(str(response)),
+            "llm.invocation_id": str(invocation_id),
+        })
+        span.end(end_time=end_ns)
+
+        labels = {"agent": agent, "model": model, "cached": bool(is_cached)}
+        llm_duration.record((end_ns - start_ns) / 1e9, labels)
+        llm_tokens.add(prompt_tokens, {**labels, "type": "prompt"})
+        llm_tokens.add(completion_tokens, {**labels, "type": "completion"})
+        llm_cost.add(float(cost or 0.0), labels)
+
+    def log_function_use(self, source: Union[str, Any], function: Any, args: Dict[str, Any], returns: Any) -> None:
+        # Called once the function has returned, inside the agent.tool span
+        # that instrument_tool_execution() opened around the call
+        annotate({
+            "tool.args_bytes": _payload_size(args),
+            "tool.result_bytes": _payload_size(returns),
+        })
+
+    def log_new_agent(self, agent: Any, init_args: Dict[str, Any] = {}) -> None:
+        pass
+
+    def log_event(self, source: Union[str, Any], name: str, **kwargs: Dict[str, Any]) -> None:
+        pass
+
+    def log_new_wrapper(self, wrapper: Any, init_args: Dict[str, Any] = {}) -> None:
+        pass
+
+    def log_new_client(self, client: Any, wrapper: Any, init_args: Dict[str, Any]) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def get_connection(self) -> None:
+        return None
+
+def _tool_attributes(agent: Any, func_call: Dict[str, Any]) -> Dict[str, Any]:
+    return {"agent.name": _source_name(agent), "tool.name": str(func_call.get("name", ""))}
+
+def instrument_tool_execution() -> None:
+    """
+    Run every agent's execute_function/a_execute_function inside an agent.tool
+    span, so the span covers the tool call from start to end and records
+    whether it succeeded.
+    """
+    from autogen import ConversableAgent
+    if getattr(ConversableAgent.execute_function, "_traced", False):
+        return
+    execute_function, a_execute_function = ConversableAgent.execute_function, ConversableAgent.a_execute_function
+
+    @functools.wraps(execute_function)
+    def traced_execute_function(self, func_call, *args, **kwargs):
+        with tracer.start_as_current_span("agent.tool", attributes=_tool_attributes(self, func_call)) as span:
+            success, result = execute_function(self, func_call, *args, **kwargs)
+            span.set_attribute("tool.success", success)
+            return success, result
+
+    @functools.wraps(a_execute_function)
+    async def traced_a_execute_function(self, func_call, *args, **kwargs):
+        with tracer.start_as_current_span("agent.tool", attributes=_tool_attributes(self, func_call)) as span:
+            success, result = await a_execute_function(self, func_call, *args, **kwargs)
+            span.set_attribute("tool.success", success)
+            return success, result
+
+    traced_execute_function._traced = True
+    ConversableAgent.execute_function = traced_execute_function
+    ConversableAgent.a_execute_function = traced_a_execute_function
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from intake import application_from_form, validate_application
+from pipeline import DEFAULT_STAGES, VerificationPipeline, verify_application
+from telemetry import configure_telemetry
+
+# Batch underwriting: run a backlog of applications through the verification
+# pipeline without the interactive agents.
+#
+#   python batch.py applications.jsonl --output results.jsonl --workers 8
+#
+# Each input line (or .json file in a directory) is one application:
+#   {"id": "...", "application": {bank.json fields or loan form fields},
+#    "email_path": "...", "pdf_path" or "pdf_url": "...", "pdf_password": "...",
+#    "tlsn_proof_path": "..."}
+# Relative paths are resolved against the file the application came from.
+# The results file doubles as the checkpoint, applications already in it are
+# skipped when the batch is started again.
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 4))
+PROGRESS_EVERY = 25
+
+INPUT_KEYS = ("raw_email", "email_path", "pdf_url", "pdf_path", "pdf_password", "tlsn_proof", "tlsn_proof_path")
+PATH_KEYS = ("email_path", "pdf_path", "tlsn_proof_path")
+FORM_KEYS = ("name", "loan_amount", "country", "bank", "has_income", "email", "no_default_history")
+
+def _normalize_item(item: Dict[str, Any], base_dir: str, default_id: str) -> Dict[str, Any]:
+    # A valid JSON document of the wrong shape (a list, a string, a number as
+    # a path) is reported for that item instead of failing the whole batch
+    if not isinstance(item, dict):
+        raise ValueError(f"Expected a JSON object, got {type(item).__name__}")
+    application = item.get("application")
+    if application is not None and not isinstance(application, dict):
+        raise ValueError(f"\"application\" must be a JSON object, got {type(application).__name__}")
+    if application is None:
+        # Flat layout, everything that isn't an input is an application field
+        application = {key: value for key, value in item.items() if key not in INPUT_KEYS and key != "id"}
+    inputs = {key: item[key] for key in INPUT_KEYS if item.get(key) not in (None, "")}
+    for key in INPUT_KEYS:
+        if key in inputs and not isinstance(inputs[key], str):
+            raise ValueError(f"\"{key}\" must be a string, got {type(inputs[key]).__name__}")
+    for key in PATH_KEYS:
+        if key in inputs and not os.path.isabs(inputs[key]):
+            inputs[key] = os.path.join(base_dir, inputs[key])
+    return {"id": str(item.get("id", default_id)), "application": application, "inputs": inputs}
+
+def load_batch(source: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read applications from a JSONL file, or from every .json/.jsonl file in a directory.
+
+    Yields:
+        Dict[str, Any]: {"id", "application", "inputs"}, or {"id", "error"} for lines that aren't valid JSON or not an application
+    """
+    if os.path.isdir(source):
+        paths = sorted(os.path.join(source, name) for name in os.listdir(source) if name.endswith((".json", ".jsonl")))
+    else:
+        paths = [source]
+    for path in paths:
+        base_dir = os.path.dirname(os.path.abspath(path))
+        name = os.path.basename(path)
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                try:
+                    item = json.load(f)
+                except ValueError as e:
+                    yield {"id": name, "error": f"Invalid JSON: {str(e)}"}
+                    continue
+                try:
+                    yield _normalize_item(item, base_dir, name)
+                except ValueError as e:
+                    yield {"id": name, "error": f"Invalid application: {str(e)}"}
+                continue
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                default_id = f"{name}:{line_number}"
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    yield {"id": default_id, "error": f"Invalid JSON: {str(e)}"}
+                    continue
+                try:
+                    yield _normalize_item(item, base_dir, default_id)
+                except ValueError as e:
+                    yield {"id": default_id, "error": f"Invalid application: {str(e)}"}
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """
+    IDs already in the results file. A line cut short by a crash is dropped,
+    so new results are appended after the last complete one.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    done = set()
+    with open(output_path, "rb+") as f:
+        content = f.read()
+        complete = content.rfind(b"\n") + 1
+        if complete < len(content):
+            f.truncate(complete)
+    for line in content[:complete].splitlines():
+        try:
+            done.add(json.loads(line)["id"])
+        except (ValueError, KeyError, TypeError):
+            continue
+    return done
+
+def _application_record(application: Dict[str, Any]) -> Dict[str, Any]:
+    if "first_name" not in application and "name" in application:
+        form = {key: application.get(key) for key in FORM_KEYS}
+        return application_from_form(**form)
+    return application
+
+def _stage_summary(outcome: Dict[str, Any]) -> Dict[str, Any]:
+    result = {key: value for key, value in (outcome["result"] or {}).items() if key != "text"}
+    return {"status": outcome["status"], "duration": round(outcome["duration"], 3), "result": result}
+
+def underwrite(item: Dict[str, Any], pipeline: VerificationPipeline) -> Dict[str, Any]:
+    """
+    Validate and verify one batch item, returning its results line.
+    """
+    start = time.perf_counter()
+    if "error" in item:
+        return {"id": item["id"], "approved": False, "reasons": [item["error"]], "stages": {}, "duration": 0.0}
+
+    # A flat item's form fields can have any JSON type, e.g. a number for the
+    # name, a failure to map them is this item's result and not the batch's
+    try:
+        form_record = _application_record(item["application"])
+        application, problems = validate_application(form_record)
+    except Exception as e:
+        return {"id": item["id"], "approved": False, "reasons": [f"intake: could not read the application: {str(e) or type(e).__name__}"], "stages": {}, "duration": round(time.perf_counter() - start, 3)}
+    record = application.model_dump() if application is not None else form_record
+    try:
+        result = verify_application(record, item["inputs"], pipeline)
+    except Exception as e:
+        return {"id": item["id"], "approved": False, "reasons": problems + [f"pipeline: {str(e)}"], "stages": {}, "duration": round(time.perf_counter() - start, 3)}
+
+    decision = result["decision"]
+    reasons = [f"intake: {problem}" for problem in problems] + decision["reasons"]
+    return {
+        "id": item["id"],
+        "approved": decision["approved"] and not problems,
+        "reasons": reasons,
+        "application": record,
+        "stages": {name: _stage_summary(outcome) for name, outcome in result["outcomes"].items()},
+        "duration": round(time.perf_counter() - start, 3),
+    }
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def summarize(results: List[Dict[str, Any]], elapsed: float, skipped: int) -> Dict[str, Any]:
+    """
+    Throughput and per-stage latency for the applications processed in this run.
+    """
+    stage_durations, stage_statuses = {}, {}
+    for result in results:
+        for name, stage in result["stages"].items():
+            stage_statuses.setdefault(name, {}).setdefault(stage["status"], 0)
+            stage_statuses[name][stage["status"]] += 1
+            if stage["status"] != "skipped":
+                stage_durations.setdefault(name, []).append(stage["duration"])
+    durations = [result["duration"] for result in results]
+    return {
+        "processed": len(results),
+        "skipped_from_checkpoint": skipped,
+        "approved": sum(1 for result in results if result["approved"]),
+        "elapsed_seconds": round(elapsed, 3),
+        "applications_per_sec": round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+        "application_latency": {
+            "p50": round(statistics.median(durations), 3),
+            "p95": round(_percentile(durations, 0.95), 3),
+        } if durations else {},
+        "stages": {
+            name: {
+                "statuses": stage_statuses[name],
+                "p50": round(statistics.median(stage_durations[name]), 3) if stage_durations.get(name) else None,
+                "p95": round(_percentile(stage_durations[name], 0.95), 3) if stage_durations.get(name) else None,
+                "max": round(max(stage_durations[name]), 3) if stage_durations.get(name) else None,
+            }
+            for name in stage_statuses
+        },
+    }
+
+def run_batch(source: str, output_path: str, workers: int = BATCH_WORKERS, fail_fast: bool = False, resume: bool = True) -> Dict[str, Any]:
+    """
+    Underwrite every application in `source`, appending one JSON line per
+    application to `output_path` as soon as it is done.
+
+    Args:
+        source (str): A JSONL file or a directory of .json/.jsonl files
+        output_path (str): The results JSONL, also used as the checkpoint
+        workers (int): How many applications are verified at once
+        fail_fast (bool): Cancel an application's remaining stages when one fails
+        resume (bool): Skip applications already in `output_path`, otherwise start it over
+
+    Returns:
+        Dict[str, Any]: The run summary, see summarize()
+    """
+    if not resume and os.path.exists(output_path):
+        os.remove(output_path)
+    done = load_checkpoint(output_path)
+    items = list(load_batch(source))
+    # Only this batch's applications count, the results file may hold others
+    skipped = sum(item["id"] in done for item in items)
+    items = [item for item in items if item["id"] not in done]
+
+    # Each application runs its stages concurrently, give them their own threads
+    stage_executor = ThreadPoolExecutor(max_workers=max(1, workers) * len(DEFAULT_STAGES), thread_name_prefix="batch-stage")
+    pipeline = VerificationPipeline(fail_fast=fail_fast, executor=stage_executor)
+    results = []
+    write_lock = threading.Lock()
+    start = time.perf_counter()
+    try:
+        with open(output_path, "a", encoding="utf-8") as output, ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch-worker") as pool:
+            futures = [pool.submit(underwrite, item, pipeline) for item in items]
+            for future in as_completed(futures):
+                result = future.result()
+                with write_lock:
+                    output.write(json.dumps(result, default=str) + "\n")
+                    output.flush()
+                    os.fsync(output.fileno())
+                    results.append(result)
+                if len(results) % PROGRESS_EVERY == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"{len(results)}/{len(items)} applications, {len(results) / elapsed:.2f}/s", file=sys.stderr)
+    finally:
+        stage_executor.shutdown(wait=False, cancel_futures=True)
+    return summarize(results, time.perf_counter() - start, skipped)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Underwrite a batch of loan applications")
+    parser.add_argument("source", help="JSONL file or directory of application files")
+    parser.add_argument("--output", default="batch_results.jsonl", help="results JSONL, also the checkpoint")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="applications verified concurrently")
+    parser.add_argument("--fail-fast", action="store_true", help="stop an application's other checks once one fails")
+    parser.add_argument("--no-resume", action="store_true", help="ignore and overwrite an existing results file")
+    args = parser.parse_args(argv)
+
+    configure_telemetry()
+    summary = run_batch(args.source, args.output, args.workers, args.fail_fast, resume=not args.no_resume)
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
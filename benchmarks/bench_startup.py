@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+# Measure how long importing the entry points takes, using python -X importtime
+# in a fresh interpreter per run.
+#
+#   python -m benchmarks.bench_startup --runs 5 --budget-ms 800
+
+DEFAULT_MODULES = ("main", "gradio_app", "integrated_app", "pipeline")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$")
+
+def measure_import(module: str) -> dict:
+    """
+    Import `module` in a fresh interpreter, return the wall time, its
+    cumulative import time and the heaviest direct imports.
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    cumulative_us, direct = None, []
+    for line in completed.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        depth = len(match.group(3)) // 2
+        if match.group(4) == module and depth == 0:
+            cumulative_us = int(match.group(2))
+        elif depth == 0:
+            # Other top level entries are the interpreter's own start-up imports
+            continue
+        elif depth == 1:
+            direct.append((int(match.group(2)), match.group(4)))
+    direct.sort(reverse=True)
+    return {
+        "wall_ms": wall * 1000,
+        "import_ms": (cumulative_us or 0) / 1000,
+        "heaviest": [{"module": name, "ms": round(us / 1000, 1)} for us, name in direct[:5]],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark start-up (import) time of the entry points")
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_MODULES), help="modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if a module's median import time exceeds this")
+    args = parser.parse_args()
+
+    report, over_budget, failed = {}, [], []
+    for module in args.modules:
+        # One untimed run so bytecode compilation isn't counted
+        try:
+            measure_import(module)
+        except RuntimeError as e:
+            report[module] = {"error": str(e).splitlines()[-1]}
+            failed.append(module)
+            continue
+        runs = [measure_import(module) for _ in range(args.runs)]
+        median_import = statistics.median(run["import_ms"] for run in runs)
+        report[module] = {
+            "import_ms_p50": round(median_import, 1),
+            "wall_ms_p50": round(statistics.median(run["wall_ms"] for run in runs), 1),
+            "heaviest": runs[-1]["heaviest"],
+        }
+        if args.budget_ms is not None and median_import > args.budget_ms:
+            over_budget.append(module)
+
+    print(json.dumps(report, indent=2))
+    if over_budget:
+        print(f"Over the {args.budget_ms}ms import budget: {', '.join(over_budget)}", file=sys.stderr)
+    if failed:
+        print(f"Failed to import: {', '.join(failed)}", file=sys.stderr)
+    if over_budget or failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
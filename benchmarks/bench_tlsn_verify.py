@@ -0,0 +1,55 @@
+import argparse
+import json
+import statistics
+import time
+
+import tlsn_verifier
+from benchmarks.fixtures import create_synthetic_proof, generate_notary_key, make_http_transcript, notary_key_hex
+from tlsn_verifier import verify_proof_locally
+from verify_tlsn_proof import verify_tlsn_proof
+
+# Benchmark in-process TLSN verification on synthetic proofs.
+#
+#   python -m benchmarks.bench_tlsn_verify --proofs 200 --padding 100000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local TLSN proof verification")
+    parser.add_argument("--proofs", type=int, default=100, help="number of synthetic proofs")
+    parser.add_argument("--padding", type=int, default=2000, help="extra response bytes per proof")
+    args = parser.parse_args()
+
+    notary_key = generate_notary_key()
+    trusted_keys = [notary_key.public_key()]
+    proofs = []
+    for i in range(args.proofs):
+        sent, received = make_http_transcript(f"Applicant {i}", "NL", f"NL{i:016d}", args.padding)
+        proofs.append(json.dumps(create_synthetic_proof(notary_key, "bank.example.com", sent, received)))
+
+    latencies = []
+    start = time.perf_counter()
+    for proof_json in proofs:
+        t = time.perf_counter()
+        result = verify_proof_locally(json.loads(proof_json), trusted_keys)
+        latencies.append(time.perf_counter() - t)
+        assert result["success"], result
+    elapsed = time.perf_counter() - start
+
+    # Same proofs through the public skill, which parses the JSON itself
+    tlsn_verifier.TLSN_TRUSTED_NOTARY_KEYS = notary_key_hex(notary_key)
+    skill_start = time.perf_counter()
+    for proof_json in proofs:
+        assert verify_tlsn_proof(proof_json)["verified_by"] == "local"
+    skill_elapsed = time.perf_counter() - skill_start
+
+    latencies.sort()
+    print(json.dumps({
+        "proofs": args.proofs,
+        "proof_bytes_avg": int(statistics.mean(len(p) for p in proofs)),
+        "verify_p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "verify_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+        "proofs_per_sec": round(args.proofs / elapsed, 1),
+        "skill_proofs_per_sec": round(args.proofs / skill_elapsed, 1),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-ins for the services the skills call, so benchmarks don't
+# depend on (or hammer) the real ones:
+#
+#   GET  /api/key?domain=...       archive.prove.email key lookup
+#   POST /api/verify               explorer.tlsn.org proof verification
+#   POST /v1/chat/completions      an OpenAI compatible chat endpoint, streamed when asked
+#   GET  /files/<name>             fixture files, e.g. PDFs for verify_bank_pdf
+#
+# Each route sleeps for a configurable latency to stand in for the network,
+# "openai:<model>" sets the chat latency of one model.
+
+DEFAULT_LATENCY = {"prove": 0.05, "explorer": 0.15, "openai": 0.25, "files": 0.0}
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StandInServer"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, completion) -> None:
+        # Server-sent events, one chunk per word like a model streaming tokens
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        content = completion["choices"][0]["message"]["content"]
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            delta = {"role": "assistant", "content": word} if i == 0 else {"content": " " + word}
+            chunk = {**{key: completion[key] for key in ("id", "created", "model")}, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": "stop" if i == len(words) - 1 else None, "logprobs": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/api/key":
+            self.server.pause("prove")
+            domain = parse_qs(url.query).get("domain", [""])[0]
+            records = self.server.dkim_records.get(domain)
+            if not records:
+                self._send_json(404, {"error": "not found"})
+                return
+            self._send_json(200, [{"domain": domain, "selector": selector, "value": value} for selector, value in records.items()])
+        elif url.path.startswith("/files/"):
+            self.server.pause("files")
+            path = os.path.join(self.server.files_dir or "", os.path.basename(url.path))
+            if not self.server.files_dir or not os.path.isfile(path):
+                self._send_json(404, {"error": "not found"})
+                return
+            with open(path, "rb") as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/api/verify":
+            self.server.pause("explorer")
+            self._read_json()
+            self._send_json(200, {"valid": True, "name": "Jane Doe", "country": "NL", "account_number": "NL00BANK0123456789"})
+        elif url.path.endswith("/chat/completions"):
+            request = self._read_json()
+            self.server.pause("openai", request.get("model"))
+            completion = self.server.chat_completion(request)
+            if request.get("stream"):
+                self._send_stream(completion)
+            else:
+                self._send_json(200, completion)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server running all the stand-ins on one local port.
+
+    Use as a context manager, the server runs on a daemon thread until exit.
+    `chat_turns` is how many assistant replies the fake model gives before
+    ending the conversation with TERMINATE.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: Dict[str, float] = None, files_dir: Optional[str] = None, chat_turns: int = 3):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.files_dir = files_dir
+        self.chat_turns = chat_turns
+        self.dkim_records = {}
+        self.requests = {name: 0 for name in DEFAULT_LATENCY}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def add_dkim_key(self, domain: str, selector: str, record: str) -> None:
+        self.dkim_records.setdefault(domain, {})[selector] = record
+
+    def pause(self, route: str, variant: str = None) -> None:
+        with self._lock:
+            self.requests[route] += 1
+        latency = self.latency.get(f"{route}:{variant}", self.latency.get(route))
+        if latency:
+            time.sleep(latency)
+
+    def handle_error(self, request, client_address) -> None:
+        # Clients that time out hang up before the stand-in answers
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def chat_completion(self, request: Dict) -> Dict:
+        messages = request.get("messages") or []
+        assistant_turns = sum(1 for message in messages if message.get("role") == "assistant")
+        if assistant_turns + 1 >= self.chat_turns:
+            content = 'Thanks, I have everything: {"first_name": "Jane", "last_name": "Doe", "country": "NL"}. TERMINATE'
+        else:
+            content = f"Thanks. Question {assistant_turns + 2}: what bank do you use?"
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in messages) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-bench-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop", "logprobs": None}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def __enter__(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="bench-standins", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,319 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks import fixtures
+from benchmarks.standins import StandInServer
+
+# Benchmark suite for the verification skills and an agent chat, run against
+# generated fixtures and local stand-ins for the external services.
+#
+#   python -m benchmarks.suite                     # run and compare with baselines.json
+#   python -m benchmarks.suite --quick --cases pdf # a subset, fewer pages and iterations
+#   python -m benchmarks.suite --update-baseline   # record new baselines
+#
+# Every case runs in a fresh interpreter, so its peak RSS is its own. A case
+# regresses when its p50 latency or peak RSS grows beyond the tolerance.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+PDF_PAGES = (1, 10, 50, 200)
+QUICK_PDF_PAGES = (1, 10)
+PDF_PASSWORD = "bench-password"
+EMAIL_DOMAIN = "bank.example.com"
+EMAIL_SELECTOR = "bench"
+LATENCY_TOLERANCE = 0.25
+RSS_TOLERANCE = 0.20
+# Differences below this are noise, whatever the relative change
+LATENCY_SLACK_MS = 2.0
+# A fast tier model the chat stand-in never answers in time, for the failover case
+STALLED_MODEL = "gpt-4o-mini-stalled"
+STALLED_TIMEOUT = 0.2
+
+# --- Case setups, these run in the child process -------------------------
+
+CaseSetup = Callable[[str, Dict[str, Any]], Tuple[Callable[[], Any], Optional[Callable[[], None]]]]
+
+def _setup_pdf_extract(fixtures_dir: str, params: Dict[str, Any]):
+    from extract_pdf_skill import extract_text_from_pdf
+    path = os.path.join(fixtures_dir, params["file"])
+    password = params.get("password")
+
+    def run():
+        assert extract_text_from_pdf(path, password)
+    return run, None
+
+def _setup_verify_bank_pdf(fixtures_dir: str, params: Dict[str, Any]):
+    from download_verify_email import verify_bank_pdf
+    from pdf_cache import get_pdf_cache
+    url = f"{os.environ['BENCH_STANDIN_URL']}/files/{params['file']}"
+
+    def run():
+        assert verify_bank_pdf(url)["success"]
+    return run, (get_pdf_cache().clear if params.get("cold") else None)
+
+def _setup_verify_tlsn_proof(fixtures_dir: str, params: Dict[str, Any]):
+    from verify_tlsn_proof import verify_tlsn_proof
+    with open(os.path.join(fixtures_dir, "proof.json"), "r") as f:
+        proof_json = f.read()
+
+    def run():
+        assert verify_tlsn_proof(proof_json)["success"]
+    return run, None
+
+def _setup_prove_api(fixtures_dir: str, params: Dict[str, Any]):
+    from main import verify_email_with_prove_api
+    from prove_api import get_prove_key_cache
+
+    def run():
+        assert verify_email_with_prove_api(EMAIL_DOMAIN)
+    return run, (get_prove_key_cache().invalidate if params.get("cold") else None)
+
+def _setup_dkim_verify(fixtures_dir: str, params: Dict[str, Any]):
+    from dkim_verify import verify_dkim_signature
+    with open(os.path.join(fixtures_dir, "signed.eml"), "rb") as f:
+        raw_email = f.read()
+
+    def run():
+        assert verify_dkim_signature(raw_email)["success"]
+    return run, None
+
+def _setup_initiate_chats(fixtures_dir: str, params: Dict[str, Any]):
+    from agents import AgentRegistry, assistant_factory
+    from llm_cache import get_llm_cache
+    from system_prompts import front_desk_assistant_prompt
+
+    config_list = [{"model": "gpt-4o-mini", "api_key": "sk-bench", "base_url": os.environ["BENCH_OPENAI_URL"]}]
+    if params.get("failover"):
+        # The fast model times out on every turn, they all fail over to the strong one
+        config_list = [
+            {"model": STALLED_MODEL, "api_key": "sk-bench", "base_url": os.environ["BENCH_OPENAI_URL"], "timeout": STALLED_TIMEOUT},
+            {"model": "gpt-4o", "api_key": "sk-bench", "base_url": os.environ["BENCH_OPENAI_URL"]},
+        ]
+    registry = AgentRegistry(lambda: {
+        "timeout": 30,
+        "cache_seed": None,
+        "temperature": 0,
+        "config_list": config_list,
+    })
+    registry.register("front_desk_assistant", assistant_factory("front_desk_assistant", front_desk_assistant_prompt))
+
+    @registry.factory("user_proxy")
+    def build_user_proxy(registry):
+        from autogen import UserProxyAgent
+        return UserProxyAgent(
+            name="user_proxy",
+            human_input_mode="NEVER",
+            max_consecutive_auto_reply=10,
+            is_termination_msg=lambda x: (x.get("content") or "").rstrip().endswith("TERMINATE"),
+            code_execution_config=False,
+            default_auto_reply="Jane Doe, 1000 EUR, NL, ING, yes, jane@bank.example.com, no defaults",
+        )
+
+    def run():
+        front_desk = registry.get("front_desk_assistant")
+        results = registry.get("user_proxy").initiate_chats([{
+            "recipient": front_desk,
+            "message": "I want to apply for a loan, please help me",
+            "silent": True,
+            "summary_method": registry.router.summary_method,
+            # Every turn goes to the stand-in, a cache hit would measure nothing
+            "cache": get_llm_cache().for_agent(front_desk.name, bypass=True),
+        }])
+        assert results[0].summary
+        if params.get("failover"):
+            assert registry.router.stats()["routes"]["front_desk_assistant:reply"]["failovers"] > 0
+    return run, None
+
+SETUPS: Dict[str, CaseSetup] = {
+    "pdf_extract": _setup_pdf_extract,
+    "verify_bank_pdf": _setup_verify_bank_pdf,
+    "verify_tlsn_proof": _setup_verify_tlsn_proof,
+    "verify_email_with_prove_api": _setup_prove_api,
+    "verify_dkim_signature": _setup_dkim_verify,
+    "initiate_chats": _setup_initiate_chats,
+}
+
+def build_cases(quick: bool = False) -> List[Dict[str, Any]]:
+    """
+    Every benchmark case: {"name", "kind", "params", "iterations", "env"}.
+    """
+    scale = 2 if quick else 1
+    cases = []
+    for pages in (QUICK_PDF_PAGES if quick else PDF_PAGES):
+        iterations = max(3, (40 if pages < 50 else 6) // scale)
+        cases.append({"name": f"pdf_extract_{pages}p", "kind": "pdf_extract", "params": {"file": f"statement_{pages}.pdf"}, "iterations": iterations})
+        cases.append({"name": f"pdf_extract_{pages}p_encrypted", "kind": "pdf_extract", "params": {"file": f"statement_{pages}_encrypted.pdf", "password": PDF_PASSWORD}, "iterations": iterations})
+    bank_pdf_pages = QUICK_PDF_PAGES[-1] if quick else PDF_PAGES[-1]
+    for cold in (True, False):
+        cases.append({"name": f"verify_bank_pdf_{bank_pdf_pages}p_{'cold' if cold else 'warm'}", "kind": "verify_bank_pdf", "params": {"file": f"statement_{bank_pdf_pages}.pdf", "cold": cold}, "iterations": 20 // scale})
+    cases.append({"name": "verify_tlsn_proof_local", "kind": "verify_tlsn_proof", "params": {}, "iterations": 50 // scale})
+    cases.append({"name": "verify_tlsn_proof_remote", "kind": "verify_tlsn_proof", "params": {}, "iterations": 20 // scale, "env": {"TLSN_TRUSTED_NOTARY_KEYS": ""}})
+    for cold in (True, False):
+        cases.append({"name": f"verify_email_with_prove_api_{'cold' if cold else 'warm'}", "kind": "verify_email_with_prove_api", "params": {"cold": cold}, "iterations": 20 // scale})
+    cases.append({"name": "verify_dkim_signature", "kind": "verify_dkim_signature", "params": {}, "iterations": 50 // scale})
+    cases.append({"name": "initiate_chats_front_desk", "kind": "initiate_chats", "params": {}, "iterations": 6 // scale})
+    cases.append({"name": "initiate_chats_failover", "kind": "initiate_chats", "params": {"failover": True}, "iterations": 4 // scale})
+    return cases
+
+def run_case(case: Dict[str, Any], fixtures_dir: str) -> Dict[str, Any]:
+    """
+    Run one case in this process: a warm-up call, then timed iterations.
+    """
+    run, reset = SETUPS[case["kind"]](fixtures_dir, case["params"])
+    run()
+    latencies = []
+    for _ in range(case["iterations"]):
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - start)
+
+    # ru_maxrss is in KB on Linux and bytes on macOS; PDF worker processes count too
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+    latencies.sort()
+    return {
+        "iterations": len(latencies),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "ops_per_sec": round(len(latencies) / sum(latencies), 2) if sum(latencies) else 0.0,
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 1),
+    }
+
+# --- Orchestration, in the parent process --------------------------------
+
+def generate_fixtures(fixtures_dir: str, server: StandInServer, pdf_pages: Tuple[int, ...]) -> Dict[str, str]:
+    """
+    Write the PDFs, signed email and TLSN proof, and register the email key
+    with the Prove stand-in. Returns the environment the child processes need.
+    """
+    for pages in pdf_pages:
+        with open(os.path.join(fixtures_dir, f"statement_{pages}.pdf"), "wb") as f:
+            f.write(fixtures.make_statement_pdf(pages))
+        with open(os.path.join(fixtures_dir, f"statement_{pages}_encrypted.pdf"), "wb") as f:
+            f.write(fixtures.make_statement_pdf(pages, PDF_PASSWORD))
+
+    rsa_key = fixtures.generate_rsa_key(2048)
+    server.add_dkim_key(EMAIL_DOMAIN, EMAIL_SELECTOR, fixtures.dkim_key_record(rsa_key[0], rsa_key[1]))
+    email = fixtures.make_email(f"jane@{EMAIL_DOMAIN}", "loans@lucid.example", "Your monthly statement", body_lines=200)
+    with open(os.path.join(fixtures_dir, "signed.eml"), "wb") as f:
+        f.write(fixtures.dkim_sign(email, rsa_key, EMAIL_DOMAIN, EMAIL_SELECTOR))
+
+    notary_key = fixtures.generate_notary_key()
+    sent, received = fixtures.make_http_transcript("Jane Doe", "NL", "NL00BANK0123456789", 2000)
+    with open(os.path.join(fixtures_dir, "proof.json"), "w") as f:
+        json.dump(fixtures.create_synthetic_proof(notary_key, "bank.example.com", sent, received), f)
+
+    return {
+        "BENCH_STANDIN_URL": server.url,
+        "BENCH_OPENAI_URL": f"{server.url}/v1",
+        "PROVE_API_URL": f"{server.url}/api/key",
+        "TLSN_EXPLORER_URL": server.url,
+        "TLSN_TRUSTED_NOTARY_KEYS": fixtures.notary_key_hex(notary_key),
+        "DKIM_KEYSTORE": "",
+        "LUCID_STORE": "memory",
+        "PDF_CACHE_DIR": "",
+        "LLM_CACHE_DIR": "",
+        # Every iteration repeats the same input, the memo would only measure itself
+        "VERIFY_MEMO_SECONDS": "0",
+    }
+
+def run_in_subprocess(case: Dict[str, Any], fixtures_dir: str, env: Dict[str, str]) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--run-case", json.dumps(case), "--fixtures", fixtures_dir],
+        cwd=REPO_ROOT, env={**os.environ, **env, **case.get("env", {})}, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        return {"error": (completed.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def compare(results: Dict[str, Dict[str, Any]], baselines: Dict[str, Dict[str, Any]], latency_tolerance: float = LATENCY_TOLERANCE, rss_tolerance: float = RSS_TOLERANCE) -> List[str]:
+    """
+    Regressions against the baselines, as human readable lines.
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        if "error" in result:
+            regressions.append(f"{name}: failed ({result['error']})")
+            continue
+        allowed_ms = baseline["p50_ms"] * (1 + latency_tolerance) + LATENCY_SLACK_MS
+        if result["p50_ms"] > allowed_ms:
+            regressions.append(f"{name}: p50 {result['p50_ms']}ms vs baseline {baseline['p50_ms']}ms")
+        if result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + rss_tolerance):
+            regressions.append(f"{name}: peak RSS {result['peak_rss_mb']}MB vs baseline {baseline['peak_rss_mb']}MB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the verification skills and agent turns")
+    parser.add_argument("--cases", nargs="*", default=None, help="only run cases whose name contains one of these")
+    parser.add_argument("--quick", action="store_true", help="fewer pages and iterations")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baselines")
+    parser.add_argument("--latency-tolerance", type=float, default=LATENCY_TOLERANCE)
+    parser.add_argument("--rss-tolerance", type=float, default=RSS_TOLERANCE)
+    parser.add_argument("--openai-latency", type=float, default=None, help="seconds the fake model takes per completion")
+    parser.add_argument("--output", default=None, help="also write the results JSON here")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--fixtures", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case), args.fixtures)))
+        return
+
+    cases = build_cases(args.quick)
+    if args.cases:
+        cases = [case for case in cases if any(pattern in case["name"] for pattern in args.cases)]
+    latency = {f"openai:{STALLED_MODEL}": 10.0}
+    if args.openai_latency is not None:
+        latency["openai"] = args.openai_latency
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="lucid-bench-") as fixtures_dir, StandInServer(latency=latency, files_dir=fixtures_dir) as server:
+        env = generate_fixtures(fixtures_dir, server, QUICK_PDF_PAGES if args.quick else PDF_PAGES)
+        for case in cases:
+            before = dict(server.requests)
+            result = run_in_subprocess(case, fixtures_dir, env)
+            result["standin_requests"] = {route: count - before[route] for route, count in server.requests.items() if count != before[route]}
+            results[case["name"]] = result
+            summary = result.get("error") or f"p50 {result['p50_ms']}ms  p95 {result['p95_ms']}ms  {result['ops_per_sec']}/s  {result['peak_rss_mb']}MB"
+            print(f"{case['name']:<40} {summary}", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baselines = json.load(f)
+    if args.update_baseline:
+        baselines.update({name: {key: result[key] for key in ("p50_ms", "p95_ms", "ops_per_sec", "peak_rss_mb")} for name, result in results.items() if "error" not in result})
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return
+
+    regressions = compare(results, baselines, args.latency_tolerance, args.rss_tolerance)
+    failures = [f"{name}: failed ({result['error']})" for name, result in results.items() if "error" in result and name not in baselines]
+    for line in regressions + failures:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    if regressions or failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import asyncio
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+from lanes import WorkLane, format_queue_status
+
+# Live agent output for the UI. A chat runs on a lane worker with a
+# ChannelIOStream as autogen's IOStream, so every message, tool call, tool
+# result and streamed token of that chat is published on its application's
+# channel instead of printed to the server console. UI handlers subscribe to
+# the channel and yield what arrives, rather than waiting for the chat to end.
+
+CHANNEL_HISTORY = 500
+MAX_CHANNELS = 256
+# autogen messages that are console bookkeeping rather than conversation
+SKIPPED_MESSAGES = {
+    "post_carryover_processing",
+    "usage_summary",
+    "conversable_agent_usage_summary",
+    "conversable_agent_usage_summary_no_cost_incurred",
+    "using_auto_reply",
+}
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+SEPARATOR = re.compile(r"^-{20,}$", re.MULTILINE)
+
+class EventChannel:
+    """
+    The chat events of one application. Recent events are kept so a late
+    subscriber can catch up, subscribers are called with every new event
+    from the publishing thread.
+
+    An event is {"type", "text", "time"}, "type" being the autogen message
+    type ("text", "tool_call", "tool_response", "execute_function", ...),
+    "stream" for a streamed chunk of a model reply, or "print" for plain output.
+    """
+
+    def __init__(self, key: str, history: int = CHANNEL_HISTORY):
+        self.key = key
+        self._history = deque(maxlen=history)
+        self._subscribers: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = threading.Lock()
+
+    def publish(self, kind: str, text: str, **data) -> None:
+        event = {"type": kind, "text": text, "time": time.time(), **data}
+        with self._lock:
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber(event)
+
+    def subscribe(self, subscriber: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            self._subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def history(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._history)
+
+class ChannelIOStream:
+    """
+    autogen IOStream that publishes to an EventChannel. There is nobody to
+    type at the console, input() answers with an empty reply.
+    """
+
+    def __init__(self, channel: EventChannel):
+        self.channel = channel
+
+    def print(self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        text = ANSI_ESCAPE.sub("", sep.join(str(o) for o in objects))
+        if text.strip():
+            self.channel.publish("print", text.strip())
+
+    def send(self, message: Any) -> None:
+        kind = getattr(message, "type", None) or type(message).__name__
+        if kind in SKIPPED_MESSAGES:
+            return
+        if kind == "stream":
+            self.channel.publish("stream", str(message.content.content))
+            return
+        parts = []
+        message.print(lambda *objects, sep=" ", end="\n", flush=False: parts.append(sep.join(str(o) for o in objects) + end))
+        text = SEPARATOR.sub("", ANSI_ESCAPE.sub("", "".join(parts))).strip()
+        if text:
+            self.channel.publish(kind, text)
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        return ""
+
+class ChatTranscript:
+    """
+    Accumulates events into the text shown in the UI. Streamed chunks build
+    up the reply in progress until the complete message replaces them, and
+    the queue position is shown until the chat starts.
+    """
+
+    def __init__(self, header: str = ""):
+        self.header = header
+        self.entries: List[str] = []
+        self.partial = ""
+        self.status = ""
+
+    def add(self, event: Dict[str, Any]) -> None:
+        if event["type"] == "queued":
+            self.status = event["text"]
+            return
+        self.status = ""
+        if event["type"] == "stream":
+            self.partial += event["text"]
+        elif event.get("text"):
+            self.partial = ""
+            self.entries.append(event["text"])
+
+    def text(self) -> str:
+        return "\n\n".join(part for part in [self.header, *self.entries, self.partial, self.status] if part)
+
+_channels: "OrderedDict[str, EventChannel]" = OrderedDict()
+_channels_lock = threading.Lock()
+
+def get_event_channel(key: str = None) -> EventChannel:
+    """
+    The event channel of an application, created on first use. Without a
+    key a fresh, unshared channel is returned. Only the most recently used
+    MAX_CHANNELS channels are kept.
+    """
+    if key is None:
+        return EventChannel(uuid.uuid4().hex)
+    with _channels_lock:
+        channel = _channels.get(key)
+        if channel is None:
+            channel = _channels[key] = EventChannel(key)
+        _channels.move_to_end(key)
+        while len(_channels) > MAX_CHANNELS:
+            _channels.popitem(last=False)
+        return channel
+
+async def run_streaming(channel: EventChannel, func: Callable[[], Any], lane: WorkLane) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run func on the lane with its autogen output going to the channel,
+    yielding {"type": "queued", ...} events while it waits for a worker and
+    the channel's events as they are published. The last event is
+    {"type": "done", "result": ...}, or {"type": "done", "error": ...} with
+    the error also as its text.
+
+    Closing the generator early leaves a started chat running to completion.
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    done = {"type": "done", "text": ""}
+
+    def deliver(event: Dict[str, Any]) -> None:
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    def worker():
+        from autogen.io import IOStream
+        with IOStream.set_default(ChannelIOStream(channel)):
+            return func()
+
+    async def drive():
+        try:
+            async for state, value in lane.stream(worker):
+                if state == "queued":
+                    events.put_nowait({"type": "queued", "text": format_queue_status(value), "time": time.time(), **value})
+                elif state == "done":
+                    done["result"] = value
+                else:
+                    done["error"] = done["text"] = value
+        except Exception as e:
+            done["error"] = str(e)
+            done["text"] = f"The chat stopped with an error: {str(e)}"
+        events.put_nowait(done)
+
+    channel.subscribe(deliver)
+    task = asyncio.ensure_future(drive())
+    try:
+        while True:
+            event = await events.get()
+            yield event
+            if event is done:
+                return
+    finally:
+        channel.unsubscribe(deliver)
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,120 @@
+import base64
+from typing import List, Tuple
+
+from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+from cryptography.hazmat.primitives.serialization import load_der_public_key
+
+# DER encoded DigestInfo prefixes from RFC 8017 section 9.2
+DIGEST_INFO_PREFIXES = {
+    "sha1": bytes.fromhex("3021300906052b0e03021a05000414"),
+    "sha256": bytes.fromhex("3031300d060960864801650304020105000420"),
+    "sha384": bytes.fromhex("3041300d060960864801650304020205000430"),
+    "sha512": bytes.fromhex("3051300d060960864801650304020305000440"),
+}
+
+RSA_ENCRYPTION_OID = "1.2.840.113549.1.1.1"
+
+# RFC 8301 section 3.2: verifiers must not consider signatures from keys
+# shorter than 1024 bits valid
+MIN_RSA_KEY_BITS = 1024
+
+HASH_ALGORITHMS = {
+    "sha1": hashes.SHA1,
+    "sha256": hashes.SHA256,
+    "sha384": hashes.SHA384,
+    "sha512": hashes.SHA512,
+}
+
+def der_read(data: bytes, offset: int = 0) -> Tuple[int, bytes, int]:
+    """
+    Read one DER element.
+
+    Returns:
+        Tuple[int, bytes, int]: The tag byte, the element content and the offset just past the element
+    """
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        num_bytes = length & 0x7F
+        if num_bytes == 0 or num_bytes > 4:
+            raise ValueError("Unsupported DER length encoding")
+        length = int.from_bytes(data[offset:offset + num_bytes], "big")
+        offset += num_bytes
+    end = offset + length
+    if end > len(data):
+        raise ValueError("Truncated DER element")
+    return tag, data[offset:end], end
+
+def der_children(content: bytes) -> List[Tuple[int, bytes]]:
+    """
+    Split the content of a constructed DER element into its (tag, content) children.
+    """
+    children = []
+    offset = 0
+    while offset < len(content):
+        tag, value, offset = der_read(content, offset)
+        children.append((tag, value))
+    return children
+
+def der_elements(content: bytes) -> List[Tuple[int, bytes, bytes]]:
+    """
+    Like der_children(), with each child's complete encoding as a third item,
+    for elements whose encoding is what gets signed.
+    """
+    elements = []
+    offset = 0
+    while offset < len(content):
+        start = offset
+        tag, value, offset = der_read(content, offset)
+        elements.append((tag, value, content[start:offset]))
+    return elements
+
+def der_encode(tag: int, content: bytes) -> bytes:
+    if len(content) < 0x80:
+        return bytes([tag, len(content)]) + content
+    length = len(content).to_bytes((len(content).bit_length() + 7) // 8, "big")
+    return bytes([tag, 0x80 | len(length)]) + length + content
+
+def der_oid(content: bytes) -> str:
+    first = content[0]
+    parts = [str(min(first // 40, 2)), str(first - 40 * min(first // 40, 2))]
+    value = 0
+    for byte in content[1:]:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(str(value))
+            value = 0
+    return ".".join(parts)
+
+def load_rsa_public_key(der: bytes) -> rsa.RSAPublicKey:
+    """
+    Load an RSA public key from a DER SubjectPublicKeyInfo or PKCS#1 RSAPublicKey.
+    """
+    try:
+        key = load_der_public_key(der)
+    except (ValueError, UnsupportedAlgorithm) as e:
+        raise ValueError(f"Unrecognised RSA public key structure: {str(e)}")
+    if not isinstance(key, rsa.RSAPublicKey):
+        raise ValueError("Public key is not an RSA key")
+    return key
+
+def load_rsa_public_key_b64(key_b64: str) -> rsa.RSAPublicKey:
+    return load_rsa_public_key(base64.b64decode("".join(key_b64.split())))
+
+def rsa_pkcs1v15_verify(public_key: rsa.RSAPublicKey, signature: bytes, digest: bytes, hash_name: str) -> bool:
+    """
+    Verify an RSASSA-PKCS1-v1_5 signature over an already computed digest.
+    Keys shorter than MIN_RSA_KEY_BITS never verify.
+    """
+    if public_key.key_size < MIN_RSA_KEY_BITS:
+        return False
+    algorithm = HASH_ALGORITHMS[hash_name]()
+    try:
+        public_key.verify(signature, digest, padding.PKCS1v15(), Prehashed(algorithm))
+    except (InvalidSignature, ValueError):
+        return False
+    return True
@@ -0,0 +1,406 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+
+from crypto_utils import MIN_RSA_KEY_BITS, load_rsa_public_key_b64, rsa_pkcs1v15_verify
+from telemetry import annotate, traced_skill
+from verification_coordinator import get_verification_coordinator
+
+# JSON file mapping "selector._domainkey.domain" to a DKIM TXT record
+DKIM_KEYSTORE = os.getenv("DKIM_KEYSTORE")
+RESOLVED_KEY_TTL_SECONDS = 60 * 60
+BATCH_WORKERS = 8
+
+# A resolver takes (domain, selector) and returns the DKIM TXT record, e.g.
+# "v=DKIM1; k=rsa; p=MIIBIj...", or None when the key is unknown.
+KeyResolver = Callable[[str, str], Optional[str]]
+
+_WSP_RUN = re.compile(rb"[ \t]+")
+_SIGNATURE_B_TAG = re.compile(rb"(^|;)([ \t\r\n]*b[ \t\r\n]*=)[^;]*")
+_HASH_ALGORITHMS = {"rsa-sha256": "sha256", "rsa-sha1": "sha1"}
+
+def parse_tag_list(value: Union[str, bytes]) -> Dict[str, str]:
+    """
+    Parse a DKIM tag=value list (RFC 6376 section 3.2).
+
+    Whitespace is removed from the base64 valued b=, bh= and p= tags.
+    """
+    if isinstance(value, bytes):
+        value = value.decode("ascii", errors="replace")
+    tags = {}
+    for part in value.split(";"):
+        if "=" not in part:
+            continue
+        name, tag_value = part.split("=", 1)
+        name = name.strip()
+        tag_value = tag_value.strip()
+        if name in ("b", "bh", "p"):
+            tag_value = "".join(tag_value.split())
+        tags[name] = tag_value
+    return tags
+
+def split_message(raw_email: bytes) -> Tuple[List[Tuple[bytes, bytes]], bytes]:
+    """
+    Split a raw message into its header fields and body.
+
+    Line endings are normalised to CRLF first. Each header is returned as
+    (lowercased name, complete raw field including folded lines and CRLF).
+    """
+    raw_email = re.sub(rb"\r?\n", b"\r\n", raw_email)
+    separator = raw_email.find(b"\r\n\r\n")
+    if separator == -1:
+        header_block, body = raw_email, b""
+    else:
+        header_block, body = raw_email[:separator + 2], raw_email[separator + 4:]
+
+    headers = []
+    for line in header_block.split(b"\r\n"):
+        if not line:
+            continue
+        if line[:1] in (b" ", b"\t") and headers:
+            name, field = headers[-1]
+            headers[-1] = (name, field + line + b"\r\n")
+        elif b":" in line:
+            headers.append((line.split(b":", 1)[0].strip().lower(), line + b"\r\n"))
+    return headers, body
+
+def canonicalize_header(field: bytes, method: str) -> bytes:
+    if method == "simple":
+        return field
+    name, value = field.split(b":", 1)
+    value = re.sub(rb"\r\n(?=[ \t])", b"", value)
+    value = _WSP_RUN.sub(b" ", value).strip(b" \r\n")
+    return name.strip().lower() + b":" + value + b"\r\n"
+
+class BodyHasher:
+    """
+    Incrementally canonicalize and hash a message body.
+
+    Body bytes can be fed in arbitrary chunks. Trailing empty lines are held
+    back until non-empty content follows, so the hash matches the canonical
+    body of RFC 6376 section 3.4 without keeping the body in memory.
+    """
+
+    def __init__(self, method: str = "simple", hash_name: str = "sha256", length_limit: Optional[int] = None):
+        if method not in ("simple", "relaxed"):
+            raise ValueError(f"Unsupported body canonicalization: {method}")
+        self.method = method
+        self.length_limit = length_limit
+        self._hash = hashlib.new(hash_name)
+        self._partial = b""
+        self._blank_lines = 0
+        self._hashed = 0
+        self._emitted_any = False
+
+    def update(self, chunk: bytes) -> None:
+        data = self._partial + chunk
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._add_line(line[:-1] if line.endswith(b"\r") else line)
+
+    def _add_line(self, line: bytes) -> None:
+        if self.method == "relaxed":
+            line = _WSP_RUN.sub(b" ", line).rstrip(b" ")
+        if not line:
+            self._blank_lines += 1
+            return
+        self._emit(b"\r\n" * self._blank_lines + line + b"\r\n")
+        self._blank_lines = 0
+
+    def _emit(self, data: bytes) -> None:
+        self._emitted_any = True
+        if self.length_limit is not None:
+            data = data[:max(self.length_limit - self._hashed, 0)]
+        self._hashed += len(data)
+        self._hash.update(data)
+
+    def digest(self) -> bytes:
+        """
+        Finish the body and return the digest. The hasher must not be updated afterwards.
+        """
+        if self._partial:
+            self._add_line(self._partial[:-1] if self._partial.endswith(b"\r") else self._partial)
+            self._partial = b""
+        if not self._emitted_any and self.method == "simple":
+            # An empty body canonicalizes to a single CRLF with the simple method
+            self._emit(b"\r\n")
+        return self._hash.digest()
+
+def body_hasher_for(signature: Dict[str, str]) -> BodyHasher:
+    """
+    Build the BodyHasher matching the c=, a= and l= tags of a parsed signature.
+    """
+    _, body_method = _canonicalization(signature)
+    hash_name = _HASH_ALGORITHMS.get(signature.get("a", ""))
+    if hash_name is None:
+        raise ValueError(f"Unsupported signing algorithm: {signature.get('a')}")
+    length_limit = int(signature["l"]) if signature.get("l", "").isdigit() else None
+    return BodyHasher(body_method, hash_name, length_limit)
+
+def _canonicalization(signature: Dict[str, str]) -> Tuple[str, str]:
+    header_method, _, body_method = signature.get("c", "simple/simple").partition("/")
+    return header_method or "simple", body_method or "simple"
+
+def _select_signed_headers(headers: List[Tuple[bytes, bytes]], signed_names: List[str]) -> List[bytes]:
+    # Repeated header names are consumed from the bottom of the header block up
+    remaining = {}
+    for index, (name, _) in enumerate(headers):
+        remaining.setdefault(name, []).append(index)
+    selected = []
+    for name in signed_names:
+        indexes = remaining.get(name.strip().lower().encode("ascii"))
+        if indexes:
+            selected.append(headers[indexes.pop()][1])
+    return selected
+
+def _public_key_from_record(record: str) -> RSAPublicKey:
+    tags = parse_tag_list(record)
+    if tags.get("k", "rsa") != "rsa":
+        raise ValueError(f"Unsupported key type: {tags.get('k')}")
+    if not tags.get("p"):
+        raise ValueError("The DKIM key has been revoked")
+    return load_rsa_public_key_b64(tags["p"])
+
+def verify_signature_header(headers: List[Tuple[bytes, bytes]], signature_field: bytes, resolver: KeyResolver, body_hash: Optional[bytes] = None, body: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Verify one DKIM-Signature header field against the message headers.
+
+    Either the raw `body` or a precomputed canonical `body_hash` must be given.
+    """
+    signature = parse_tag_list(signature_field.split(b":", 1)[1])
+    result = {
+        "domain": signature.get("d"),
+        "selector": signature.get("s"),
+        "algorithm": signature.get("a"),
+        "canonicalization": signature.get("c", "simple/simple"),
+        "signed_headers": [name.strip().lower() for name in signature.get("h", "").split(":") if name.strip()],
+        "body_hash_valid": False,
+        "signature_valid": False,
+    }
+
+    missing = [tag for tag in ("v", "a", "b", "bh", "d", "h", "s") if tag not in signature]
+    if missing:
+        result["error"] = f"DKIM-Signature is missing required tags: {', '.join(missing)}"
+        return result
+    if "from" not in result["signed_headers"]:
+        result["error"] = "DKIM-Signature does not cover the From header"
+        return result
+    if signature.get("x", "").isdigit():
+        # Expired signatures are reported but not rejected, applicants often
+        # prove ownership with older emails.
+        result["expired"] = int(signature["x"]) < time.time()
+
+    hash_name = _HASH_ALGORITHMS.get(signature["a"])
+    if hash_name is None:
+        result["error"] = f"Unsupported signing algorithm: {signature['a']}"
+        return result
+
+    if body_hash is None:
+        hasher = body_hasher_for(signature)
+        hasher.update(body or b"")
+        body_hash = hasher.digest()
+    if body_hash != base64.b64decode(signature["bh"]):
+        result["error"] = "Body hash does not match, the body was modified"
+        return result
+    result["body_hash_valid"] = True
+
+    record = resolver(signature["d"], signature["s"])
+    if record is None:
+        result["error"] = f"No DKIM key found for {signature['s']}._domainkey.{signature['d']}"
+        return result
+    try:
+        public_key = _public_key_from_record(record)
+    except ValueError as e:
+        result["error"] = str(e)
+        return result
+    if public_key.key_size < MIN_RSA_KEY_BITS:
+        result["error"] = f"The DKIM key has {public_key.key_size} bits, keys under {MIN_RSA_KEY_BITS} bits are not accepted (RFC 8301)"
+        return result
+
+    header_method, _ = _canonicalization(signature)
+    header_hash = hashlib.new(hash_name)
+    for field in _select_signed_headers(headers, result["signed_headers"]):
+        header_hash.update(canonicalize_header(field, header_method))
+    # The signature header itself is hashed last, with an empty b= value and no trailing CRLF
+    name, value = signature_field[:-2].split(b":", 1)
+    unsigned_field = name + b":" + _SIGNATURE_B_TAG.sub(rb"\1\2", value) + b"\r\n"
+    header_hash.update(canonicalize_header(unsigned_field, header_method)[:-2])
+
+    result["signature_valid"] = rsa_pkcs1v15_verify(public_key, base64.b64decode(signature["b"]), header_hash.digest(), hash_name)
+    if not result["signature_valid"]:
+        result["error"] = "RSA signature verification failed"
+    return result
+
+@traced_skill("dkim.verify", lambda result: {"success": result["success"], "dkim.domain": result.get("domain"), "dkim.signatures": len(result["signatures"])})
+def verify_dkim_signature(raw_email: Annotated[Union[str, bytes], "The raw email content including headers"], resolver: Optional[KeyResolver] = None) -> Dict[str, Any]:
+    """
+    Verify the DKIM signatures of a raw email locally.
+
+    Every DKIM-Signature header is checked, the email is valid if at least one
+    of them verifies.
+
+    Args:
+        raw_email (str | bytes): The raw email content including headers
+        resolver (KeyResolver): Resolves (domain, selector) to a DKIM TXT record, defaults to get_default_resolver()
+
+    Returns:
+        Dict[str, Any]: The verification result with one entry per signature
+    """
+    try:
+        if isinstance(raw_email, str):
+            raw_email = raw_email.encode("utf-8")
+        annotate({"email.bytes": len(raw_email)})
+        if resolver is not None:
+            return _verify_email(raw_email, resolver)
+        # With the default resolver the same email verified again shares one verification
+        return get_verification_coordinator().run("email", hashlib.sha256(raw_email).hexdigest(), _verify_email, raw_email, get_default_resolver())
+    except Exception as e:
+        return {"success": False, "error": f"Error verifying DKIM signature: {str(e)}", "signatures": []}
+
+def _verify_email(raw_email: bytes, resolver: KeyResolver) -> Dict[str, Any]:
+    headers, body = split_message(raw_email)
+    signature_fields = [field for name, field in headers if name == b"dkim-signature"]
+    if not signature_fields:
+        return {"success": False, "error": "The email has no DKIM-Signature header", "signatures": []}
+    return dkim_result([verify_signature_header(headers, field, resolver, body=body) for field in signature_fields])
+
+def dkim_result(signatures: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    The overall result for the verify_signature_header() results of one email, valid if any signature is.
+    """
+    valid = [sig for sig in signatures if sig["signature_valid"]]
+    if valid:
+        return {"success": True, "domain": valid[0]["domain"], "selector": valid[0]["selector"], "signatures": signatures}
+    return {"success": False, "error": signatures[0].get("error", "DKIM verification failed"), "signatures": signatures}
+
+def format_dkim_result(result: Dict[str, Any]) -> str:
+    """
+    Render a verify_dkim_signature result as short human readable text
+    """
+    lines = []
+    if result["success"]:
+        lines.append(f"✅ DKIM signature verified for {result['domain']} (selector {result['selector']}).")
+    else:
+        lines.append(f"❌ DKIM verification failed: {result.get('error', 'unknown error')}")
+    for signature in result.get("signatures", []):
+        status = "valid" if signature["signature_valid"] else signature.get("error", "invalid")
+        lines.append(f"- d={signature['domain']} s={signature['selector']} a={signature['algorithm']}: {status}")
+    return "\n".join(lines)
+
+def verify_eml_file(path: str, resolver: Optional[KeyResolver] = None) -> Dict[str, Any]:
+    try:
+        with open(path, "rb") as f:
+            raw_email = f.read()
+    except OSError as e:
+        return {"success": False, "path": path, "error": str(e), "signatures": []}
+    return {"path": path, **verify_dkim_signature(raw_email, resolver)}
+
+def verify_eml_files(paths: Iterable[str], resolver: Optional[KeyResolver] = None, workers: int = BATCH_WORKERS) -> List[Dict[str, Any]]:
+    """
+    Verify many .eml files on a worker pool. Results come back in input order.
+
+    Key lookups dominate the cost, so a thread pool sharing one caching
+    resolver means each (domain, selector) is fetched once for the batch.
+    """
+    resolver = resolver or get_default_resolver()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda path: verify_eml_file(path, resolver), paths))
+
+class KeystoreResolver:
+    """
+    Resolve keys from a local keystore, a dict or a JSON file mapping
+    "selector._domainkey.domain" to the DKIM TXT record.
+    """
+
+    def __init__(self, keys: Union[str, Dict[str, str]]):
+        if isinstance(keys, str):
+            with open(keys, "r") as f:
+                keys = json.load(f)
+        self.keys = {name.lower(): record for name, record in keys.items()}
+
+    def __call__(self, domain: str, selector: str) -> Optional[str]:
+        return self.keys.get(f"{selector}._domainkey.{domain}".lower())
+
+class ProveApiResolver:
+    """
+    Resolve keys from the Prove Email key archive through the shared ProveKeyCache.
+    """
+
+    def __init__(self, key_cache=None):
+        self.key_cache = key_cache
+
+    def __call__(self, domain: str, selector: str) -> Optional[str]:
+        from prove_api import get_prove_key_cache
+
+        key_cache = self.key_cache or get_prove_key_cache()
+        try:
+            records = key_cache.lookup(domain)
+        except Exception as e:
+            print(f"Prove API lookup failed for {domain}: {str(e)}")
+            return None
+        if isinstance(records, dict):
+            records = [records]
+        for record in records or []:
+            if isinstance(record, dict) and record.get("selector") == selector:
+                return record.get("value") or record.get("record")
+        return None
+
+class ChainResolver:
+    """
+    Try several resolvers in order and return the first key found.
+    """
+
+    def __init__(self, *resolvers: KeyResolver):
+        self.resolvers = resolvers
+
+    def __call__(self, domain: str, selector: str) -> Optional[str]:
+        for resolver in self.resolvers:
+            record = resolver(domain, selector)
+            if record is not None:
+                return record
+        return None
+
+class CachingResolver:
+    """
+    Remember resolved keys in memory for `ttl` seconds.
+    """
+
+    def __init__(self, resolver: KeyResolver, ttl: float = RESOLVED_KEY_TTL_SECONDS):
+        self.resolver = resolver
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, domain: str, selector: str) -> Optional[str]:
+        key = (domain.lower(), selector.lower())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+        record = self.resolver(domain, selector)
+        if record is not None:
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, record)
+        return record
+
+_default_resolver = None
+
+def get_default_resolver() -> KeyResolver:
+    """
+    The local keystore (if DKIM_KEYSTORE is set) followed by the Prove API, behind an in-memory cache.
+    """
+    global _default_resolver
+    if _default_resolver is None:
+        resolvers = [KeystoreResolver(DKIM_KEYSTORE)] if DKIM_KEYSTORE else []
+        resolvers.append(ProveApiResolver())
+        _default_resolver = CachingResolver(ChainResolver(*resolvers))
+    return _default_resolver
@@ -1,62 +1,93 @@
-import PyPDF2
-import requests
-import hashlib
-import io
+from extract_pdf_skill import download_pdf
+from pdf_cache import get_pdf_cache, integrity_cache_key
+from pdf_signature import check_signatures, map_pdf
+from telemetry import annotate, traced_skill
+from verification_coordinator import get_verification_coordinator, request_key
+
+@traced_skill("pdf.verify_bank", lambda result: {"success": result["success"], "pdf.signature_status": result.get("signature_status")})
 def verify_bank_pdf(pdf_url):
     """
-    Download a PDF from a given URL and perform basic integrity checks.
-    
+    Download a PDF from a given URL, perform basic integrity checks and verify
+    its digital signatures against the trust store (see pdf_signature).
+
+    The MD5, SHA-256 and every signature's byte range are hashed in one pass
+    over the mapped file. The integrity checks are cached on the SHA-256 of
+    the content, so the same statement submitted again is only parsed once.
+
     Args:
     pdf_url (str): The URL of the PDF file to download and verify.
-    
+
     Returns:
     dict: A dictionary containing verification results.
     """
     try:
-        # Download the PDF
-        response = requests.get(pdf_url)
-        if response.status_code != 200:
-            return {"success": False, "message": f"Failed to download PDF. Status code: {response.status_code}"}
-        
-        pdf_content = response.content
-        
-        # Calculate MD5 hash of the PDF
-        md5_hash = hashlib.md5(pdf_content).hexdigest()
-        
-        # Read the PDF
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
-        
-        # Extract metadata
-        metadata = pdf_reader.metadata
-        
-        # Check if the PDF is encrypted
-        is_encrypted = pdf_reader.is_encrypted
-        
-        # Get the number of pages
-        num_pages = len(pdf_reader.pages)
-        
-        # Check for digital signatures (this is a basic check and may not catch all types of signatures)
-        has_signature = '/Sig' in pdf_reader.trailer['/Root'].get('/AcroForm', {}).get('/Fields', {})
-        
-        return {
-            "success": True,
-            "md5_hash": md5_hash,
-            "is_encrypted": is_encrypted,
-            "num_pages": num_pages,
-            "has_signature": has_signature,
-            "metadata": {
-                "author": metadata.get('/Author', 'N/A'),
-                "creator": metadata.get('/Creator', 'N/A'),
-                "producer": metadata.get('/Producer', 'N/A'),
-                "subject": metadata.get('/Subject', 'N/A'),
-                "title": metadata.get('/Title', 'N/A'),
-                "creation_date": metadata.get('/CreationDate', 'N/A'),
-                "modification_date": metadata.get('/ModDate', 'N/A')
-            }
-        }
+        # Checked once per URL however often it is asked for at the same time
+        return get_verification_coordinator().run("bank_pdf", request_key(pdf_url), _verify_bank_pdf, pdf_url)
     except Exception as e:
         return {"success": False, "message": f"An error occurred: {str(e)}"}
 
-# Example usage
-result = verify_bank_pdf("http://127.0.0.1:5500/bank-statement-1.pdf")
-print(result)
\ No newline at end of file
+def _verify_bank_pdf(pdf_url):
+    # Download the PDF
+    try:
+        pdf_buffer = download_pdf(pdf_url)
+    except Exception as e:
+        return {"success": False, "message": str(e)}
+
+    with pdf_buffer:
+        # Hash the whole file and check its signatures in a single pass
+        with map_pdf(pdf_buffer) as data:
+            signatures = check_signatures(data, file_hashes=("md5", "sha256"))
+        md5_hash = signatures["hashes"]["md5"]
+        sha256_hash = signatures["hashes"]["sha256"]
+        pdf_buffer.seek(0)
+
+        cache = get_pdf_cache()
+        cache_key = integrity_cache_key(sha256_hash)
+        integrity = cache.get(cache_key)
+        annotate({"pdf.cache_hit": integrity is not None})
+        if integrity is None:
+            integrity = _check_pdf_integrity(pdf_buffer)
+            cache.set(cache_key, integrity)
+
+    return {
+        "success": True,
+        "md5_hash": md5_hash,
+        "sha256_hash": sha256_hash,
+        **integrity,
+        "has_signature": signatures["signed"],
+        "signature_status": signatures["status"],
+        "signatures": signatures["signatures"],
+    }
+
+def _check_pdf_integrity(pdf_buffer):
+    import PyPDF2
+    # Read the PDF
+    pdf_reader = PyPDF2.PdfReader(pdf_buffer)
+
+    # Extract metadata
+    metadata = pdf_reader.metadata or {}
+
+    # Check if the PDF is encrypted
+    is_encrypted = pdf_reader.is_encrypted
+
+    # Get the number of pages
+    num_pages = len(pdf_reader.pages)
+
+    return {
+        "is_encrypted": is_encrypted,
+        "num_pages": num_pages,
+        "metadata": {
+            "author": str(metadata.get('/Author', 'N/A')),
+            "creator": str(metadata.get('/Creator', 'N/A')),
+            "producer": str(metadata.get('/Producer', 'N/A')),
+            "subject": str(metadata.get('/Subject', 'N/A')),
+            "title": str(metadata.get('/Title', 'N/A')),
+            "creation_date": str(metadata.get('/CreationDate', 'N/A')),
+            "modification_date": str(metadata.get('/ModDate', 'N/A'))
+        }
+    }
+
+if __name__ == "__main__":
+    # Example usage
+    result = verify_bank_pdf("http://127.0.0.1:5500/bank-statement-1.pdf")
+    print(result)
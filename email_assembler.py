@@ -0,0 +1,326 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from dkim_verify import KeyResolver, body_hasher_for, dkim_result, get_default_resolver, parse_tag_list, verify_signature_header
+from email_digest import build_email_digest
+from telemetry import annotate, skill_span
+
+# Server side assembly of a raw email pasted in chunks. Chunks are added in
+# order to the EmailAssembler of the session; the header block is parsed line
+# by line as it arrives and once it ends the body is fed straight into one
+# BodyHasher per DKIM signature, so the body hashes are done when the last
+# chunk lands and only the header and signature checks are left.
+#
+# Memory stays bounded: the raw email is spooled to a temporary file past
+# EMAIL_SPOOL_BYTES (it is kept to be saved with the application), only the
+# first DIGEST_BODY_BYTES of the body are held for the email digest, and the
+# header block is capped at MAX_HEADER_BYTES.
+
+MAX_EMAIL_BYTES = int(os.getenv("MAX_EMAIL_BYTES", 25 * 1024 * 1024))
+MAX_HEADER_BYTES = 256 * 1024
+EMAIL_SPOOL_BYTES = 1024 * 1024
+DIGEST_BODY_BYTES = 64 * 1024
+MAX_ASSEMBLIES = 256
+ASSEMBLY_TTL_SECONDS = int(os.getenv("EMAIL_ASSEMBLY_TTL", 30 * 60))
+
+class EmailAssembler:
+    """
+    A raw email put together from chunks in arrival order. add() takes the
+    next chunk, finish() verifies the DKIM signatures from the header fields
+    and the body hashes computed along the way.
+
+    Headers are kept as (lowercased name, raw field with CRLF), the same as
+    dkim_verify.split_message().
+    """
+
+    def __init__(self, max_bytes: int = MAX_EMAIL_BYTES):
+        self.max_bytes = max_bytes
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.chunks = 0
+        self.size = 0
+        self.updated_at = time.monotonic()
+        self.error = None
+        self._raw = tempfile.SpooledTemporaryFile(max_size=EMAIL_SPOOL_BYTES)
+        self._line = b""
+        self._field = b""
+        self._header_bytes = 0
+        self._in_body = False
+        self._body_prefix = bytearray()
+        # One hasher per distinct (canonicalization, algorithm, length) of the signatures
+        self._hashers = {}
+        self._signature_hashers: List[Optional[Tuple[str, str, str]]] = []
+        self._result = None
+        self._lock = threading.Lock()
+
+    def add(self, chunk: Union[str, bytes], index: Optional[int] = None) -> bool:
+        """
+        Append the next chunk. With an `index` (the chunk's position from 0) a
+        chunk that was already added is ignored and False returned, and one
+        that skips ahead is refused.
+
+        Raises:
+            ValueError: The chunk is out of order, the email is already
+                finished, or it went over the size limits, which leaves the
+                assembler failed
+        """
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        with self._lock:
+            if self.error is not None:
+                raise ValueError(self.error)
+            if self._result is not None:
+                raise ValueError("The email is already complete")
+            if index is not None and index < self.chunks:
+                return False
+            if index is not None and index > self.chunks:
+                raise ValueError(f"Chunk {index} arrived out of order, expected chunk {self.chunks}")
+            try:
+                if self.size + len(chunk) > self.max_bytes:
+                    raise ValueError(f"The email is larger than the limit of {self.max_bytes} bytes")
+                self._raw.write(chunk)
+                self.size += len(chunk)
+                self.chunks += 1
+                self.updated_at = time.monotonic()
+                if self._in_body:
+                    self._add_body(chunk)
+                else:
+                    self._add_header_bytes(chunk)
+            except ValueError as e:
+                self.error = str(e)
+                raise
+            return True
+
+    def _add_header_bytes(self, chunk: bytes) -> None:
+        data = self._line + chunk
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end == -1:
+                break
+            line = data[start:end]
+            start = end + 1
+            if self._add_header_line(line[:-1] if line.endswith(b"\r") else line):
+                self._line = b""
+                self._start_body()
+                self._add_body(data[start:])
+                return
+        self._line = data[start:]
+        if self._header_bytes + len(self._line) > MAX_HEADER_BYTES:
+            raise ValueError(f"The email headers are larger than {MAX_HEADER_BYTES} bytes")
+
+    def _add_header_line(self, line: bytes) -> bool:
+        # True at the empty line that ends the header block
+        self._header_bytes += len(line) + 2
+        if self._header_bytes > MAX_HEADER_BYTES:
+            raise ValueError(f"The email headers are larger than {MAX_HEADER_BYTES} bytes")
+        if not line:
+            self._end_field()
+            return True
+        if line[:1] in (b" ", b"\t") and self._field:
+            self._field += line + b"\r\n"
+            return False
+        self._end_field()
+        if b":" in line:
+            self._field = line + b"\r\n"
+        return False
+
+    def _end_field(self) -> None:
+        if self._field:
+            self.headers.append((self._field.split(b":", 1)[0].strip().lower(), self._field))
+            self._field = b""
+
+    def _start_body(self) -> None:
+        self._in_body = True
+        for name, field in self.headers:
+            if name != b"dkim-signature":
+                continue
+            signature = parse_tag_list(field.split(b":", 1)[1])
+            key = (signature.get("c", ""), signature.get("a", ""), signature.get("l", ""))
+            if key not in self._hashers:
+                try:
+                    self._hashers[key] = body_hasher_for(signature)
+                except ValueError:
+                    # Left to verify_signature_header() to report
+                    key = None
+            self._signature_hashers.append(key)
+
+    def _add_body(self, data: bytes) -> None:
+        if not data:
+            return
+        if len(self._body_prefix) < DIGEST_BODY_BYTES:
+            self._body_prefix += data[:DIGEST_BODY_BYTES - len(self._body_prefix)]
+        for hasher in self._hashers.values():
+            hasher.update(data)
+
+    def finish(self, resolver: Optional[KeyResolver] = None) -> Dict[str, Any]:
+        """
+        Verify the DKIM signatures of the assembled email, the same result as
+        verify_dkim_signature(). Repeated calls return the first result.
+        """
+        with self._lock:
+            if self._result is not None:
+                return self._result
+            with skill_span("dkim.verify_assembled", **{"email.bytes": self.size, "email.chunks": self.chunks}):
+                self._result = self._verify(resolver or get_default_resolver())
+                annotate({"success": self._result["success"], "dkim.domain": self._result.get("domain")})
+            return self._result
+
+    def _verify(self, resolver: KeyResolver) -> Dict[str, Any]:
+        if self.error is not None:
+            return {"success": False, "error": self.error, "signatures": []}
+        try:
+            if not self._in_body:
+                # No body: the last line of the header block may still be pending
+                if self._line:
+                    self._add_header_line(self._line[:-1] if self._line.endswith(b"\r") else self._line)
+                    self._line = b""
+                self._end_field()
+                self._start_body()
+            signature_fields = [field for name, field in self.headers if name == b"dkim-signature"]
+            if not signature_fields:
+                return {"success": False, "error": "The email has no DKIM-Signature header", "signatures": []}
+            body_hashes = {key: hasher.digest() for key, hasher in self._hashers.items()}
+            signatures = []
+            for field, key in zip(signature_fields, self._signature_hashers):
+                if key is None:
+                    signatures.append(verify_signature_header(self.headers, field, resolver, body=b""))
+                else:
+                    signatures.append(verify_signature_header(self.headers, field, resolver, body_hash=body_hashes[key]))
+            return dkim_result(signatures)
+        except Exception as e:
+            return {"success": False, "error": f"Error verifying DKIM signature: {str(e)}", "signatures": []}
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "chunks": self.chunks,
+                "bytes": self.size,
+                "headers_complete": self._in_body,
+                "headers": len(self.headers),
+                "dkim_signatures": len(self._signature_hashers) if self._in_body else sum(1 for name, _ in self.headers if name == b"dkim-signature"),
+                "complete": self._result is not None,
+            }
+
+    def email_digest(self) -> Dict[str, Any]:
+        """
+        build_email_digest() of the headers and the start of the body.
+        """
+        with self._lock:
+            head = b"".join(field for _, field in self.headers) + b"\r\n" + bytes(self._body_prefix)
+        digest = build_email_digest(head)
+        digest["raw_size"] = self.size
+        if len(self._body_prefix) >= DIGEST_BODY_BYTES:
+            digest["body_truncated"] = True
+        return digest
+
+    def raw_email(self) -> bytes:
+        """
+        The complete email as it was pasted, read back from the spool.
+        """
+        with self._lock:
+            self._raw.seek(0)
+            raw = self._raw.read()
+            self._raw.seek(0, os.SEEK_END)
+            return raw
+
+    def close(self) -> None:
+        self._raw.close()
+
+    def __enter__(self) -> "EmailAssembler":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def format_assembly_status(status: Dict[str, Any]) -> str:
+    headers = f"{status['headers']} headers, {status['dkim_signatures']} DKIM signatures" if status["headers_complete"] else "reading headers"
+    return f"Received {status['chunks']} chunks ({status['bytes']} bytes), {headers}. Paste the next part, or the last one and verify."
+
+def as_email_lines(chunk: str) -> str:
+    """
+    A part pasted in a text box loses the line break at its end, the parts are whole lines.
+    """
+    return chunk if chunk.endswith(("\n", "\r")) else chunk + "\n"
+
+_assemblies: "OrderedDict[str, EmailAssembler]" = OrderedDict()
+_assemblies_lock = threading.Lock()
+
+def _expire_assemblies() -> None:
+    # Caller holds _assemblies_lock
+    now = time.monotonic()
+    for key in [key for key, assembler in _assemblies.items() if now - assembler.updated_at > ASSEMBLY_TTL_SECONDS]:
+        _assemblies.pop(key).close()
+    while len(_assemblies) > MAX_ASSEMBLIES:
+        _assemblies.popitem(last=False)[1].close()
+
+def get_email_assembler(key: str, create: bool = True) -> Optional[EmailAssembler]:
+    """
+    The email being assembled for a session, a new one is started unless
+    `create` is False. Idle assemblies expire after ASSEMBLY_TTL_SECONDS and
+    only the most recently used MAX_ASSEMBLIES are kept.
+    """
+    with _assemblies_lock:
+        _expire_assemblies()
+        assembler = _assemblies.get(key)
+        if assembler is None and create:
+            assembler = _assemblies[key] = EmailAssembler()
+        if assembler is not None:
+            _assemblies.move_to_end(key)
+        return assembler
+
+def pop_email_assembler(key: str) -> Optional[EmailAssembler]:
+    """
+    Take the session's email out of the registry, the caller closes it when done.
+    """
+    with _assemblies_lock:
+        return _assemblies.pop(key, None)
+
+def add_email_chunk(key: str, chunk: Union[str, bytes], index: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Add the next chunk of the session's email.
+
+    Args:
+        key (str): The session, e.g. the application ID
+        chunk (str | bytes): The next part of the raw email, added exactly as given
+        index (int): The chunk's position from 0 (optional), see EmailAssembler.add()
+
+    Returns:
+        Dict[str, Any]: success, and the assembly status or the error
+    """
+    assembler = get_email_assembler(key)
+    try:
+        added = assembler.add(chunk, index)
+    except ValueError as e:
+        if assembler.error is None:
+            return {"success": False, "error": str(e)}
+        pop_email_assembler(key)
+        assembler.close()
+        return {"success": False, "error": f"{str(e)}, the email was discarded"}
+    return {"success": True, "duplicate": not added, "status": assembler.status()}
+
+def finish_email_assembly(key: str, last_chunk: Union[str, bytes, None] = None, resolver: Optional[KeyResolver] = None) -> Optional[EmailAssembler]:
+    """
+    Take the session's email out of the registry, add the last chunk and
+    verify it, the result is then available from finish(). None when no email
+    is being assembled for the session. The caller closes the assembler,
+    e.g. with a `with` block.
+    """
+    assembler = pop_email_assembler(key)
+    if assembler is None:
+        return None
+    try:
+        if last_chunk:
+            try:
+                assembler.add(last_chunk)
+            except ValueError:
+                pass  # finish() reports it
+        assembler.finish(resolver)
+    except BaseException:
+        # Out of the registry already, nobody else would close it
+        assembler.close()
+        raise
+    return assembler
@@ -0,0 +1,141 @@
+import email
+import html
+import re
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from email.utils import getaddresses, parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Union
+
+from dkim_verify import parse_tag_list
+
+# Local pre-processing of a raw email before anything is sent to the email
+# assistant. Instead of the first few hundred characters of the raw message
+# the assistant gets a compact digest: the identity headers, the DKIM
+# signatures and the headers they sign, the relay path and the decoded text.
+
+MAX_BODY_CHARS = 1500
+MAX_RECEIVED = 5
+MAX_HEADER_CHARS = 300
+IDENTITY_HEADERS = ("from", "to", "cc", "reply-to", "subject", "date", "message-id")
+
+def _header(message: EmailMessage, name: str) -> Optional[str]:
+    try:
+        value = message.get(name)
+    except Exception:
+        # policy.default parses structured headers on access, fall back to the raw value
+        raw = [v for k, v in message.raw_items() if k.lower() == name]
+        value = raw[0] if raw else None
+    if value is None:
+        return None
+    return " ".join(str(value).split())[:MAX_HEADER_CHARS]
+
+def _addresses(message: EmailMessage, name: str) -> List[Dict[str, str]]:
+    addresses = []
+    for display_name, address in getaddresses([str(v) for v in message.get_all(name, [])]):
+        if address:
+            addresses.append({"name": display_name, "address": address.lower(), "domain": address.rpartition("@")[2].lower()})
+    return addresses
+
+def _html_to_text(markup: str) -> str:
+    markup = re.sub(r"(?is)<(script|style).*?</\1>", " ", markup)
+    markup = re.sub(r"(?i)<br\s*/?>|</p>|</div>|</tr>", "\n", markup)
+    return html.unescape(re.sub(r"<[^>]+>", " ", markup))
+
+def _body_text(message: EmailMessage) -> str:
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    try:
+        content = part.get_content()
+    except (LookupError, ValueError):
+        content = part.get_payload(decode=True).decode("utf-8", errors="replace")
+    if part.get_content_subtype() == "html":
+        content = _html_to_text(content)
+    # Quoted replies and blank runs only cost tokens
+    lines = [line.strip() for line in content.splitlines() if not line.lstrip().startswith(">")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+def from_addresses(raw_email: Union[str, bytes]) -> List[str]:
+    """
+    The From addresses of a raw email, lowercased, parsing its headers only.
+    """
+    if isinstance(raw_email, str):
+        raw_email = raw_email.encode("utf-8", errors="surrogateescape")
+    headers = BytesParser(policy=policy.default).parsebytes(raw_email, headersonly=True)
+    return [address["address"] for address in _addresses(headers, "from")]
+
+def build_email_digest(raw_email: Union[str, bytes], max_body_chars: int = MAX_BODY_CHARS) -> Dict[str, Any]:
+    """
+    Parse a raw email and keep only what's needed to match it against the application.
+
+    Args:
+        raw_email (Union[str, bytes]): The raw email, headers included
+        max_body_chars (int): How much of the decoded text to keep
+
+    Returns:
+        Dict[str, Any]: from/to addresses, identity headers, DKIM signatures
+        with the values of the headers they sign, the first Received hops,
+        the decoded text (truncated) and attachment names
+    """
+    if isinstance(raw_email, str):
+        raw_email = raw_email.encode("utf-8", errors="surrogateescape")
+    message = email.message_from_bytes(raw_email, policy=policy.default)
+
+    signatures = []
+    for value in message.get_all("dkim-signature", []):
+        tags = parse_tag_list(str(value))
+        signed = [name.strip().lower() for name in tags.get("h", "").split(":") if name.strip()]
+        signatures.append({
+            "domain": tags.get("d"),
+            "selector": tags.get("s"),
+            "algorithm": tags.get("a"),
+            "signed_headers": signed,
+        })
+    signed_names = []
+    for signature in signatures:
+        signed_names.extend(name for name in signature["signed_headers"] if name not in signed_names)
+
+    date = _header(message, "date")
+    try:
+        date_iso = parsedate_to_datetime(date).isoformat() if date else None
+    except (TypeError, ValueError):
+        date_iso = None
+
+    body = _body_text(message)
+    attachments = [part.get_filename() for part in message.iter_attachments() if part.get_filename()]
+    return {
+        "from": _addresses(message, "from"),
+        "to": _addresses(message, "to"),
+        "headers": {name: _header(message, name) for name in IDENTITY_HEADERS if name in message},
+        "date_iso": date_iso,
+        "dkim_signatures": signatures,
+        "signed_headers": {name: _header(message, name) for name in signed_names if name in message},
+        "received": [" ".join(str(hop).split())[:MAX_HEADER_CHARS] for hop in message.get_all("received", [])[:MAX_RECEIVED]],
+        "body_text": body[:max_body_chars],
+        "body_truncated": len(body) > max_body_chars,
+        "attachments": attachments,
+        "raw_size": len(raw_email),
+    }
+
+def format_email_digest(digest: Dict[str, Any]) -> str:
+    """
+    Render a digest as compact text for the email assistant's prompt
+    """
+    lines = []
+    for name, value in digest["headers"].items():
+        lines.append(f"{name.title()}: {value}")
+    if digest["date_iso"]:
+        lines.append(f"Date (ISO): {digest['date_iso']}")
+    for signature in digest["dkim_signatures"]:
+        lines.append(f"DKIM-Signature: d={signature['domain']} s={signature['selector']} a={signature['algorithm']} h={':'.join(signature['signed_headers'])}")
+    extra_signed = {name: value for name, value in digest["signed_headers"].items() if name not in digest["headers"]}
+    for name, value in extra_signed.items():
+        lines.append(f"Signed {name}: {value}")
+    for hop in digest["received"]:
+        lines.append(f"Received: {hop}")
+    if digest["attachments"]:
+        lines.append(f"Attachments: {', '.join(digest['attachments'])}")
+    lines.append(f"Body{' (truncated)' if digest['body_truncated'] else ''}:")
+    lines.append(digest["body_text"] or "(no text part)")
+    return "\n".join(lines)
@@ -1,53 +1,319 @@
-import requests
+import io
+import multiprocessing
 import os
-import PyPDF2
-from typing import Annotated
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Annotated, Any, BinaryIO, Dict, Iterator, List, Optional, Union
+import http_client
 from urllib.parse import urlparse
+from pdf_cache import get_pdf_cache, content_hash, file_content_hash, text_cache_key
+from pdf_signature import check_signatures, map_pdf
+from telemetry import annotate, skill_span, traced_skill
+from verification_coordinator import get_verification_coordinator, request_key
 
-def download_pdf(url: Annotated[str, "the pdf file url"]) -> str:
-    response = requests.get(url)
+# Hard cap on the size of a downloaded PDF. Anything bigger is rejected while
+# streaming, before it is fully read.
+MAX_PDF_BYTES = 25 * 1024 * 1024
+# Downloads up to this size stay in memory, bigger ones spill to a temp file.
+SPOOL_MAX_MEMORY = 5 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# PDFs with fewer pages than this are always extracted serially, the process
+# pool overhead isn't worth it for a couple of salary slip pages.
+PARALLEL_PAGE_THRESHOLD = 32
+PAGES_PER_TASK = 8
+# Number of extraction processes, 0 or 1 disables the process pool.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+# The pool is started from a threaded server, where forking could copy a lock
+# another thread holds. forkserver where the platform has it, spawn otherwise.
+PDF_EXTRACT_START_METHOD = os.getenv("PDF_EXTRACT_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+# In a worker process: (document, reader) for the last document it opened
+_worker_reader = None
+
+def download_pdf(url: Annotated[str, "the pdf file url"], max_bytes: int = MAX_PDF_BYTES) -> BinaryIO:
+    """
+    Stream a PDF from a URL into a spooled buffer.
+
+    The body is never written into the working directory, so concurrent downloads
+    of files with the same name can't collide. The caller owns the returned buffer
+    and should close it when done.
+
+    Args:
+        url (str): The URL of the PDF file
+        max_bytes (int): Maximum number of bytes to accept
+
+    Returns:
+        BinaryIO: A buffer positioned at the start of the PDF content
+    """
+    with skill_span("pdf.download", **{"url.host": urlparse(url).hostname}) as span, http_client.stream("GET", url) as response:
+        _check_pdf_response(response, max_bytes)
+        buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        try:
+            size = 0
+            for chunk in response.iter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"PDF exceeds the size limit of {max_bytes} bytes.")
+                buffer.write(chunk)
+        except Exception:
+            buffer.close()
+            raise
+        annotate({"pdf.bytes": size}, span)
+
+    buffer.seek(0)
+    return buffer
+
+async def download_pdf_async(url: str, max_bytes: int = MAX_PDF_BYTES) -> BinaryIO:
+    """
+    Async version of download_pdf(), so several downloads can be awaited concurrently.
+    """
+    async with http_client.astream("GET", url) as response:
+        _check_pdf_response(response, max_bytes)
+        buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        try:
+            size = 0
+            async for chunk in response.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"PDF exceeds the size limit of {max_bytes} bytes.")
+                buffer.write(chunk)
+        except Exception:
+            buffer.close()
+            raise
+
+    buffer.seek(0)
+    return buffer
+
+def _check_pdf_response(response, max_bytes: int) -> None:
     if response.status_code != 200:
         raise Exception(f"Failed to download PDF. Status code: {response.status_code}")
-    filename = os.path.basename(urlparse(url).path)
-    with open(filename, 'wb') as f:
-        f.write(response.content)
-    return filename
 
-def extract_text_from_pdf(pdf_file: Annotated[str, "the local pdf file path"], password: Annotated[str, "PDF password (optional)"] = None) -> str:
-    with open(pdf_file, "rb") as file:
-        reader = PyPDF2.PdfReader(file)
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise ValueError(f"PDF is too large ({content_length} bytes, limit is {max_bytes} bytes).")
 
-        if reader.is_encrypted:
-            if password is None:
-                raise ValueError("The PDF is encrypted and requires a password.")
-            try:
-                reader.decrypt(password)
-            except:
-                raise ValueError("Incorrect password for the PDF.")
+def open_pdf_reader(pdf_file: Union[str, BinaryIO], password: str = None) -> "PyPDF2.PdfReader":
+    """
+    Open a PDF from a path or a binary buffer and decrypt it if needed.
+    """
+    # Imported here so that importing the skills doesn't pay for PyPDF2
+    import PyPDF2
+    reader = PyPDF2.PdfReader(pdf_file)
 
-        return "".join(page.extract_text() for page in reader.pages)
+    if reader.is_encrypted:
+        if password is None:
+            raise ValueError("The PDF is encrypted and requires a password.")
+        try:
+            decrypted = reader.decrypt(password)
+        except:
+            decrypted = False
+        if not decrypted:
+            raise ValueError("Incorrect password for the PDF.")
 
-def process_pdf_from_url(url: Annotated[str, "the pdf file url"], password: Annotated[str, "PDF password (optional)"] = None) -> str:
+    return reader
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            context = multiprocessing.get_context(PDF_EXTRACT_START_METHOD)
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_extract_worker)
+        return _process_pool
+
+def _init_extract_worker() -> None:
+    # Workers start without the parent's modules, import PyPDF2 before the first task
+    global _worker_reader
+    import PyPDF2
+    _worker_reader = None
+
+def _worker_pdf_reader(document: str, source: str, password: Optional[str], shm_size: int = None) -> "PyPDF2.PdfReader":
+    """
+    The worker's reader for `document`, parsed on the worker's first task for
+    it and reused by the following ones.
+
+    `source` is either a file path or, when `shm_size` is given, the name of a
+    shared memory block holding the PDF bytes.
+    """
+    global _worker_reader
+    if _worker_reader is not None and _worker_reader[0] == document:
+        return _worker_reader[1]
+    _worker_reader = None
+    if shm_size is None:
+        reader = open_pdf_reader(source, password)
+    else:
+        shm = shared_memory.SharedMemory(name=source)
+        try:
+            data = bytes(shm.buf[:shm_size])
+        finally:
+            shm.close()
+        reader = open_pdf_reader(io.BytesIO(data), password)
+    _worker_reader = (document, reader)
+    return reader
+
+def _extract_page_range(document: str, source: str, password: Optional[str], start: int, stop: int, shm_size: int = None) -> List[str]:
+    """
+    Extract pages [start, stop) of `document` in a worker process.
+    """
+    reader = _worker_pdf_reader(document, source, password, shm_size)
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+def _iter_pages_parallel(pdf_file: Union[str, BinaryIO], password: Optional[str], num_pages: int, workers: int) -> Iterator[str]:
+    shm = None
+    if isinstance(pdf_file, str):
+        source, shm_size = pdf_file, None
+    else:
+        # Hand the buffer to the workers through shared memory instead of
+        # pickling a copy of the whole PDF into every task.
+        pdf_file.seek(0)
+        data = pdf_file.read()
+        shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        shm.buf[:len(data)] = data
+        source, shm_size = shm.name, len(data)
+        del data
+
+    # Each worker parses the document once, on its first task for this id
+    document = uuid.uuid4().hex
+    pool = _get_process_pool(workers)
+    futures = [
+        pool.submit(_extract_page_range, document, source, password, start, min(start + PAGES_PER_TASK, num_pages), shm_size)
+        for start in range(0, num_pages, PAGES_PER_TASK)
+    ]
     try:
-        # Download the PDF
-        local_file = download_pdf(url)
-        print(f"PDF downloaded as: {local_file}")
+        # Results are consumed in submission order, so pages come back in order
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        if shm is not None:
+            # Running tasks still hold their own attachment, wait for them
+            # before releasing the block.
+            for future in futures:
+                if not future.cancelled():
+                    future.exception()
+            shm.close()
+            shm.unlink()
+
+def iter_pdf_pages(pdf_file: Union[str, BinaryIO], password: str = None, workers: int = None) -> Iterator[str]:
+    """
+    Yield the text of a PDF one page at a time.
 
-        # Extract text from the downloaded PDF
-        text = extract_text_from_pdf(local_file, password)
+    Pages are only extracted as they are consumed, so callers that need just the
+    start of a document can stop early. Documents with at least
+    PARALLEL_PAGE_THRESHOLD pages are split across a process pool and the text
+    is reassembled in page order.
 
-        # Clean up: remove the downloaded file
-        os.remove(local_file)
-        print(f"Removed temporary file: {local_file}")
+    Args:
+        pdf_file (str | BinaryIO): A local file path or a binary buffer
+        password (str): PDF password (optional)
+        workers (int): Number of extraction processes, defaults to PDF_EXTRACT_WORKERS
 
-        return text
+    Yields:
+        str: The extracted text of each page, in order
+    """
+    if workers is None:
+        workers = PDF_EXTRACT_WORKERS
+
+    if isinstance(pdf_file, str):
+        with open(pdf_file, "rb") as file:
+            reader = open_pdf_reader(file, password)
+            num_pages = len(reader.pages)
+            annotate({"pdf.pages": num_pages, "pdf.encrypted": reader.is_encrypted, "pdf.parallel": workers > 1 and num_pages >= PARALLEL_PAGE_THRESHOLD})
+            if workers > 1 and num_pages >= PARALLEL_PAGE_THRESHOLD:
+                yield from _iter_pages_parallel(pdf_file, password, num_pages, workers)
+            else:
+                for page in reader.pages:
+                    yield page.extract_text()
+        return
+
+    reader = open_pdf_reader(pdf_file, password)
+    num_pages = len(reader.pages)
+    annotate({"pdf.pages": num_pages, "pdf.encrypted": reader.is_encrypted, "pdf.parallel": workers > 1 and num_pages >= PARALLEL_PAGE_THRESHOLD})
+    if workers > 1 and num_pages >= PARALLEL_PAGE_THRESHOLD:
+        yield from _iter_pages_parallel(pdf_file, password, num_pages, workers)
+        return
+
+    for page in reader.pages:
+        yield page.extract_text()
+
+@traced_skill("pdf.extract", lambda text: {"pdf.text_chars": len(text)})
+def extract_text_from_pdf(pdf_file: Annotated[str, "the local pdf file path"], password: Annotated[str, "PDF password (optional)"] = None) -> str:
+    return "\n".join(iter_pdf_pages(pdf_file, password))
+
+def iter_cached_pdf_pages(pdf_file: Union[str, BinaryIO], digest: str, password: str = None) -> Iterator[str]:
+    """
+    Yield page text from the PDF cache, extracting and caching it on a miss.
+
+    The text is only cached once every page has been extracted, a caller that
+    stops early leaves the cache untouched.
+    """
+    cache = get_pdf_cache()
+    key = text_cache_key(digest, password)
+    entry = cache.get(key)
+    annotate({"pdf.cache_hit": entry is not None})
+    if entry is not None:
+        yield from entry["pages"]
+        return
+
+    pages = []
+    for page_text in iter_pdf_pages(pdf_file, password):
+        pages.append(page_text)
+        yield page_text
+    cache.set(key, {"pages": pages, "num_pages": len(pages)})
+
+def iter_pdf_pages_from_url(url: str, password: str = None, max_bytes: int = MAX_PDF_BYTES, use_cache: bool = True) -> Iterator[str]:
+    """
+    Download a PDF into a spooled buffer and yield its text page by page.
+
+    The buffer is closed once the generator is exhausted or closed.
+    """
+    buffer = download_pdf(url, max_bytes)
+    with buffer:
+        if use_cache:
+            yield from iter_cached_pdf_pages(buffer, content_hash(buffer), password)
+        else:
+            yield from iter_pdf_pages(buffer, password)
+
+@traced_skill("pdf.process_url", lambda text: {"pdf.text_chars": len(text)})
+def process_pdf_from_url(url: Annotated[str, "the pdf file url"], password: Annotated[str, "PDF password (optional)"] = None) -> str:
+    try:
+        return "\n".join(iter_pdf_pages_from_url(url, password))
     except Exception as e:
         print(f"An error occurred: {str(e)}")
         return ""
 
+@traced_skill("pdf.process_signed_url", lambda result: {"success": result["success"], "pdf.signature_status": result.get("signature_status")})
+def process_signed_pdf_from_url(url: Annotated[str, "the pdf file url"], password: Annotated[str, "PDF password (optional)"] = None) -> Dict[str, Any]:
+    """
+    Download a PDF once, verify its digital signatures and extract its text.
+
+    Returns:
+        Dict[str, Any]: {"success", "text", "signature_status", "signatures"}, or {"success": False, "error"}
+    """
+    try:
+        # Keyed on the URL, the content hash is only known once the download is done
+        return get_verification_coordinator().run("pdf", request_key(url, password), _process_signed_pdf, url, password)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+def _process_signed_pdf(url: str, password: Optional[str]) -> Dict[str, Any]:
+    with download_pdf(url) as buffer:
+        # The content hash for the text cache comes out of the signature pass
+        with map_pdf(buffer) as data:
+            signatures = check_signatures(data, file_hashes=("sha256",))
+        buffer.seek(0)
+        text = "\n".join(iter_cached_pdf_pages(buffer, signatures["hashes"]["sha256"], password))
+    return {"success": True, "text": text, "signature_status": signatures["status"], "signatures": signatures["signatures"]}
+
+@traced_skill("pdf.process_local", lambda text: {"pdf.text_chars": len(text)})
 def process_local_pdf(file_path: Annotated[str, "local pdf file path"], password: Annotated[str, "PDF password (optional)"] = None) -> str:
     try:
-        return extract_text_from_pdf(file_path, password)
+        return "\n".join(iter_cached_pdf_pages(file_path, file_content_hash(file_path), password))
     except Exception as e:
         print(f"An error occurred: {str(e)}")
         return ""
@@ -60,9 +326,14 @@ def process_local_pdf(file_path: Annotated[str, "local pdf file path"], password
 # print("Extracted text from URL:")
 # print(text_from_url)
 
+# # Stop after the first page(s) when only a preview is needed
+# for page_text in iter_pdf_pages_from_url(pdf_url, pdf_password):
+#     print(page_text)
+#     break
+
 # # For a local PDF file
 # local_pdf_path = "path/to/local/bank-statement-2.pdf"  # Replace with actual local path
 # local_pdf_password = "your_local_pdf_password"  # Replace with actual password if needed
 # text_from_local = process_local_pdf(local_pdf_path, local_pdf_password)
 # print("Extracted text from local file:")
-# print(text_from_local)
\ No newline at end of file
+# print(text_from_local)
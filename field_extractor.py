@@ -0,0 +1,396 @@
+import json
+import os
+import re
+import threading
+from typing import Annotated, Any, Dict, List, Optional, Tuple
+
+from telemetry import traced_skill
+
+# Local extraction of the salary slip and bank statement fields from the text
+# of extract_text_from_pdf(), so the model only has to look at the fields the
+# rules aren't sure about instead of reading the whole document.
+#
+# A bank profile lists, per field, the labels that introduce its value with the
+# confidence of each label, and layout hints: whether amounts use a decimal
+# comma and whether a value may sit on the line below its label (tables). The
+# profile of the applicant's bank is tried first, the default profile's labels
+# after it. FIELD_PROFILES_PATH points to a JSON file with more profiles, or
+# overrides for these, in the same shape.
+
+FIELD_PROFILES_PATH = os.getenv("FIELD_PROFILES_PATH", "")
+# Fields below this confidence are left to the model
+LOW_CONFIDENCE_THRESHOLD = float(os.getenv("FIELD_LOW_CONFIDENCE", 0.7))
+# Confidence of a field the model filled in
+LLM_FIELD_CONFIDENCE = 0.75
+# Characters of document excerpts sent to the model
+MAX_EXCERPT_CHARS = 1500
+# Part of the document searched for the bank's name when it isn't known
+BANK_DETECTION_CHARS = 2000
+
+# field -> (kind of value, which occurrence wins)
+FIELDS = {
+    "account_number": ("account", "first"),
+    "balance": ("amount", "last"),
+    "employer": ("text", "first"),
+    "pay_period": ("period", "first"),
+    "net_pay": ("amount", "first"),
+}
+# The fields each kind of document should have, only these can be left to the model
+DOCUMENT_FIELDS = {
+    "salary_slip": ("account_number", "employer", "pay_period", "net_pay"),
+    "statement": ("account_number", "balance"),
+}
+
+BANK_PROFILES = {
+    "default": {
+        "match": None,
+        "decimal_comma": None,
+        "value_below": True,
+        "fields": {
+            "account_number": [["iban", 0.95], ["account (?:number|no\\.?|nr\\.?)", 0.9], ["account", 0.8]],
+            "balance": [["(?:closing|ending|end|new) balance", 0.95], ["available balance", 0.9], ["balance", 0.8]],
+            "employer": [["employer(?: name)?", 0.9], ["company(?: name)?", 0.75]],
+            "pay_period": [["(?:pay|salary) period", 0.95], ["statement period", 0.9], ["period", 0.8], ["pay date", 0.7]],
+            "net_pay": [["net (?:pay|salary|wages?|amount|income)", 0.95], ["take[- ]home(?: pay)?", 0.85], ["amount paid", 0.75]],
+        },
+    },
+    "ing": {
+        "match": "\\bING\\b|ing\\.nl",
+        "decimal_comma": True,
+        "fields": {
+            "account_number": [["rekeningnummer", 0.95]],
+            "balance": [["nieuw saldo", 0.95], ["saldo", 0.8]],
+            "pay_period": [["periode", 0.85]],
+        },
+    },
+    "rabobank": {
+        "match": "rabo",
+        "decimal_comma": True,
+        "fields": {
+            "account_number": [["rekeningnummer", 0.95], ["rekening", 0.85]],
+            "balance": [["eindsaldo", 0.95], ["saldo", 0.8]],
+            "pay_period": [["periode", 0.85]],
+        },
+    },
+    "abn_amro": {
+        "match": "abn\\s*amro",
+        "decimal_comma": True,
+        "fields": {
+            "account_number": [["rekeningnummer", 0.95]],
+            "balance": [["nieuw saldo", 0.95], ["saldo", 0.8]],
+            "pay_period": [["periode", 0.85]],
+        },
+    },
+    "payslip_nl": {
+        "match": "loonstrook|salarisstrook",
+        "decimal_comma": True,
+        "fields": {
+            "account_number": [["rekeningnummer", 0.9]],
+            "employer": [["werkgever", 0.9]],
+            "pay_period": [["(?:loon|salaris)?periode", 0.9]],
+            "net_pay": [["netto (?:loon|salaris|uitbetaling)", 0.95], ["netto", 0.8]],
+        },
+    },
+}
+
+CURRENCY = r"(?:[€$£]|EUR|USD|GBP|CHF)"
+AMOUNT = re.compile(rf"(?P<currency>{CURRENCY})?\s?(?P<amount>-?\d{{1,3}}(?:[.,' ]\d{{3}})+(?:[.,]\d{{1,2}})?|-?\d+(?:[.,]\d{{1,2}})?)(?!\d)\s?(?P<currency_after>{CURRENCY})?", re.IGNORECASE)
+IBAN = re.compile(r"\b([A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?)\b")
+ACCOUNT_DIGITS = re.compile(r"\b(\d[\d -]{5,20}\d)\b")
+DATE = r"(?:\d{4}-\d{2}-\d{2}|\d{1,2}[./-]\d{1,2}[./-]\d{2,4}|\d{1,2} [A-Za-z]{3,9}\.? \d{4}|[A-Za-z]{3,9}\.? \d{4}|\d{1,2}[./-]\d{4})"
+PERIOD = re.compile(rf"({DATE}(?:\s*(?:-|–|to|until|t/m|tot)\s*{DATE})?)", re.IGNORECASE)
+PERIOD_RANGE = re.compile(rf"({DATE}\s*(?:-|–|to|until|t/m|tot)\s*{DATE})", re.IGNORECASE)
+# Where a text value ends on its line
+TEXT_END = re.compile(r"\s+-\s+|\s{2,}|\t|\|")
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+def _load_profiles() -> Dict[str, Dict[str, Any]]:
+    profiles = {name: dict(profile) for name, profile in BANK_PROFILES.items()}
+    if FIELD_PROFILES_PATH:
+        try:
+            with open(FIELD_PROFILES_PATH, "r", encoding="utf-8") as f:
+                for name, profile in json.load(f).items():
+                    profiles[name] = {**profiles.get(name, {}), **profile}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring FIELD_PROFILES_PATH, it could not be loaded: {str(e)}")
+    return profiles
+
+def _compile_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    fields = {}
+    for field, labels in (profile.get("fields") or {}).items():
+        fields[field] = [(re.compile(rf"(?<![A-Za-z]){label}(?![A-Za-z])\s*[:#]?\s*", re.IGNORECASE), confidence) for label, confidence in labels]
+    return {
+        "match": re.compile(profile["match"], re.IGNORECASE) if profile.get("match") else None,
+        "decimal_comma": profile.get("decimal_comma"),
+        "value_below": profile.get("value_below", True),
+        "fields": fields,
+    }
+
+def get_field_profiles() -> Dict[str, Dict[str, Any]]:
+    """
+    The bank profiles with their patterns compiled, built once per process.
+    """
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            _profiles = {name: _compile_profile(profile) for name, profile in _load_profiles().items()}
+        return _profiles
+
+def detect_bank(text: str, bank: str = None) -> str:
+    """
+    The profile for the applicant's bank, by its name when given, else by the
+    start of the document. "default" when none matches.
+    """
+    profiles = get_field_profiles()
+    for haystack in ([bank] if bank else []) + [text[:BANK_DETECTION_CHARS]]:
+        for name, profile in profiles.items():
+            if profile["match"] is not None and profile["match"].search(haystack):
+                return name
+    return "default"
+
+def iban_is_valid(iban: str) -> bool:
+    """
+    ISO 13616 mod-97 check of an IBAN without spaces.
+    """
+    rearranged = iban[4:] + iban[:4]
+    try:
+        return int("".join(str(int(c, 36)) for c in rearranged)) % 97 == 1
+    except ValueError:
+        return False
+
+def parse_amount(raw: str, decimal_comma: Optional[bool] = None) -> Tuple[Optional[str], bool]:
+    """
+    Normalize an amount to "1234.56", guessing the decimal separator unless the
+    layout says. Returns the amount and whether the guess was ambiguous, e.g.
+    "1.234" could be either 1234 or 1.234.
+    """
+    raw = raw.replace(" ", "").replace("'", "")
+    separators = [c for c in raw if c in ".,"]
+    ambiguous = False
+    if not separators:
+        decimal = None
+    elif len(set(separators)) == 2:
+        decimal = raw[max(raw.rfind("."), raw.rfind(","))]
+    elif decimal_comma is not None:
+        decimal = "," if decimal_comma else "."
+        if separators[0] != decimal and len(separators) == 1 and len(raw) - raw.rfind(separators[0]) - 1 != 3:
+            decimal = separators[0]
+    elif len(separators) == 1 and len(raw) - raw.rfind(separators[0]) - 1 != 3:
+        decimal = separators[0]
+    else:
+        # One or more separators followed by three digits, most likely thousands
+        decimal = None
+        ambiguous = len(separators) == 1
+    if decimal is None or decimal not in raw:
+        digits = raw.replace(".", "").replace(",", "")
+    else:
+        whole, _, fraction = raw.rpartition(decimal)
+        digits = whole.replace(".", "").replace(",", "") + "." + fraction
+    try:
+        return f"{float(digits):.2f}", ambiguous
+    except ValueError:
+        return None, False
+
+def _parse_value(kind: str, text: str, decimal_comma: Optional[bool]) -> Optional[Tuple[str, float, Dict[str, Any]]]:
+    # (value, confidence factor, extra keys) for the start of `text`, None when it holds no value
+    if kind == "account":
+        match = IBAN.match(text.upper())
+        if match:
+            iban = match.group(1).replace(" ", "")
+            return iban, (1.05 if iban_is_valid(iban) else 0.7), {}
+        match = ACCOUNT_DIGITS.match(text)
+        if match:
+            return re.sub(r"[ -]", "", match.group(1)), 0.85, {}
+        return None
+    if kind == "amount":
+        match = AMOUNT.search(text[:40])
+        if not match:
+            return None
+        amount, ambiguous = parse_amount(match.group("amount"), decimal_comma)
+        if amount is None:
+            return None
+        currency = (match.group("currency") or match.group("currency_after") or "").upper()
+        return amount, (0.8 if ambiguous else 1.0), ({"currency": {"€": "EUR", "$": "USD", "£": "GBP"}.get(currency, currency)} if currency else {})
+    if kind == "period":
+        match = PERIOD.match(text)
+        return (match.group(1).strip(), 1.0, {}) if match else None
+    value = TEXT_END.split(text, 1)[0].strip(" :;,")
+    if not re.search(r"[A-Za-z]", value):
+        return None
+    return value, (0.6 if len(value) > 60 else 1.0), {}
+
+def _candidates(field: str, lines: List[str], labels: List[Tuple[re.Pattern, float]], profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+    kind, _ = FIELDS[field]
+    candidates = []
+    for index, line in enumerate(lines):
+        for label, confidence in labels:
+            match = label.search(line)
+            if not match:
+                continue
+            parsed = _parse_value(kind, line[match.end():], profile["decimal_comma"])
+            if parsed is None and profile["value_below"] and not line[match.end():].strip():
+                # Table layout, the value is on the next line
+                below = next((other for other in lines[index + 1:index + 3] if other.strip()), "")
+                parsed = _parse_value(kind, below.strip(), profile["decimal_comma"])
+                confidence *= 0.9
+            if parsed is not None:
+                value, factor, extra = parsed
+                candidates.append({"value": value, "confidence": min(confidence * factor, 0.99), "source": line.strip()[:120], "line": index, **extra})
+                break
+    if not candidates:
+        candidates = _unlabelled_candidates(kind, lines)
+    return candidates
+
+def _unlabelled_candidates(kind: str, lines: List[str]) -> List[Dict[str, Any]]:
+    # Values recognizable without a label, at a lower confidence
+    candidates = []
+    for index, line in enumerate(lines):
+        if kind == "account":
+            for match in IBAN.finditer(line.upper()):
+                iban = match.group(1).replace(" ", "")
+                if iban_is_valid(iban):
+                    candidates.append({"value": iban, "confidence": 0.65, "source": line.strip()[:120], "line": index})
+        elif kind == "period":
+            match = PERIOD_RANGE.search(line)
+            if match:
+                candidates.append({"value": match.group(1).strip(), "confidence": 0.5, "source": line.strip()[:120], "line": index})
+    return candidates
+
+def _choose(field: str, candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if not candidates:
+        return {"value": None, "confidence": 0.0, "source": None}
+    _, pick = FIELDS[field]
+    best_confidence = max(candidate["confidence"] for candidate in candidates)
+    best = [candidate for candidate in candidates if candidate["confidence"] == best_confidence]
+    chosen = dict(best[-1] if pick == "last" else best[0])
+    if pick == "first":
+        # Other strong candidates should agree, a running balance is expected to change
+        strong = [candidate["value"] for candidate in candidates if candidate["confidence"] >= best_confidence - 0.1]
+        if len(set(strong)) > 1:
+            chosen["confidence"] *= 0.75
+        elif len(strong) > 1:
+            chosen["confidence"] = min(chosen["confidence"] + 0.03 * (len(strong) - 1), 0.99)
+    chosen.pop("line", None)
+    chosen["confidence"] = round(chosen["confidence"], 2)
+    return chosen
+
+@traced_skill("fields.extract", lambda result: {"fields.bank": result["bank"], "fields.low_confidence": len(result["low_confidence"])})
+def extract_fields(text: Annotated[str, "text extracted from the salary slip or bank statement"], bank: Annotated[str, "the applicant's bank (optional)"] = None) -> Dict[str, Any]:
+    """
+    Extract the account number, balance, employer, pay period and net pay from
+    the text of a salary slip or bank statement.
+
+    Args:
+        text (str): The document text, as returned by extract_text_from_pdf
+        bank (str): The applicant's bank, to pick its profile; detected from the text when omitted
+
+    Returns:
+        Dict[str, Any]: {"bank": profile name, "document": "salary_slip", "statement" or "unknown",
+            "fields": {field: {"value", "confidence", "source"}}, "low_confidence": the document's
+            fields below LOW_CONFIDENCE_THRESHOLD, missing ones included}
+    """
+    profiles = get_field_profiles()
+    bank_name = detect_bank(text, bank)
+    profile = profiles[bank_name]
+    default = profiles["default"]
+    layout = {"decimal_comma": profile["decimal_comma"], "value_below": profile["value_below"]}
+    lines = text.splitlines()
+
+    fields = {}
+    for field in FIELDS:
+        labels = (profile["fields"].get(field, []) + default["fields"].get(field, [])) if profile is not default else default["fields"].get(field, [])
+        fields[field] = _choose(field, _candidates(field, lines, labels, layout))
+    document = _document_kind(fields)
+    return {
+        "bank": bank_name,
+        "document": document,
+        "fields": fields,
+        "low_confidence": [field for field in DOCUMENT_FIELDS.get(document, FIELDS) if fields[field]["confidence"] < LOW_CONFIDENCE_THRESHOLD],
+    }
+
+def _document_kind(fields: Dict[str, Dict[str, Any]]) -> str:
+    # A slip names the employer or the net pay, a statement the balance
+    if fields["employer"]["value"] is not None or fields["net_pay"]["value"] is not None:
+        return "salary_slip"
+    if fields["balance"]["value"] is not None:
+        return "statement"
+    return "unknown"
+
+def field_values(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    {field: value} of an extraction result, for storing on the application.
+    """
+    return {field: value["value"] for field, value in result["fields"].items()}
+
+def format_fields(result: Dict[str, Any]) -> str:
+    """
+    The extracted fields as text for the UI.
+    """
+    lines = []
+    for field, value in result["fields"].items():
+        label = field.replace("_", " ").capitalize()
+        if value["value"] is None:
+            lines.append(f"{label}: not found")
+            continue
+        currency = f" {value['currency']}" if value.get("currency") else ""
+        check = " (needs checking)" if field in result["low_confidence"] else ""
+        lines.append(f"{label}: {value['value']}{currency}, confidence {value['confidence']:.2f}{check}")
+    return "\n".join(lines)
+
+def _excerpts(result: Dict[str, Any], text: str, max_chars: int = MAX_EXCERPT_CHARS) -> str:
+    profiles = get_field_profiles()
+    labels = [label for name in {result["bank"], "default"} for field in result["low_confidence"] for label, _ in profiles[name]["fields"].get(field, [])]
+    lines = text.splitlines()
+    wanted = set(range(min(5, len(lines))))  # the header usually names the employer and period
+    for index, line in enumerate(lines):
+        if any(label.search(line) for label in labels):
+            wanted.update((index - 1, index, index + 1))
+    excerpt = []
+    size = 0
+    for index in sorted(i for i in wanted if 0 <= i < len(lines)):
+        line = lines[index].strip()
+        if not line:
+            continue
+        if size + len(line) > max_chars:
+            break
+        excerpt.append(line)
+        size += len(line) + 1
+    return "\n".join(excerpt)
+
+def build_field_request(result: Dict[str, Any], text: str) -> str:
+    """
+    The message asking the model for the low-confidence fields only, with the
+    confident ones for context and excerpts of the document around the
+    low-confidence fields' labels instead of the whole text.
+    """
+    confident = {field: value["value"] for field, value in result["fields"].items() if field not in result["low_confidence"]}
+    unsure = {field: result["fields"][field]["value"] for field in result["low_confidence"]}
+    return (
+        f"These fields were extracted from my {result['document'].replace('_', ' ') if result['document'] != 'unknown' else 'salary slip or bank statement'}: {json.dumps(confident)}\n"
+        f"These need checking, with the best local guess (null when none was found): {json.dumps(unsure)}\n\n"
+        f"Excerpts of the document:\n{_excerpts(result, text)}\n\n"
+        f"Reply with only a JSON object with the keys {', '.join(result['low_confidence'])}, using null where the excerpts don't say."
+    )
+
+def merge_llm_fields(result: Dict[str, Any], reply: str) -> Dict[str, Any]:
+    """
+    Fill in the low-confidence fields from the model's JSON reply, fields it
+    left null or that don't parse keep their local value.
+    """
+    match = re.search(r"\{.*\}", reply or "", re.DOTALL)
+    if not match:
+        return result
+    try:
+        answer = json.loads(match.group(0))
+    except ValueError:
+        return result
+    if not isinstance(answer, dict):
+        return result
+    for field in list(result["low_confidence"]):
+        if answer.get(field) not in (None, ""):
+            result["fields"][field] = {"value": str(answer[field]), "confidence": LLM_FIELD_CONFIDENCE, "source": "llm"}
+            if LLM_FIELD_CONFIDENCE >= LOW_CONFIDENCE_THRESHOLD:
+                result["low_confidence"].remove(field)
+    return result
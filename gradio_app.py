@@ -1,13 +1,21 @@
-import gradio as gr
 import json
-import os
-import tempfile
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import traceback
 
 # Import the existing skills
-from extract_pdf_skill import process_pdf_from_url
+from extract_pdf_skill import process_signed_pdf_from_url
+from field_extractor import extract_fields, field_values, format_fields
+from pdf_signature import format_signatures
 from verify_tlsn_proof import verify_tlsn_proof, save_tlsn_proof
+from tlsn_proof import ParsedProof, parse_proof_file, parse_proof_text
+from dkim_verify import verify_dkim_signature, format_dkim_result
+from email_assembler import add_email_chunk, as_email_lines, finish_email_assembly, format_assembly_status
+from application_store import get_application_store
+from intake import direct_intake
+from telemetry import configure_telemetry
+from lanes import UI_QUEUE_SIZE, queued_handler
+
+NO_APPLICATION_MESSAGE = "Please submit the loan application first."
 
 def handle_loan_application(
     name: str,
@@ -17,57 +25,64 @@ def handle_loan_application(
     has_income: bool,
     email: str,
     no_default_history: bool
-) -> str:
+) -> Tuple[str, str]:
     """
-    Handle the initial loan application form
+    Handle the initial loan application form, returns the status message and
+    the new application ID for the session
     """
     # Create a JSON with the loan application details
-    application_data = {
-        "first_name": name.split()[0] if len(name.split()) > 0 else "",
-        "last_name": name.split()[1] if len(name.split()) > 1 else "",
-        "loan_amount": loan_amount,
-        "country": country,
-        "bank": bank,
-        "income": "Yes" if has_income else "No",
-        "history": "No defaults" if no_default_history else "Has defaults",
-        "email": email
-    }
+    application_data, problems = direct_intake(name, loan_amount, country, bank, has_income, email, no_default_history)
+    if problems:
+        return "Please fix the following fields and submit again:\n\n" + "\n".join(f"- {problem}" for problem in problems), None
+    application_data["intake_path"] = "direct"
     
-    # Save to bank.json
-    with open("bank.json", "w") as f:
-        json.dump(application_data, f, indent=4)
+    # Save to the application store
+    application_id = get_application_store().create(application_data)
         
-    return f"Application data saved successfully:\n\n{json.dumps(application_data, indent=4)}"
+    return f"Application {application_id} saved successfully:\n\n{json.dumps(application_data, indent=4)}", application_id
 
-def handle_email_verification(raw_email: str) -> str:
+def record_email_verification(result: Dict[str, Any], application_id: Optional[str]) -> None:
     """
-    Handle the email verification step
+    Store the DKIM outcome on the application, if there is one
+    """
+    if application_id is not None:
+        get_application_store().update(application_id, email_verified=result["success"], email_domain=result.get("domain"))
+
+def handle_email_verification(raw_email: str, application_id: Optional[str] = None) -> str:
+    """
+    Handle the email verification step, `raw_email` completes the email
+    pasted in parts when there is one
     """
-    if not raw_email:
-        return "Please provide the raw email content."
-    
-    # Save the raw email to a file
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".eml")
     try:
-        temp_file.write(raw_email.encode('utf-8'))
-        temp_file.close()
-        
-        # Verify DKIM signature
-        result = verify_dkim_signature(temp_file.name)
-        
-        # Try to extract relevant information from the email
-        # This is a placeholder - in a real implementation, you would extract more information
-        email_info = "Email processed successfully. DKIM verification results are shown in the console."
-        
-        return email_info
+        assembler = finish_email_assembly(application_id, raw_email and as_email_lines(raw_email)) if application_id is not None else None
+        if assembler is not None:
+            # Assembled from the pasted parts, the body hashes are already done
+            with assembler:
+                result = assembler.finish()
+        elif not raw_email:
+            return "Please provide the raw email content."
+        else:
+            # Verify DKIM signature locally
+            result = verify_dkim_signature(raw_email)
+        record_email_verification(result, application_id)
+        return format_dkim_result(result)
     except Exception as e:
         return f"Error processing email: {str(e)}"
-    finally:
-        # Clean up
-        if os.path.exists(temp_file.name):
-            os.remove(temp_file.name)
 
-def handle_email_upload(email_file) -> str:
+def handle_email_chunk(chunk: str, application_id: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Add a pasted part of a raw email to the email assembled for the application
+    """
+    if not chunk:
+        return "Please paste the next part of the raw email.", chunk
+    if application_id is None:
+        return NO_APPLICATION_MESSAGE, chunk
+    result = add_email_chunk(application_id, as_email_lines(chunk))
+    if not result["success"]:
+        return result["error"], ""
+    return format_assembly_status(result["status"]), ""
+
+def handle_email_upload(email_file, application_id: Optional[str] = None) -> str:
     """
     Handle uploaded email file
     """
@@ -75,16 +90,18 @@ def handle_email_upload(email_file) -> str:
         return "No file uploaded"
     
     try:
-        # Read the file content
-        with open(email_file.name, "r", encoding="utf-8", errors="ignore") as f:
+        # Read the raw bytes, decoding could alter what the signature covers
+        with open(email_file.name, "rb") as f:
             email_content = f.read()
         
         # Process the email
-        return handle_email_verification(email_content)
+        result = verify_dkim_signature(email_content)
+        record_email_verification(result, application_id)
+        return format_dkim_result(result)
     except Exception as e:
         return f"Error processing email file: {str(e)}"
 
-def handle_salary_verification(pdf_url: str) -> str:
+def handle_salary_verification(pdf_url: str, application_id: Optional[str] = None) -> str:
     """
     Handle the salary slip verification
     """
@@ -92,28 +109,26 @@ def handle_salary_verification(pdf_url: str) -> str:
         return "Please provide a valid PDF URL."
     
     try:
-        # Process the PDF
-        text = process_pdf_from_url(pdf_url)
+        # Process the PDF and check its signatures, the fields can be anywhere in it
+        pdf = process_signed_pdf_from_url(pdf_url)
+        text = pdf.get("text")
         
         if not text:
             return "Failed to extract text from the PDF. Please check the URL and try again."
         
-        # Here we would extract information like account number, bank balance, etc.
-        # This is a simplified example
-        info_extract = "PDF processed successfully. Extracted text: " + text[:300] + "..."
+        # Extract the account number, balance, employer, pay period and net pay locally
+        store = get_application_store()
+        application = store.get(application_id) if application_id is not None else None
+        bank = (application or {}).get("data", {}).get("bank")
+        fields = extract_fields(text, bank)
+        info_extract = f"PDF processed successfully. {format_signatures(pdf['signature_status'], pdf['signatures'])}\n\nExtracted fields:\n\n{format_fields(fields)}"
         
-        # Try to update bank.json with additional information
+        # Try to update the application with additional information
         try:
-            with open("bank.json", "r") as f:
-                bank_data = json.load(f)
-            
-            # Here you would extract and add more data
-            bank_data["pdf_verified"] = True
-            
-            with open("bank.json", "w") as f:
-                json.dump(bank_data, f, indent=4)
-                
-            info_extract += "\n\nBank application data updated with PDF verification."
+            if application_id is not None and store.update(application_id, pdf_verified=pdf["signature_status"] == "valid", pdf_signature_status=pdf["signature_status"], salary_fields=field_values(fields), salary_fields_unsure=fields["low_confidence"]):
+                info_extract += "\n\nBank application data updated with PDF verification."
+            else:
+                info_extract += f"\n\nWarning: Could not update application data: {NO_APPLICATION_MESSAGE}"
         except Exception as e:
             info_extract += f"\n\nWarning: Could not update application data: {str(e)}"
         
@@ -121,52 +136,67 @@ def handle_salary_verification(pdf_url: str) -> str:
     except Exception as e:
         return f"Error processing PDF: {str(e)}"
 
-def handle_tlsn_proof_text(proof_json: str) -> Dict[str, Any]:
+def handle_tlsn_proof_text(proof_json: str, application_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Handle TLSN proof verification from pasted JSON
     """
     if not proof_json:
         return {"success": False, "error": "Please provide the TLSN proof JSON."}
+    if application_id is None:
+        return {"success": False, "error": NO_APPLICATION_MESSAGE}
     
     try:
-        # Save the proof to a file
-        save_result = save_tlsn_proof(proof_json)
-        if not save_result["success"]:
-            return save_result
-        
-        # Verify the proof
-        result = verify_tlsn_proof(proof_json)
-        return result
-    except Exception as e:
-        traceback.print_exc()  # Print the full exception traceback to console
-        return {"success": False, "error": f"Error processing TLSN proof: {str(e)}"}
+        proof = parse_proof_text(proof_json)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    return _handle_tlsn_proof(proof, application_id)
 
-def handle_tlsn_proof_upload(proof_file) -> Dict[str, Any]:
+def handle_tlsn_proof_upload(proof_file, application_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Handle TLSN proof verification from uploaded file
     """
     if proof_file is None:
         return {"success": False, "error": "No file uploaded"}
+    if application_id is None:
+        return {"success": False, "error": NO_APPLICATION_MESSAGE}
     
     try:
-        # Read the file
-        with open(proof_file.name, "r", encoding="utf-8") as f:
-            proof_json = f.read()
-        
-        # Process the proof
-        return handle_tlsn_proof_text(proof_json)
+        # Decoded straight from the file, large proofs are streamed
+        proof = parse_proof_file(proof_file.name)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
     except Exception as e:
         traceback.print_exc()  # Print the full exception traceback to console
         return {"success": False, "error": f"Error processing TLSN proof file: {str(e)}"}
+    return _handle_tlsn_proof(proof, application_id)
+
+def _handle_tlsn_proof(proof: ParsedProof, application_id: str) -> Dict[str, Any]:
+    # Saved, verified and shown from the one decoded proof
+    try:
+        save_result = save_tlsn_proof(proof, application_id)
+        if not save_result["success"]:
+            return save_result
+        
+        result = verify_tlsn_proof(proof)
+        get_application_store().update(application_id, tlsn_verified=result["success"])
+        return {**result, "proof": proof.summary()}
+    except Exception as e:
+        traceback.print_exc()  # Print the full exception traceback to console
+        return {"success": False, "error": f"Error processing TLSN proof: {str(e)}"}
 
 def create_ui():
     """
     Create the Gradio UI
     """
+    # Imported here so the handlers can be imported (and served by workers) without gradio
+    import gradio as gr
     with gr.Blocks(title="Lucid Loan Machine") as app:
         gr.Markdown("# 💰 Lucid Loan Machine (LLM)")
         gr.Markdown("## A secure loan application system powered by AI and zero-knowledge proofs")
         
+        # The application this browser session is working on
+        application_id_state = gr.State(None)
+        
         with gr.Tab("Loan Application"):
             gr.Markdown("### 📝 Complete this form to start your loan application")
             with gr.Row():
@@ -189,7 +219,9 @@ def create_ui():
                 with gr.Column():
                     gr.Markdown("#### Paste Raw Email")
                     raw_email_input = gr.Textbox(label="Raw Email Content", lines=15)
-                    email_submit_button = gr.Button("Verify Email")
+                    with gr.Row():
+                        email_chunk_button = gr.Button("Add Part")
+                        email_submit_button = gr.Button("Verify Email")
                 
                 with gr.Column():
                     gr.Markdown("#### Or Upload Email File")
@@ -223,46 +255,54 @@ def create_ui():
                     
                     tlsn_verification_output = gr.JSON(label="TLSN Verification Result")
         
-        # Set up event handlers
+        # Set up event handlers, each running on the lane for its kind of work (see lanes.py)
         submit_button.click(
-            handle_loan_application,
+            queued_handler("intake", handle_loan_application, lambda message: (message, None)),
             inputs=[name_input, loan_amount_input, country_input, bank_input, 
                    has_income_input, email_input, no_default_history_input],
-            outputs=application_output
+            outputs=[application_output, application_id_state]
+        )
+        
+        email_chunk_button.click(
+            queued_handler("intake", handle_email_chunk, lambda message: (message, gr.update())),
+            inputs=[raw_email_input, application_id_state],
+            outputs=[email_verification_output, raw_email_input]
         )
         
         email_submit_button.click(
-            handle_email_verification,
-            inputs=[raw_email_input],
+            queued_handler("http", handle_email_verification),
+            inputs=[raw_email_input, application_id_state],
             outputs=email_verification_output
         )
         
         email_upload_button.click(
-            handle_email_upload,
-            inputs=[email_file_input],
+            queued_handler("http", handle_email_upload),
+            inputs=[email_file_input, application_id_state],
             outputs=email_verification_output
         )
         
         pdf_submit_button.click(
-            handle_salary_verification,
-            inputs=[pdf_url_input],
+            queued_handler("pdf", handle_salary_verification),
+            inputs=[pdf_url_input, application_id_state],
             outputs=salary_verification_output
         )
         
         tlsn_submit_button.click(
-            handle_tlsn_proof_text,
-            inputs=[tlsn_proof_input],
+            queued_handler("http", handle_tlsn_proof_text, lambda message: {"status": message}),
+            inputs=[tlsn_proof_input, application_id_state],
             outputs=tlsn_verification_output
         )
         
         tlsn_upload_button.click(
-            handle_tlsn_proof_upload,
-            inputs=[tlsn_file_input],
+            queued_handler("http", handle_tlsn_proof_upload, lambda message: {"status": message}),
+            inputs=[tlsn_file_input, application_id_state],
             outputs=tlsn_verification_output
         )
     
-    return app
+    # The handlers are async and bounded by their lanes, don't serialize them per event
+    return app.queue(default_concurrency_limit=None, max_size=UI_QUEUE_SIZE)
 
 if __name__ == "__main__":
+    configure_telemetry()
     app = create_ui()
     app.launch()
\ No newline at end of file
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+# Shared outbound HTTP layer for the skills. One pooled client per process
+# (and one per event loop for async callers), a cap on concurrent requests
+# per host, timeouts on every call and retries with jittered backoff.
+
+DEFAULT_TIMEOUT = httpx.Timeout(connect=5.0, read=30.0, write=30.0, pool=10.0)
+CONNECTION_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0)
+PER_HOST_CONCURRENCY = int(os.getenv("HTTP_PER_HOST_CONCURRENCY", "8"))
+MAX_RETRIES = 3
+BACKOFF_BASE_SECONDS = 0.25
+BACKOFF_MAX_SECONDS = 8.0
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+# Only idempotent requests are retried unless the caller opts in
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadTimeout, httpx.RemoteProtocolError, httpx.PoolTimeout)
+
+_client = None
+_client_lock = threading.Lock()
+_host_semaphores = {}
+_async_clients = weakref.WeakKeyDictionary()
+_async_host_semaphores = weakref.WeakKeyDictionary()
+
+def get_client() -> httpx.Client:
+    """
+    Return the process wide pooled client, creating it on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(timeout=DEFAULT_TIMEOUT, limits=CONNECTION_LIMITS, follow_redirects=True)
+        return _client
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Return the pooled async client for the running event loop.
+
+    Async connections are bound to the loop that opened them, so each loop
+    gets its own client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=CONNECTION_LIMITS, follow_redirects=True)
+    return client
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    host = urlparse(url).netloc
+    with _client_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = _host_semaphores[host] = threading.BoundedSemaphore(PER_HOST_CONCURRENCY)
+        return semaphore
+
+def _async_host_semaphore(url: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphores = _async_host_semaphores.setdefault(loop, {})
+    host = urlparse(url).netloc
+    semaphore = semaphores.get(host)
+    if semaphore is None:
+        semaphore = semaphores[host] = asyncio.Semaphore(PER_HOST_CONCURRENCY)
+    return semaphore
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """
+    Delay before retry number `attempt` (starting at 0).
+
+    A numeric Retry-After header wins, otherwise full jitter exponential backoff.
+    """
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+def _should_retry(method: str, retry: Optional[bool]) -> bool:
+    return retry if retry is not None else method.upper() in IDEMPOTENT_METHODS
+
+def request(method: str, url: str, *, retries: int = MAX_RETRIES, retry: Optional[bool] = None, **kwargs) -> httpx.Response:
+    """
+    Send a request through the shared client.
+
+    Connection errors, timeouts and 429/5xx gateway responses are retried up to
+    `retries` times for idempotent methods, or any method when `retry` is True.
+    The response body is read before returning.
+    """
+    attempts = retries + 1 if _should_retry(method, retry) else 1
+    with _host_semaphore(url):
+        for attempt in range(attempts):
+            try:
+                response = get_client().request(method, url, **kwargs)
+            except RETRY_EXCEPTIONS:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUS_CODES and attempt < attempts - 1:
+                time.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+                continue
+            return response
+
+def get(url: str, **kwargs) -> httpx.Response:
+    return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> httpx.Response:
+    return request("POST", url, **kwargs)
+
+@contextmanager
+def stream(method: str, url: str, *, retries: int = MAX_RETRIES, retry: Optional[bool] = None, **kwargs) -> Iterator[httpx.Response]:
+    """
+    Stream a response body through the shared client.
+
+    Retries only happen before the body is handed to the caller. The per-host
+    slot is held until the caller leaves the context.
+    """
+    attempts = retries + 1 if _should_retry(method, retry) else 1
+    yielded = False
+    with _host_semaphore(url):
+        for attempt in range(attempts):
+            try:
+                with get_client().stream(method, url, **kwargs) as response:
+                    if response.status_code in RETRY_STATUS_CODES and attempt < attempts - 1:
+                        delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                    else:
+                        yielded = True
+                        yield response
+                        return
+            except RETRY_EXCEPTIONS:
+                # Errors while the caller reads the body are not retried
+                if yielded or attempt == attempts - 1:
+                    raise
+                delay = backoff_delay(attempt)
+            time.sleep(delay)
+
+async def arequest(method: str, url: str, *, retries: int = MAX_RETRIES, retry: Optional[bool] = None, **kwargs) -> httpx.Response:
+    """
+    Async version of request(), for skills that are awaited concurrently.
+    """
+    attempts = retries + 1 if _should_retry(method, retry) else 1
+    async with _async_host_semaphore(url):
+        for attempt in range(attempts):
+            try:
+                response = await get_async_client().request(method, url, **kwargs)
+            except RETRY_EXCEPTIONS:
+                if attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUS_CODES and attempt < attempts - 1:
+                await asyncio.sleep(backoff_delay(attempt, response.headers.get("Retry-After")))
+                continue
+            return response
+
+async def aget(url: str, **kwargs) -> httpx.Response:
+    return await arequest("GET", url, **kwargs)
+
+async def apost(url: str, **kwargs) -> httpx.Response:
+    return await arequest("POST", url, **kwargs)
+
+@asynccontextmanager
+async def astream(method: str, url: str, *, retries: int = MAX_RETRIES, retry: Optional[bool] = None, **kwargs) -> AsyncIterator[httpx.Response]:
+    attempts = retries + 1 if _should_retry(method, retry) else 1
+    yielded = False
+    async with _async_host_semaphore(url):
+        for attempt in range(attempts):
+            try:
+                async with get_async_client().stream(method, url, **kwargs) as response:
+                    if response.status_code in RETRY_STATUS_CODES and attempt < attempts - 1:
+                        delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                    else:
+                        yielded = True
+                        yield response
+                        return
+            except RETRY_EXCEPTIONS:
+                # Errors while the caller reads the body are not retried
+                if yielded or attempt == attempts - 1:
+                    raise
+                delay = backoff_delay(attempt)
+            await asyncio.sleep(delay)
+
+def close() -> None:
+    """
+    Close the shared sync client, mainly for tests and shutdown hooks.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
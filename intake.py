@@ -0,0 +1,79 @@
+import re
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+# Deterministic intake for structured form submissions. When every field is
+# present and valid the application record is built directly, the front desk
+# assistant is only needed for missing or ambiguous answers.
+
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+class LoanApplication(BaseModel):
+    """
+    The application record, same keys as the bank.json the front desk assistant writes
+    """
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    first_name: str = Field(min_length=1)
+    last_name: str = Field(min_length=1)
+    country: str = Field(min_length=2)
+    bank: str = Field(min_length=1)
+    income: Literal["Yes", "No"]
+    history: Literal["No defaults", "Has defaults"]
+    loan_amount: float = Field(gt=0)
+    email: str
+
+    @field_validator("email")
+    @classmethod
+    def check_email(cls, value: str) -> str:
+        if not EMAIL_PATTERN.match(value):
+            raise ValueError("not a valid email address")
+        return value.lower()
+
+def application_from_form(name: str, loan_amount: float, country: str, bank: str, has_income: bool, email: str, no_default_history: bool) -> Dict[str, Any]:
+    """
+    Map the loan form fields onto the bank.json layout, without validation
+    """
+    name_parts = (name or "").split()
+    return {
+        "first_name": name_parts[0] if len(name_parts) > 0 else "",
+        "last_name": " ".join(name_parts[1:]),
+        "loan_amount": loan_amount,
+        "country": country,
+        "bank": bank,
+        "income": "Yes" if has_income else "No",
+        "history": "No defaults" if no_default_history else "Has defaults",
+        "email": email
+    }
+
+def validate_application(data: Dict[str, Any]) -> Tuple[Optional[LoanApplication], List[str]]:
+    """
+    Validate an application record.
+
+    Returns:
+        Tuple[Optional[LoanApplication], List[str]]: The validated application, or None and a list of problems
+    """
+    try:
+        return LoanApplication.model_validate(data), []
+    except ValidationError as e:
+        problems = []
+        for error in e.errors():
+            field = ".".join(str(part) for part in error["loc"]) or "application"
+            problems.append(f"{field}: {error['msg']}")
+        return None, problems
+
+def direct_intake(name: str, loan_amount: float, country: str, bank: str, has_income: bool, email: str, no_default_history: bool) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Build the application record straight from the form.
+
+    Returns:
+        Tuple[Dict[str, Any], List[str]]: The record and the problems found. The
+        record is validated and normalised when there are no problems,
+        otherwise it is the raw form mapping for the assistant to fix up.
+    """
+    record = application_from_form(name, loan_amount, country, bank, has_income, email, no_default_history)
+    application, problems = validate_application(record)
+    if application is None:
+        return record, problems
+    return application.model_dump(), []
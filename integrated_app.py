@@ -1,64 +1,117 @@
-import autogen
 import os
 import json
-import gradio as gr
+import uuid
 from dotenv import load_dotenv
-from typing import Dict, Any, Optional
+from typing import Annotated, Dict, Any, AsyncIterator, Optional
 
-# Import existing components
-from main import front_desk_assistant, email_assistant, salary_slip_assistant
-from system_prompts import front_desk_assistant_prompt, email_assistant_prompt, salary_slip_assistant_prompt, verify_tlsn_proof_prompt
-from extract_pdf_skill import process_pdf_from_url
+# Import existing components, autogen and gradio are imported when first needed
+from agents import AgentRegistry, assistant_factory
+from system_prompts import front_desk_intake_prompt, email_assistant_prompt, salary_slip_assistant_prompt, verify_tlsn_proof_prompt
+from extract_pdf_skill import process_pdf_from_url, process_signed_pdf_from_url
+from field_extractor import build_field_request, extract_fields, field_values, format_fields, merge_llm_fields
+from pdf_signature import format_signatures
 from verify_tlsn_proof import verify_tlsn_proof, save_tlsn_proof
+from tlsn_proof import parse_proof_text
+from dkim_verify import verify_dkim_signature, format_dkim_result
+from email_digest import build_email_digest, format_email_digest
+from email_assembler import add_email_chunk, as_email_lines, finish_email_assembly, format_assembly_status
+from application_store import get_application_store
+from intake import direct_intake, validate_application
+from llm_cache import get_llm_cache
+from llm_rate_limit import rate_limited
+from chat_events import ChatTranscript, get_event_channel, run_streaming
+from lanes import UI_QUEUE_SIZE, get_lane
+from telemetry import configure_telemetry, traced_chat
 
 load_dotenv()  # Take environment variables from .env
 
-# Set up Autogen config
-config_list = [
+# Set up Autogen config, the calls of all sessions share the limits in llm_rate_limit
+config_list = rate_limited([
     {
         'model': 'gpt-3.5-turbo',
         'api_key': os.getenv('OPENAI_API_KEY'),
+    },
+    # Document cross-checks are routed here, see model_router
+    {
+        'model': 'gpt-4',
+        'api_key': os.getenv('OPENAI_API_KEY'),
     }
-]
+])
 
 llm_config = {
     "timeout": 120,
-    "seed": 42,
+    "cache_seed": None,
+    "stream": True,  # replies reach the UI token by token, see chat_events
     "config_list": config_list,
     "temperature": 0
 }
 
+def save_application(
+    application_id: Annotated[str, "The application ID given in the conversation"],
+    application: Annotated[Dict[str, Any], "The confirmed details: first_name, last_name, country, bank, income, history, loan_amount and email"]
+) -> Dict[str, Any]:
+    """
+    Save the front desk assistant's record to its application in the store,
+    only while that application is still waiting for it
+
+    Args:
+        application_id (str): The application the conversation is about
+        application (Dict[str, Any]): The record, with the bank.json keys
+
+    Returns:
+        Dict[str, Any]: success, and the problems when the record isn't valid yet
+    """
+    store = get_application_store()
+    record = store.get(application_id)
+    if record is None or record["status"] != "incomplete" or record["data"].get("intake_path") != "llm":
+        return {"success": False, "error": f"Unknown application: {application_id}"}
+    validated, problems = validate_application(application)
+    if validated is None:
+        return {"success": False, "error": "The application is not complete yet", "problems": problems}
+    store.update(application_id, **validated.model_dump(), intake_problems=[])
+    store.set_status(application_id, "intake")
+    return {"success": True, "message": "Application saved"}
+
 class AutogenIntegration:
     """
     Class to integrate Gradio UI with Autogen agents
     """
     def __init__(self):
-        # Initialize the assistants
-        self.front_desk_assistant = autogen.AssistantAgent(
-            name="front_desk_assistant",
-            llm_config=llm_config,
-            system_message=front_desk_assistant_prompt,
-        )
-        
-        self.email_assistant = autogen.AssistantAgent(
-            name="email_assistant",
-            llm_config=llm_config,
-            system_message=email_assistant_prompt
-        )
-        
-        self.salary_slip_assistant = autogen.AssistantAgent(
-            name="salary_slip_assistant",
-            llm_config=llm_config,
-            system_message=salary_slip_assistant_prompt
-        )
-        
-        self.tlsn_assistant = autogen.AssistantAgent(
-            name="tlsn_assistant",
-            llm_config=llm_config,
-            system_message=verify_tlsn_proof_prompt
-        )
-        
-        self.user_proxy = autogen.UserProxyAgent(
+        # The assistants are built on first use and reused across requests
+        self.agents = AgentRegistry(lambda: llm_config)
+        self.agents.register("front_desk_assistant", self._build_front_desk_assistant)
+        self.agents.register("email_assistant", self._with_functions(assistant_factory("email_assistant", email_assistant_prompt), {
+            "process_email": self.process_email,
+        }))
+        self.agents.register("salary_slip_assistant", self._with_functions(assistant_factory("salary_slip_assistant", salary_slip_assistant_prompt), {
+            "process_pdf_from_url": process_pdf_from_url,
+        }))
+        self.agents.register("tlsn_assistant", self._with_functions(assistant_factory("tlsn_assistant", verify_tlsn_proof_prompt), {
+            "verify_tlsn_proof": verify_tlsn_proof,
+            "save_tlsn_proof": save_tlsn_proof,
+        }))
+        self.agents.register("user_proxy", self._build_user_proxy)
+
+    @staticmethod
+    def _with_functions(factory, function_map):
+        """Wrap an agent factory so the built assistant has its functions registered"""
+        def build(registry):
+            agent = factory(registry)
+            agent.register_function(function_map=function_map)
+            return agent
+        return build
+
+    def _build_front_desk_assistant(self, registry):
+        """The front desk assistant, saving the applications it completes to the store through save_application"""
+        agent = assistant_factory("front_desk_assistant", front_desk_intake_prompt)(registry)
+        agent.register_for_llm(name="save_application", description="Save the applicant's confirmed details to their application")(save_application)
+        registry.get("user_proxy").register_for_execution(name="save_application")(save_application)
+        return agent
+
+    @staticmethod
+    def _build_user_proxy(registry):
+        import autogen
+        return autogen.UserProxyAgent(
             name="user_proxy",
             human_input_mode="NEVER",  # Automated for Gradio integration
             code_execution_config={
@@ -66,40 +119,47 @@ class AutogenIntegration:
                 "use_docker": False,
             }
         )
-        
-        # Register functions for the assistants
-        self.register_assistant_functions()
-    
-    def register_assistant_functions(self):
-        """Register functions for all assistants"""
-        # Register functions for email assistant
-        self.email_assistant.register_function(
-            function_map={
-                "process_email": self.process_email,
-            }
-        )
-        
-        # Register functions for salary slip assistant
-        self.salary_slip_assistant.register_function(
-            function_map={
-                "process_pdf_from_url": process_pdf_from_url,
-            }
-        )
-        
-        # Register functions for TLSN assistant
-        self.tlsn_assistant.register_function(
-            function_map={
-                "verify_tlsn_proof": verify_tlsn_proof,
-                "save_tlsn_proof": save_tlsn_proof,
-            }
-        )
-    
-    def process_email(self, raw_email: str) -> Dict[str, Any]:
+
+    @property
+    def front_desk_assistant(self):
+        return self.agents.get("front_desk_assistant")
+
+    @property
+    def email_assistant(self):
+        return self.agents.get("email_assistant")
+
+    @property
+    def salary_slip_assistant(self):
+        return self.agents.get("salary_slip_assistant")
+
+    @property
+    def tlsn_assistant(self):
+        return self.agents.get("tlsn_assistant")
+
+    @property
+    def user_proxy(self):
+        return self.agents.get("user_proxy")
+
+    def chat(self, recipient, message, use_cache=True, **kwargs):
+        """Chat with an assistant through the shared LLM response cache, use_cache=False forces fresh completions, other keyword arguments go to initiate_chat"""
+        cache = get_llm_cache().for_agent(recipient.name, bypass=not use_cache)
+        return traced_chat(self.user_proxy, recipient, message=message, cache=cache, **kwargs)
+
+    def stream_chat(self, recipient, message, application_id=None, use_cache=True, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        """Chat with an assistant on the llm lane, yielding its queue position, then its messages, tool calls and tokens on the application's event channel"""
+        channel = get_event_channel(application_id)
+        return run_streaming(channel, lambda: self.chat(recipient, message, use_cache, **kwargs), get_lane("llm"))
+
+    def process_email(self, raw_email: str, application_id: Optional[str] = None) -> Dict[str, Any]:
         """Process raw email and return results"""
         try:
-            # Save email to file
-            with open("raw_email.txt", "w") as f:
-                f.write(raw_email)
+            if application_id is not None:
+                # Keep the email with its application
+                get_application_store().save_artifact(application_id, "raw_email", raw_email)
+            else:
+                # Save email to file
+                with open("raw_email.txt", "w") as f:
+                    f.write(raw_email)
             
             # For demonstration, return basic info
             return {
@@ -112,8 +172,22 @@ class AutogenIntegration:
                 "error": str(e)
             }
     
-    def handle_loan_application(self, name, loan_amount, country, bank, has_income, email, no_default_history):
-        """Handle loan application through front desk assistant"""
+    async def handle_loan_application(self, name, loan_amount, country, bank, has_income, email, no_default_history):
+        """Handle loan application, through the front desk assistant only when the form is incomplete, streaming its conversation"""
+        store = get_application_store()
+        data, problems = direct_intake(name, loan_amount, country, bank, has_income, email, no_default_history)
+        
+        # Fast path: a complete, valid form needs no model round trips
+        if not problems:
+            data["intake_path"] = "direct"
+            state, created = await get_lane("intake").run(store.create, data)
+            if state != "done":
+                yield created, None
+                return
+            application_id = created
+            yield f"Application {application_id} processed successfully. Your data has been saved:\n\n{json.dumps(data, indent=2)}", application_id
+            return
+        
         # Prepare message
         message = f"""
         I want to apply for a loan. Here's my information:
@@ -124,70 +198,194 @@ class AutogenIntegration:
         Do I have income: {'Yes' if has_income else 'No'}
         Email: {email}
         No history of defaults: {'Yes' if no_default_history else 'No'}
+        These answers are missing or invalid: {'; '.join(problems)}
         """
         
-        # Interact with front desk assistant
-        self.user_proxy.initiate_chat(self.front_desk_assistant, message=message)
+        # The record is kept under this session's id while the front desk assistant completes it
+        data["intake_path"] = "llm"
+        data["intake_problems"] = problems
+        application_id = uuid.uuid4().hex
+        state, created = await get_lane("intake").run(store.create, data, application_id=application_id, status="incomplete")
+        if state != "done":
+            yield created, None
+            return
         
-        # Return confirmation
-        try:
-            with open("bank.json", "r") as f:
-                data = json.load(f)
-                return f"Application processed successfully. Your data has been saved:\n\n{json.dumps(data, indent=2)}"
-        except:
-            return "Application processed. Please check the console for details."
+        # Interact with front desk assistant, it saves the completed record with save_application
+        transcript = ChatTranscript("Some answers need a closer look, the front desk assistant is on it:")
+        yield transcript.text(), None
+        async for event in self.stream_chat(self.front_desk_assistant, f"{message}\n        My application ID is {application_id}.", application_id):
+            transcript.add(event)
+            yield transcript.text(), None
+        
+        state, record = await get_lane("intake").run(store.get, application_id)
+        if state != "done" or record is None:
+            yield f"Application {application_id} was saved, but it could not be read back.", application_id
+            return
+        problems = record["data"].get("intake_problems") or []
+        if problems:
+            yield f"Application {application_id} saved, but some answers still need attention:\n\n" + "\n".join(f"- {problem}" for problem in problems), application_id
+        else:
+            yield f"Application {application_id} processed successfully. Your data has been saved:\n\n{json.dumps(record['data'], indent=2)}", application_id
     
-    def handle_email_verification(self, raw_email):
-        """Handle email verification through email assistant"""
-        # Prepare message
-        message = f"Here's my raw email for verification: [Email begins]\n{raw_email[:500]}...[Email trimmed]"
+    async def handle_email_chunk(self, chunk, application_id=None):
+        """Add a pasted part of a raw email to the email assembled for the application, only its status comes back"""
+        if not chunk:
+            yield "Please paste the next part of the raw email.", chunk
+            return
+        if application_id is None:
+            yield "Please submit the loan application first.", chunk
+            return
+        state, result = await get_lane("intake").run(add_email_chunk, application_id, as_email_lines(chunk))
+        if state != "done":
+            yield result, chunk
+            return
+        yield format_assembly_status(result["status"]) if result["success"] else result["error"], ""
+    
+    async def handle_email_verification(self, raw_email, application_id=None):
+        """Handle email verification through email assistant, streaming its review after the local DKIM result"""
+        # Verify the DKIM signature locally, the assistant only matches the details
+        state, verified = await get_lane("http").run(self._verify_email, raw_email, application_id)
+        if state != "done":
+            yield verified
+            return
+        if verified is None:
+            yield "Please provide the raw email content."
+            return
+        dkim_result, digest, raw_email, application = verified
+        transcript = ChatTranscript(format_dkim_result(dkim_result))
+        yield transcript.text()
+        
+        # Prepare message, with the application to match against and a local digest of the email instead of the raw (and often huge) message
+        details = json.dumps(application["data"], indent=2) if application is not None else "No application was submitted."
+        message = (
+            f"My loan application:\n{details}\n\n"
+            f"My email's DKIM signature was verified locally:\n{format_dkim_result(dkim_result)}\n\n"
+            f"Here's a digest of my email:\n{format_email_digest(digest)}"
+        )
         
         # Interact with email assistant
-        self.user_proxy.initiate_chat(self.email_assistant, message=message)
+        async for event in self.stream_chat(self.email_assistant, message, application_id):
+            transcript.add(event)
+            yield transcript.text()
         
         # Save email for processing
-        self.process_email(raw_email)
-        
-        return "Email received for verification. Please check the console for verification details."
+        await get_lane("intake").run(self._record_email, raw_email, application_id, dkim_result)
     
-    def handle_salary_verification(self, pdf_url):
-        """Handle salary slip verification through salary slip assistant"""
-        # Prepare message
-        message = f"Here's the URL to my salary slip: {pdf_url}"
+    def _verify_email(self, raw_email, application_id):
+        # The pasted email, or the one assembled from its parts with raw_email as the last part, and the application to match it against
+        application = get_application_store().get(application_id) if application_id is not None else None
+        assembler = finish_email_assembly(application_id, raw_email and as_email_lines(raw_email)) if application_id is not None else None
+        if assembler is None:
+            if not raw_email:
+                return None
+            return verify_dkim_signature(raw_email), build_email_digest(raw_email), raw_email, application
+        with assembler:
+            return assembler.finish(), assembler.email_digest(), assembler.raw_email().decode("utf-8", errors="replace"), application
+    
+    def _record_email(self, raw_email, application_id, dkim_result):
+        self.process_email(raw_email, application_id)
+        if application_id is not None:
+            get_application_store().update(application_id, email_verified=dkim_result["success"], email_domain=dkim_result.get("domain"))
+    
+    async def handle_salary_verification(self, pdf_url, application_id=None):
+        """Handle salary slip verification, extracting the fields locally and streaming the salary slip assistant's check of the uncertain ones"""
+        if not pdf_url:
+            yield "Please provide a valid PDF URL."
+            return
         
-        # Interact with salary slip assistant
-        self.user_proxy.initiate_chat(self.salary_slip_assistant, message=message)
+        # Extract the text and the fields and check the signatures locally, the assistant never reads the whole document
+        state, extracted = await get_lane("pdf").run(self._extract_salary_fields, pdf_url, application_id)
+        if state != "done":
+            yield extracted
+            return
+        pdf, fields = extracted
+        if not pdf.get("text"):
+            yield "Failed to extract text from the PDF. Please check the URL and try again."
+            return
+        signature = format_signatures(pdf["signature_status"], pdf["signatures"])
+        transcript = ChatTranscript(f"{signature}\n\nExtracted fields:\n\n{format_fields(fields)}")
+        yield transcript.text()
         
-        return "Salary slip verification in progress. Please check the console for details."
+        # Interact with salary slip assistant, only about the fields the rules aren't sure of
+        if fields["low_confidence"]:
+            message = build_field_request(fields, pdf["text"])
+            async for event in self.stream_chat(self.salary_slip_assistant, message, application_id, max_turns=1):
+                transcript.add(event)
+                yield transcript.text()
+                if event["type"] == "done" and event.get("result") is not None:
+                    merge_llm_fields(fields, event["result"].summary)
+                    transcript.header = f"{signature}\n\nExtracted fields:\n\n{format_fields(fields)}"
+                    yield transcript.text()
+        
+        if application_id is not None:
+            await get_lane("intake").run(get_application_store().update, application_id, pdf_verified=pdf["signature_status"] == "valid", pdf_signature_status=pdf["signature_status"], salary_fields=field_values(fields), salary_fields_unsure=fields["low_confidence"])
+    
+    def _extract_salary_fields(self, pdf_url, application_id):
+        pdf = process_signed_pdf_from_url(pdf_url)
+        if not pdf.get("text"):
+            return pdf, None
+        application = get_application_store().get(application_id) if application_id is not None else None
+        return pdf, extract_fields(pdf["text"], (application or {}).get("data", {}).get("bank"))
     
-    def handle_tlsn_verification(self, proof_json):
-        """Handle TLSN proof verification through TLSN assistant"""
+    async def handle_tlsn_verification(self, proof_json, application_id=None):
+        """Handle TLSN proof verification, verifying the proof and then streaming the TLSN assistant's review of the result"""
         if not proof_json:
-            return {"success": False, "error": "Empty proof provided"}
+            yield {"success": False, "error": "Empty proof provided"}, ""
+            return
+        if application_id is None:
+            yield {"success": False, "error": "Please submit the loan application first."}, ""
+            return
         
-        # Save proof
-        save_result = save_tlsn_proof(proof_json)
+        # Decode and save the proof once, the chat and the verification share it
+        state, parsed = await get_lane("intake").run(_parse_and_save_proof, proof_json, application_id)
+        if state != "done":
+            yield {"success": False, "error": parsed}, ""
+            return
+        proof, save_result = parsed
         if not save_result["success"]:
-            return save_result
+            yield save_result, ""
+            return
         
-        # Prepare message
-        message = f"Here's my TLSN proof for verification: [Proof begins]\n{proof_json[:500]}...[Proof trimmed]"
+        # Verified once here, a verify_tlsn_proof tool call for the same proof shares the result
+        state, result = await get_lane("http").run(verify_tlsn_proof, proof)
+        if state != "done":
+            yield {"success": False, "error": result}, ""
+            return
+        await get_lane("intake").run(get_application_store().update, application_id, tlsn_verified=result["success"])
+        result = {**result, "proof": proof.summary()}
+        yield result, ""
         
-        # Interact with TLSN assistant
-        self.user_proxy.initiate_chat(self.tlsn_assistant, message=message)
+        # The assistant gets what the proof claims and the verification result, not the proof's JSON
+        message = (
+            f"My TLSN proof has been verified:\n{json.dumps({key: value for key, value in result.items() if key != 'verification_result'}, indent=2, default=str)}\n\n"
+            "It is saved with my application."
+        )
         
-        # Verify proof directly
-        result = verify_tlsn_proof(proof_json)
-        return result
+        # Interact with TLSN assistant
+        transcript = ChatTranscript()
+        async for event in self.stream_chat(self.tlsn_assistant, message, application_id):
+            transcript.add(event)
+            yield result, transcript.text()
+
+def _parse_and_save_proof(proof_json: str, application_id: str):
+    try:
+        proof = parse_proof_text(proof_json)
+    except ValueError as e:
+        return None, {"success": False, "error": str(e)}
+    return proof, save_tlsn_proof(proof, application_id)
 
 def create_integrated_ui():
     """Create Gradio UI with Autogen integration"""
+    import gradio as gr
     integration = AutogenIntegration()
     
     with gr.Blocks(title="Lucid Loan Machine - Integrated") as app:
         gr.Markdown("# 💰 Lucid Loan Machine (LLM) - Integrated with Autogen")
         gr.Markdown("## A secure loan application system powered by AI agents and zero-knowledge proofs")
         
+        # The application this browser session is working on
+        application_id_state = gr.State(None)
+        
         with gr.Tab("Loan Application"):
             gr.Markdown("### 📝 Complete this form to start your loan application")
             with gr.Row():
@@ -209,7 +407,9 @@ def create_integrated_ui():
             with gr.Row():
                 with gr.Column():
                     raw_email_input = gr.Textbox(label="Raw Email Content", lines=15)
-                    email_submit_button = gr.Button("Verify Email")
+                    with gr.Row():
+                        email_chunk_button = gr.Button("Add Part")
+                        email_submit_button = gr.Button("Verify Email")
                 
                 with gr.Column():
                     email_verification_output = gr.Textbox(label="Email Verification Result", lines=10)
@@ -233,35 +433,44 @@ def create_integrated_ui():
                 
                 with gr.Column():
                     tlsn_verification_output = gr.JSON(label="TLSN Verification Result")
+                    tlsn_chat_output = gr.Textbox(label="TLSN Assistant", lines=10)
         
         # Set up event handlers
         submit_button.click(
             integration.handle_loan_application,
             inputs=[name_input, loan_amount_input, country_input, bank_input, 
                    has_income_input, email_input, no_default_history_input],
-            outputs=application_output
+            outputs=[application_output, application_id_state]
+        )
+        
+        email_chunk_button.click(
+            integration.handle_email_chunk,
+            inputs=[raw_email_input, application_id_state],
+            outputs=[email_verification_output, raw_email_input]
         )
         
         email_submit_button.click(
             integration.handle_email_verification,
-            inputs=[raw_email_input],
+            inputs=[raw_email_input, application_id_state],
             outputs=email_verification_output
         )
         
         pdf_submit_button.click(
             integration.handle_salary_verification,
-            inputs=[pdf_url_input],
+            inputs=[pdf_url_input, application_id_state],
             outputs=salary_verification_output
         )
         
         tlsn_submit_button.click(
             integration.handle_tlsn_verification,
-            inputs=[tlsn_proof_input],
-            outputs=tlsn_verification_output
+            inputs=[tlsn_proof_input, application_id_state],
+            outputs=[tlsn_verification_output, tlsn_chat_output]
         )
     
-    return app
+    # The handlers are async and bounded by their lanes (see lanes.py), don't serialize them per event
+    return app.queue(default_concurrency_limit=None, max_size=UI_QUEUE_SIZE)
 
 if __name__ == "__main__":
+    configure_telemetry()
     app = create_integrated_ui()
     app.launch()
\ No newline at end of file
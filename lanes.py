@@ -0,0 +1,213 @@
+import asyncio
+import contextvars
+import functools
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+# Work lanes for the UI handlers. Each kind of work runs on its own executor
+# with a concurrency limit, a bounded queue and a timeout, so a burst of PDF
+# uploads fills the pdf lane and nothing else: intake, HTTP verifications and
+# agent chats keep their own workers. A full queue turns requests away instead
+# of letting them pile up, and waiting requests see their queue position and
+# an estimate of when they'll start.
+#
+#   intake  application form and store writes
+#   http    verifications that call out (DKIM key lookups, TLSN explorer)
+#   pdf     PDF download and text extraction, CPU bound
+#   llm     agent chats
+#
+# LANE_<NAME>_CONCURRENCY, LANE_<NAME>_QUEUE and LANE_<NAME>_TIMEOUT override the defaults.
+
+LANE_DEFAULTS = {
+    "intake": {"concurrency": 8, "queue_depth": 100, "timeout": 15},
+    "http": {"concurrency": 16, "queue_depth": 100, "timeout": 90},
+    "pdf": {"concurrency": max(2, os.cpu_count() or 2), "queue_depth": 32, "timeout": 150},
+    "llm": {"concurrency": 4, "queue_depth": 32, "timeout": 300},
+}
+# Requests Gradio itself holds before turning new ones away, the lanes bound the actual work
+UI_QUEUE_SIZE = int(os.getenv("UI_QUEUE_SIZE", 500))
+# How often a waiting request's position is refreshed
+QUEUE_POLL_SECONDS = 0.5
+# Run times kept per lane for the wait estimate
+DURATION_WINDOW = 50
+
+class _Ticket:
+    __slots__ = ("future", "submitted_at", "started_at")
+
+    def __init__(self):
+        self.future = None
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+
+class WorkLane:
+    """
+    A fixed pool of workers with a bounded queue in front of it.
+
+    stream() runs a sync function on the lane and reports its progress as
+    (state, value) pairs: ("queued", {"position", "eta_seconds"}) while it
+    waits, then one of ("done", result), ("rejected", message) when the
+    queue is full, or ("timeout", message). A timed out call is abandoned,
+    not interrupted, and keeps its worker until it returns.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_depth: int, timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"lane-{name}")
+        self._waiting = deque()
+        self._running = 0
+        self._durations = deque(maxlen=DURATION_WINDOW)
+        self._stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "timeouts": 0}
+        self._lock = threading.Lock()
+
+    def _submit(self, func: Callable, *args, **kwargs) -> Optional[_Ticket]:
+        with self._lock:
+            if len(self._waiting) >= self.queue_depth:
+                self._stats["rejected"] += 1
+                return None
+            ticket = _Ticket()
+            self._waiting.append(ticket)
+            self._stats["submitted"] += 1
+
+        def run():
+            with self._lock:
+                self._waiting.remove(ticket)
+                self._running += 1
+                ticket.started_at = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+                outcome = "completed"
+                return result
+            except Exception:
+                outcome = "failed"
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._stats[outcome] += 1
+                    self._durations.append(time.monotonic() - ticket.started_at)
+
+        # Carry the caller's context over, so spans nest under the handler's
+        ticket.future = self._executor.submit(contextvars.copy_context().run, run)
+        return ticket
+
+    def position(self, ticket: _Ticket) -> int:
+        """
+        1 for the next request to start, 0 once it has started.
+        """
+        with self._lock:
+            try:
+                return self._waiting.index(ticket) + 1
+            except ValueError:
+                return 0
+
+    def eta(self, position: int) -> float:
+        """
+        Estimated seconds until the request at `position` starts.
+        """
+        with self._lock:
+            durations = list(self._durations)
+        average = sum(durations) / len(durations) if durations else 1.0
+        return math.ceil(position / self.concurrency) * average
+
+    def _cancel(self, ticket: _Ticket) -> None:
+        # Only a request that hasn't started can be taken back
+        if ticket.future.cancel():
+            with self._lock:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+
+    async def stream(self, func: Callable, *args, **kwargs) -> AsyncIterator[Tuple[str, Any]]:
+        ticket = self._submit(func, *args, **kwargs)
+        if ticket is None:
+            yield "rejected", f"The {self.name} queue is full, please try again in a moment."
+            return
+
+        future = asyncio.wrap_future(ticket.future)
+        try:
+            last = None
+            while ticket.started_at is None and not future.done():
+                position = self.position(ticket)
+                status = {"position": position, "eta_seconds": round(self.eta(position))}
+                if position and status != last:
+                    last = status
+                    yield "queued", status
+                await asyncio.wait({future}, timeout=QUEUE_POLL_SECONDS)
+
+            started_at = ticket.started_at if ticket.started_at is not None else time.monotonic()
+            remaining = self.timeout - (time.monotonic() - started_at)
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), max(remaining, 0))
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                yield "timeout", f"This took longer than {self.timeout:g}s and was stopped, please try again."
+                return
+            yield "done", result
+        finally:
+            if not future.done():
+                # The caller went away while it was still waiting
+                self._cancel(ticket)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Tuple[str, Any]:
+        """
+        stream() without the progress, the final (state, value) pair.
+        """
+        async for state, value in self.stream(func, *args, **kwargs):
+            if state != "queued":
+                return state, value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "waiting": len(self._waiting), "running": self._running, "concurrency": self.concurrency, "queue_depth": self.queue_depth}
+
+def _lane_setting(name: str, key: str, env_suffix: str, cast: Callable):
+    value = os.getenv(f"LANE_{name.upper()}_{env_suffix}")
+    return cast(value) if value else LANE_DEFAULTS[name][key]
+
+_lanes: Dict[str, WorkLane] = {}
+_lanes_lock = threading.Lock()
+
+def get_lane(name: str) -> WorkLane:
+    """
+    The process-wide lane for a kind of work, one of LANE_DEFAULTS.
+    """
+    with _lanes_lock:
+        lane = _lanes.get(name)
+        if lane is None:
+            lane = _lanes[name] = WorkLane(
+                name,
+                concurrency=_lane_setting(name, "concurrency", "CONCURRENCY", int),
+                queue_depth=_lane_setting(name, "queue_depth", "QUEUE", int),
+                timeout=_lane_setting(name, "timeout", "TIMEOUT", float),
+            )
+        return lane
+
+def format_queue_status(status: Dict[str, Any]) -> str:
+    eta = f", starting in about {status['eta_seconds']}s" if status["eta_seconds"] else ""
+    return f"Waiting in line: position {status['position']}{eta}."
+
+def queued_handler(lane: str, handler: Callable, render: Callable[[str], Any] = str):
+    """
+    Wrap a sync handler as an async generator Gradio handler that runs on
+    the lane. While the request waits its queue position is yielded, and a
+    rejected or timed out request yields the reason, both passed through
+    `render` to fit the handler's outputs.
+    """
+    @functools.wraps(handler)
+    async def run(*args):
+        async for state, value in get_lane(lane).stream(handler, *args):
+            if state == "done":
+                yield value
+            elif state == "queued":
+                yield render(format_queue_status(value))
+            else:
+                yield render(value)
+    return run
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import diskcache
+
+from app_paths import data_path, private_dir
+
+# Completion cache shared by every agent. autogen's implicit cache_seed disk
+# cache is switched off in llm_config, an agent view of this cache is passed
+# to initiate_chat instead. The disk tier is llm_cache in the app's private
+# data directory (see app_paths) unless LLM_CACHE_DIR says otherwise; the
+# conversations it holds carry applicants' personal data, so it is kept
+# readable by its owner only. Set LLM_CACHE_DIR to an empty string to keep
+# the cache in memory only.
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 24 * 60 * 60))
+MEMORY_MAX_ENTRIES = 512
+DISK_LIMIT_BYTES = 256 * 1024 * 1024
+
+# Request fields that change what the model answers, everything else
+# (timeouts, streaming, cache settings) is left out of the key
+KEY_FIELDS = ("model", "messages", "tools", "functions", "tool_choice", "temperature", "top_p", "max_tokens", "stop", "n", "response_format")
+MESSAGE_FIELDS = ("role", "content", "name", "tool_calls", "tool_call_id", "function_call")
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def _normalize_message(message: Any) -> Any:
+    if not isinstance(message, dict):
+        return message
+    normalized = {field: message[field] for field in MESSAGE_FIELDS if message.get(field) is not None}
+    if isinstance(normalized.get("content"), str):
+        normalized["content"] = normalized["content"].strip()
+    return normalized
+
+def cache_key(model: str, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, temperature: Optional[float] = None, **params) -> str:
+    """
+    Build the cache key for a completion request.
+
+    Only the fields that affect the completion are kept, message content is
+    whitespace-stripped and the result is hashed, so equivalent requests map
+    to the same short key.
+    """
+    request = {"model": model, "messages": [_normalize_message(m) for m in messages or []], "tools": tools or None, "temperature": temperature}
+    request.update({field: value for field, value in params.items() if field in KEY_FIELDS and value is not None})
+    request = {field: value for field, value in request.items() if value is not None}
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def normalize_key(key: str) -> str:
+    """
+    Turn the key autogen hands the cache (the JSON dumped request) into a cache_key().
+    """
+    try:
+        params = json.loads(key)
+    except (TypeError, ValueError):
+        params = None
+    if not isinstance(params, dict):
+        return hashlib.sha256(str(key).encode("utf-8")).hexdigest()
+    return cache_key(**{"model": params.get("model"), "messages": params.get("messages"), **{k: v for k, v in params.items() if k in KEY_FIELDS and k not in ("model", "messages")}})
+
+class LLMResponseCache:
+    """
+    Two tier cache for model completions.
+
+    The memory tier is an LRU bounded by entry count, the disk tier is a
+    diskcache.Cache (SQLite backed) with its own size limit and
+    least-recently-used eviction. Entries expire after `ttl` seconds in both
+    tiers. Each entry remembers how long the original call took, so a hit
+    can be credited with the latency it saved. Without a `directory` there
+    is no disk tier, a directory that is given is made owner-only.
+
+    autogen talks to the cache through for_agent() views, which follow its
+    AbstractCache protocol and keep per-agent counters.
+    """
+
+    def __init__(self, directory: Optional[str] = None, ttl: float = LLM_CACHE_TTL_SECONDS, memory_max_entries: int = MEMORY_MAX_ENTRIES, disk_limit_bytes: int = DISK_LIMIT_BYTES):
+        self.ttl = ttl
+        self.memory_max_entries = memory_max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        if directory:
+            self._disk = diskcache.Cache(private_dir(directory), size_limit=disk_limit_bytes, eviction_policy="least-recently-used")
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expired": 0}
+        self._agent_stats = {}
+
+    def get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return {"response", "latency", "created_at"} for a normalized key, or None.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry["created_at"] + self.ttl > now:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return entry
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+        entry = self._disk.get(key) if self._disk is not None else None
+        with self._lock:
+            if entry is None or entry["created_at"] + self.ttl <= now:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+            self._store_in_memory(key, entry)
+        return entry
+
+    def set_entry(self, key: str, response: Any, latency: float = 0.0) -> None:
+        entry = {"response": response, "latency": latency, "created_at": time.time()}
+        with self._lock:
+            self._stats["sets"] += 1
+            self._store_in_memory(key, entry)
+        if self._disk is not None:
+            self._disk.set(key, entry, expire=self.ttl)
+
+    def _store_in_memory(self, key: str, entry: Dict[str, Any]) -> None:
+        self._memory.pop(key, None)
+        self._memory[key] = entry
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def for_agent(self, agent_name: str, bypass: bool = False) -> "AgentCacheView":
+        """
+        A view of the cache to pass as initiate_chat(cache=...).
+
+        With `bypass` the view never serves cached responses but still stores
+        the fresh ones, for when a step has to be re-run against the model.
+        """
+        return AgentCacheView(self, agent_name, bypass)
+
+    def _record(self, agent_name: str, counter: str, amount: float = 1) -> None:
+        with self._lock:
+            stats = self._agent_stats.setdefault(agent_name, {"hits": 0, "misses": 0, "bypassed": 0, "sets": 0, "latency_saved": 0.0})
+            stats[counter] += amount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["agents"] = {name: dict(agent) for name, agent in self._agent_stats.items()}
+        if self._disk is not None:
+            stats["disk_bytes"] = self._disk.volume()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["latency_saved"] = sum(agent["latency_saved"] for agent in stats["agents"].values())
+        return stats
+
+class AgentCacheView:
+    """
+    One agent's handle on the shared LLMResponseCache, in the shape autogen's
+    OpenAIWrapper expects (get/set/close and a context manager).
+
+    autogen calls get() before a request and set() once the response is back,
+    the time in between is recorded as the latency of the call.
+    """
+
+    def __init__(self, cache: LLMResponseCache, agent_name: str, bypass: bool = False):
+        self.cache = cache
+        self.agent_name = agent_name
+        self.bypass = bypass
+        self._started = {}
+
+    def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        normalized = normalize_key(key)
+        if self.bypass:
+            self.cache._record(self.agent_name, "bypassed")
+            self._started[normalized] = time.perf_counter()
+            return default
+        entry = self.cache.get_entry(normalized)
+        if entry is None:
+            self.cache._record(self.agent_name, "misses")
+            self._started[normalized] = time.perf_counter()
+            return default
+        self.cache._record(self.agent_name, "hits")
+        self.cache._record(self.agent_name, "latency_saved", entry["latency"])
+        return entry["response"]
+
+    def set(self, key: str, value: Any) -> None:
+        normalized = normalize_key(key)
+        started = self._started.pop(normalized, None)
+        if started is None:
+            # autogen re-stores a hit when it had to fill in the cost, keep the original latency
+            entry = self.cache.get_entry(normalized)
+            latency = entry["latency"] if entry is not None else 0.0
+        else:
+            latency = time.perf_counter() - started
+        self.cache._record(self.agent_name, "sets")
+        self.cache.set_entry(normalized, value, latency)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "AgentCacheView":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+def get_llm_cache() -> LLMResponseCache:
+    """
+    Return the process wide LLM response cache, creating it on first use.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMResponseCache(data_path("llm_cache") if LLM_CACHE_DIR is None else LLM_CACHE_DIR)
+        return _default_cache
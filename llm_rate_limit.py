@@ -0,0 +1,576 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+from telemetry import annotate
+
+# Rate limiting for the OpenAI calls of every agent in the process. The agents'
+# config_list entries get a shared httpx client (rate_limited()) whose
+# transport, before each completion request:
+#
+#   - estimates its tokens with tiktoken (prompt, tools and the completion
+#     allowance) and takes a request and the tokens from the model's
+#     requests/min and tokens/min buckets, waiting for them to refill;
+#   - waits for a slot under the model's adaptive concurrency limit, which
+#     grows by one per limit's worth of successful calls and halves on a 429
+#     (AIMD), so the calls settle just under the quota instead of storming it.
+#
+# A 429 holds every call to the model until its Retry-After has passed. The
+# limits start from MODEL_LIMITS (LLM_RATE_LIMITS overrides, JSON of model
+# prefix -> {"rpm", "tpm"}) and follow the x-ratelimit-* headers of the
+# responses. With LLM_RATE_LIMIT_DB set the buckets and holds live in that
+# SQLite file and are shared by every process using it; concurrency is per process.
+
+LLM_RATE_LIMIT = os.getenv("LLM_RATE_LIMIT", "true").lower() in ("1", "true", "yes")
+LLM_RATE_LIMIT_DB = os.getenv("LLM_RATE_LIMIT_DB", "")
+MAX_WAIT_SECONDS = float(os.getenv("LLM_RATE_LIMIT_MAX_WAIT", 60))
+# Model name prefixes with their (requests/min, tokens/min), the first match wins
+MODEL_LIMITS = (
+    ("gpt-4o-mini", 500, 200_000),
+    ("gpt-4.1-mini", 500, 200_000),
+    ("gpt-4.1-nano", 500, 200_000),
+    ("gpt-3.5", 500, 200_000),
+    ("gpt-4o", 500, 30_000),
+    ("gpt-4.1", 500, 30_000),
+    ("gpt-4", 500, 10_000),
+    ("o1", 500, 30_000),
+    ("o3", 500, 30_000),
+)
+DEFAULT_LIMITS = (500, 30_000)
+# Tokens counted for the reply when the request doesn't set max_tokens
+COMPLETION_TOKEN_ESTIMATE = 512
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 64
+DECREASE_FACTOR = 0.5
+# 429s within this window of a decrease belong to the same burst and don't decrease again
+DECREASE_INTERVAL_SECONDS = 2.0
+# Responses bigger than this aren't read back for their usage
+USAGE_BODY_LIMIT = 1024 * 1024
+KINDS = ("requests", "tokens")
+# A tiktoken encoding that couldn't be loaded (it is downloaded on first use) is tried again after this long
+ENCODING_RETRY_SECONDS = 5 * 60
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+_encodings = {}
+_encoding_failures = {}
+_encodings_lock = threading.Lock()
+
+_default_limiter = None
+_default_client = None
+_default_lock = threading.Lock()
+
+def _encoding(model: str):
+    # tiktoken downloads its encodings on first use, until one loads the estimate falls back to characters
+    with _encodings_lock:
+        if model in _encodings:
+            return _encodings[model]
+        if time.monotonic() < _encoding_failures.get(model, 0.0):
+            return None
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"No tiktoken encoding for {model}, estimating tokens from characters for now: {str(e)}")
+        with _encodings_lock:
+            _encoding_failures[model] = time.monotonic() + ENCODING_RETRY_SECONDS
+        return None
+    with _encodings_lock:
+        _encodings[model] = encoding
+        _encoding_failures.pop(model, None)
+    return encoding
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def estimate_tokens(params: Dict[str, Any]) -> int:
+    """
+    Tokens a chat completion request counts against the tokens/min limit:
+    its messages and tools plus the completion it may produce.
+    """
+    model = str(params.get("model", ""))
+    tokens = 3  # the reply's priming
+    for message in params.get("messages") or []:
+        tokens += 4
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+        for text in (content, message.get("name"), message.get("tool_calls") and json.dumps(message["tool_calls"])):
+            if text:
+                tokens += count_tokens(str(text), model)
+    if params.get("tools"):
+        tokens += count_tokens(json.dumps(params["tools"]), model)
+    return tokens + int(params.get("max_completion_tokens") or params.get("max_tokens") or COMPLETION_TOKEN_ESTIMATE)
+
+def _duration(value: Optional[str]) -> Optional[float]:
+    # "20", "1.5s", "6m0s", "120ms"
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if parts:
+        return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def retry_after(headers: httpx.Headers) -> Optional[float]:
+    """
+    Seconds to wait after a 429, from retry-after-ms, Retry-After or the x-ratelimit-reset-* headers.
+    """
+    if headers.get("retry-after-ms"):
+        try:
+            return max(float(headers["retry-after-ms"]) / 1000, 0.0)
+        except ValueError:
+            pass
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        seconds = _duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return None
+
+class BucketStore(ABC):
+    """
+    Token bucket levels and holds per model. A bucket refills at its
+    per-minute limit spread over the minute, up to the limit.
+    """
+
+    @abstractmethod
+    def _state(self, model: str) -> Iterator[Dict[str, Any]]:
+        """
+        A context manager giving the model's {"buckets": {kind: [level, updated]},
+        "held_until"}, locked for the block and saved after it.
+        """
+
+    def close(self) -> None:
+        """
+        Release what the store holds open.
+        """
+
+    @staticmethod
+    def _refill(state: Dict[str, Any], limits: Dict[str, float], now: float) -> None:
+        for kind, limit in limits.items():
+            level, updated = state["buckets"].get(kind) or (limit, now)
+            state["buckets"][kind] = [min(limit, level + max(now - updated, 0.0) * limit / 60), now]
+
+    def take(self, model: str, costs: Dict[str, float], limits: Dict[str, float]) -> float:
+        """
+        Take the costs if every bucket has them and return 0, else the seconds
+        until they will, without taking anything.
+        """
+        now = time.time()
+        with self._state(model) as state:
+            if state["held_until"] > now:
+                return state["held_until"] - now
+            self._refill(state, limits, now)
+            # A request bigger than a whole bucket waits for a full one
+            costs = {kind: min(cost, limits[kind]) for kind, cost in costs.items()}
+            wait = max((costs[kind] - state["buckets"][kind][0]) * 60 / limits[kind] for kind in costs)
+            if wait > 0:
+                return wait
+            for kind, cost in costs.items():
+                state["buckets"][kind][0] -= cost
+            return 0.0
+
+    def adjust(self, model: str, kind: str, amount: float, limits: Dict[str, float], ceiling: float = None) -> None:
+        """
+        Give back (or take more of) a bucket, e.g. when the actual usage is
+        known, and optionally lower it to `ceiling`, the remaining quota the API reported.
+        """
+        with self._state(model) as state:
+            self._refill(state, limits, time.time())
+            bucket = state["buckets"][kind]
+            bucket[0] = max(-limits[kind], min(limits[kind], bucket[0] + amount))
+            if ceiling is not None:
+                bucket[0] = min(bucket[0], ceiling)
+
+    def hold(self, model: str, seconds: float) -> None:
+        """
+        Stop taking from the model's buckets for `seconds`.
+        """
+        with self._state(model) as state:
+            state["held_until"] = max(state["held_until"], time.time() + seconds)
+
+class MemoryBucketStore(BucketStore):
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _state(self, model: str) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            yield self._states.setdefault(model, {"buckets": {}, "held_until": 0.0})
+
+class SQLiteBucketStore(BucketStore):
+    """
+    Buckets in a SQLite file shared by every process that opens it. Each
+    update runs in an immediate transaction, so processes take from the
+    buckets one at a time.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS llm_buckets (
+            model TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            level REAL NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (model, kind)
+        );
+        CREATE TABLE IF NOT EXISTS llm_holds (
+            model TEXT PRIMARY KEY,
+            held_until REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Transactions are managed here, see _state(). Closed from whichever thread calls close()
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                for thread in [thread for thread in self._connections if not thread.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def close(self) -> None:
+        """
+        Close every thread's connection, threads open a new one on their next call.
+        """
+        with self._connections_lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    @contextmanager
+    def _state(self, model: str) -> Iterator[Dict[str, Any]]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT kind, level, updated FROM llm_buckets WHERE model = ?", (model,)).fetchall()
+            held = conn.execute("SELECT held_until FROM llm_holds WHERE model = ?", (model,)).fetchone()
+            state = {"buckets": {kind: [level, updated] for kind, level, updated in rows}, "held_until": held[0] if held else 0.0}
+            yield state
+            conn.executemany(
+                "INSERT OR REPLACE INTO llm_buckets (model, kind, level, updated) VALUES (?, ?, ?, ?)",
+                [(model, kind, level, updated) for kind, (level, updated) in state["buckets"].items()]
+            )
+            if state["held_until"]:
+                conn.execute("INSERT OR REPLACE INTO llm_holds (model, held_until) VALUES (?, ?)", (model, state["held_until"]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+class _AdaptiveConcurrency:
+    """
+    AIMD concurrency limit: +1 per `limit` successful calls, halved on a
+    throttled one, at most once per DECREASE_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, initial: float = INITIAL_CONCURRENCY):
+        self.limit = float(initial)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, deadline: float) -> bool:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, outcome: str) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self.limit = min(MAX_CONCURRENCY, self.limit + 1 / self.limit)
+            elif outcome == "throttled" and time.monotonic() - self._last_decrease > DECREASE_INTERVAL_SECONDS:
+                self.limit = max(MIN_CONCURRENCY, self.limit * DECREASE_FACTOR)
+                self._last_decrease = time.monotonic()
+            self._condition.notify_all()
+
+def _configured_limits() -> Dict[str, Dict[str, float]]:
+    try:
+        return json.loads(os.getenv("LLM_RATE_LIMITS") or "{}")
+    except ValueError as e:
+        print(f"Ignoring LLM_RATE_LIMITS, it isn't valid JSON: {str(e)}")
+        return {}
+
+class LLMRateLimiter:
+    """
+    Requests/min and tokens/min buckets and an adaptive concurrency limit
+    per model, see the module comment. acquire() before a call, release()
+    with its outcome after it.
+    """
+
+    def __init__(self, store: BucketStore = None, limits: Dict[str, Dict[str, float]] = None, max_wait: float = MAX_WAIT_SECONDS):
+        self.store = store if store is not None else (SQLiteBucketStore(LLM_RATE_LIMIT_DB) if LLM_RATE_LIMIT_DB else MemoryBucketStore())
+        self.configured = {**_configured_limits(), **(limits or {})}
+        self.max_wait = max_wait
+        self._learned = {}
+        self._concurrency = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def limits(self, model: str) -> Dict[str, float]:
+        """
+        {"requests", "tokens"} per minute for the model, what the API last reported if anything.
+        """
+        with self._lock:
+            learned = self._learned.get(model)
+        if learned:
+            return learned
+        for prefix, limits in sorted(self.configured.items(), key=lambda item: -len(item[0])):
+            if model.startswith(prefix):
+                return {"requests": float(limits["rpm"]), "tokens": float(limits["tpm"])}
+        for prefix, rpm, tpm in MODEL_LIMITS:
+            if model.startswith(prefix):
+                return {"requests": float(rpm), "tokens": float(tpm)}
+        return {"requests": float(DEFAULT_LIMITS[0]), "tokens": float(DEFAULT_LIMITS[1])}
+
+    def _model(self, model: str):
+        with self._lock:
+            concurrency = self._concurrency.get(model)
+            if concurrency is None:
+                concurrency = self._concurrency[model] = _AdaptiveConcurrency()
+                self._stats[model] = {"requests": 0, "throttled": 0, "errors": 0, "waited": 0, "wait_seconds": 0.0, "timeouts": 0, "tokens_estimated": 0, "tokens_used": 0}
+            return concurrency, self._stats[model]
+
+    def acquire(self, model: str, tokens: int) -> bool:
+        """
+        Wait for a concurrency slot and the request's share of the buckets.
+        False when that takes longer than max_wait, nothing is held then.
+        """
+        concurrency, stats = self._model(model)
+        start = time.monotonic()
+        deadline = start + self.max_wait
+        if not concurrency.acquire(deadline):
+            with self._lock:
+                stats["timeouts"] += 1
+            return False
+        limits = self.limits(model)
+        while True:
+            wait = self.store.take(model, {"requests": 1, "tokens": tokens}, limits)
+            if wait <= 0:
+                break
+            if time.monotonic() + wait > deadline:
+                concurrency.release("timeout")
+                with self._lock:
+                    stats["timeouts"] += 1
+                return False
+            time.sleep(wait)
+        waited = time.monotonic() - start
+        with self._lock:
+            stats["requests"] += 1
+            stats["tokens_estimated"] += tokens
+            if waited > 0.001:
+                stats["waited"] += 1
+                stats["wait_seconds"] += waited
+        annotate({"llm.rate_limit_wait": round(waited, 3)})
+        return True
+
+    def release(self, model: str, tokens: int, status: Optional[int], headers: Optional[httpx.Headers] = None, used: Optional[int] = None) -> None:
+        """
+        Record the outcome of an acquired call: its status (None when it
+        failed without a response), headers and actual token usage.
+        """
+        concurrency, stats = self._model(model)
+        headers = headers if headers is not None else httpx.Headers()
+        limits = self.limits(model)
+        if status == 429:
+            delay = retry_after(headers)
+            self.store.hold(model, delay if delay is not None else 1.0)
+            # A throttled call didn't use its tokens
+            self.store.adjust(model, "tokens", tokens, limits)
+            outcome = "throttled"
+        elif status is not None and status < 400:
+            self._learn(model, headers)
+            limits = self.limits(model)
+            for kind in KINDS:
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                amount = tokens - used if kind == "tokens" and used is not None else 0
+                if remaining is not None or amount:
+                    self.store.adjust(model, kind, amount, limits, float(remaining) if remaining is not None and remaining.isdigit() else None)
+            outcome = "ok"
+        else:
+            outcome = "error"
+        concurrency.release(outcome)
+        with self._lock:
+            if outcome == "throttled":
+                stats["throttled"] += 1
+            elif outcome == "error":
+                stats["errors"] += 1
+            if used is not None:
+                stats["tokens_used"] += used
+
+    def _learn(self, model: str, headers: httpx.Headers) -> None:
+        requests, tokens = headers.get("x-ratelimit-limit-requests"), headers.get("x-ratelimit-limit-tokens")
+        if requests and tokens and requests.isdigit() and tokens.isdigit():
+            with self._lock:
+                self._learned[model] = {"requests": float(requests), "tokens": float(tokens)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {model: dict(stats) for model, stats in self._stats.items()}
+            concurrency = dict(self._concurrency)
+        for model, stats in models.items():
+            stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+            stats["concurrency_limit"] = round(concurrency[model].limit, 2)
+            stats["in_flight"] = concurrency[model].in_flight
+            stats["limits"] = self.limits(model)
+        return models
+
+class _ReleasingStream(httpx.SyncByteStream):
+    # Releases the call when the response is closed, with the usage of a JSON body
+    def __init__(self, stream: httpx.SyncByteStream, on_close, keep_body: bool):
+        self._stream = stream
+        self._on_close = on_close
+        self._body = bytearray() if keep_body else None
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            if self._body is not None:
+                self._body += chunk
+                if len(self._body) > USAGE_BODY_LIMIT:
+                    self._body = None
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._on_close(bytes(self._body) if self._body else None)
+
+def _usage(body: Optional[bytes]) -> Optional[int]:
+    try:
+        return int(json.loads(body)["usage"]["total_tokens"])
+    except (TypeError, ValueError, KeyError):
+        return None
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """
+    httpx transport that passes requests with a JSON body naming a "model"
+    through the limiter, anything else goes straight through.
+    """
+
+    def __init__(self, limiter: LLMRateLimiter, transport: httpx.BaseTransport = None):
+        self.limiter = limiter
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            params = json.loads(request.content) if request.method == "POST" else None
+        except (httpx.RequestNotRead, ValueError):
+            params = None
+        if not isinstance(params, dict) or not params.get("model"):
+            return self._transport.handle_request(request)
+
+        model = str(params["model"])
+        tokens = estimate_tokens(params)
+        if not self.limiter.acquire(model, tokens):
+            raise httpx.PoolTimeout(f"No {model} capacity within the rate limit after {self.limiter.max_wait:g}s", request=request)
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            self.limiter.release(model, tokens, None)
+            raise
+
+        released = []
+
+        def release(body: Optional[bytes]) -> None:
+            if not released:
+                released.append(True)
+                self.limiter.release(model, tokens, response.status_code, response.headers, _usage(body))
+
+        keep_body = "json" in response.headers.get("content-type", "")
+        if response.status_code >= 400:
+            # Throttling and errors are known from the headers, don't wait for the body
+            release(None)
+        elif response.is_closed:
+            # Already read by the transport, it won't be closed again
+            release(response.content if keep_body else None)
+            return response
+        response.stream = _ReleasingStream(response.stream, release, keep_body)
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+class RateLimitedClient(httpx.Client):
+    """
+    The http_client of the rate limited config_list entries. Agents deepcopy
+    their llm_config, every copy shares this client and its limiter.
+    """
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "RateLimitedClient":
+        return self
+
+def get_rate_limiter() -> LLMRateLimiter:
+    """
+    Return the process wide limiter, creating it on first use.
+    """
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            _default_limiter = LLMRateLimiter()
+        return _default_limiter
+
+def get_llm_http_client() -> RateLimitedClient:
+    """
+    Return the process wide rate limited client for the OpenAI SDK.
+    """
+    global _default_client
+    limiter = get_rate_limiter()
+    with _default_lock:
+        if _default_client is None:
+            _default_client = RateLimitedClient(transport=RateLimitedTransport(limiter), follow_redirects=True)
+        return _default_client
+
+def rate_limited(config_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The config_list with the OpenAI entries going through the shared limiter,
+    unchanged when LLM_RATE_LIMIT is off. Entries with their own http_client are left alone.
+    """
+    if not LLM_RATE_LIMIT:
+        return config_list
+    return [
+        {**config, "http_client": get_llm_http_client()} if config.get("api_type", "openai") in ("openai", "azure") and "http_client" not in config else config
+        for config in config_list
+    ]
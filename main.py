@@ -1,98 +1,116 @@
-from autogen import AssistantAgent, UserProxyAgent, config_list_from_json
+import json
+import os
 from typing import Annotated
-import requests
+import httpx
+from agents import AgentRegistry, assistant_factory
 from system_prompts import front_desk_assistant_prompt, email_assistant_prompt, verify_tlsn_proof_prompt, salary_slip_assistant_prompt
 from verify_tlsn_proof import verify_tlsn_proof, save_tlsn_proof
+from prove_api import get_prove_key_cache
+from pipeline import verify_application
+from verification_coordinator import get_verification_coordinator
+from llm_cache import get_llm_cache
+from llm_rate_limit import get_rate_limiter, rate_limited
+from model_router import MODEL_ROUTING
+from telemetry import annotate, chat_result_attributes, configure_telemetry, tracer
 
 
-llm_config = {
-    "timeout": 120,
-    "seed": 42, # for caching. once task is run it caches the response,
-    "config_list": config_list_from_json(env_or_file="OAI_CONFIG_LIST.json"),
-    "temperature": 0
-}
+def load_llm_config() -> dict:
+    from autogen import config_list_from_json
+    return {
+        "timeout": 120,
+        "cache_seed": None, # completions are cached in llm_cache, passed per chat
+        "config_list": rate_limited(config_list_from_json(env_or_file="OAI_CONFIG_LIST.json")),  # see llm_rate_limit
+        "temperature": 0
+    }
 
 def verify_email_with_prove_api(domain :Annotated[str, "The domain name to verify"]) -> Annotated[dict, "The response from the Prove Email API"] | None:
-    api_url = f"https://archive.prove.email/api/key?domain={domain}"
-    response = requests.get(api_url)
-    print("response : ", response)
-    return response.json() if response.status_code == 200 else None
+    # Keys are served from a shared TTL cache, see prove_api.ProveKeyCache
+    try:
+        return get_prove_key_cache().lookup(domain)
+    except httpx.HTTPError as e:
+        print(f"Prove API lookup failed for {domain}: {str(e)}")
+        return None
 
-front_desk_assistant = AssistantAgent(
-    name="front_desk_assistant",
-    llm_config=llm_config,
-    system_message=front_desk_assistant_prompt,
-)
+# Agents are built on first use, see agents.AgentRegistry
+registry = AgentRegistry(load_llm_config)
+registry.register("front_desk_assistant", assistant_factory("front_desk_assistant", front_desk_assistant_prompt))
+registry.register("email_assistant", assistant_factory("email_assistant", email_assistant_prompt))
+registry.register("verify_tlsn_proof_assistant", assistant_factory("verify_tlsn_proof_assistant", verify_tlsn_proof_prompt))
+registry.register("salary_slip_assistant", assistant_factory("salary_slip_assistant", salary_slip_assistant_prompt))
 
-email_assistant = AssistantAgent(
-    name="email_assistant",
-    llm_config=llm_config,
-    system_message=email_assistant_prompt
-)
-
-verify_tlsn_proof_assistant = AssistantAgent(
-    name="verify_tlsn_proof_assistant",
-    llm_config=llm_config,
-    system_message=verify_tlsn_proof_prompt
-)
-
-salary_slip_assistant = AssistantAgent(
-    name="salary_slip_assistant",
-    llm_config=llm_config,
-    system_message=salary_slip_assistant_prompt
-)
+@registry.factory("user_proxy")
+def build_user_proxy(registry: AgentRegistry):
+    from autogen import UserProxyAgent
+    user_proxy = UserProxyAgent(
+        name="user_proxy",
+        human_input_mode="ALWAYS",
+        max_consecutive_auto_reply=3,
+        is_termination_msg=lambda x: x.get("content", "").rstrip().endswith("TERMINATE"),
+        code_execution_config={
+            "last_n_messages": 3,
+            "work_dir": "code",
+            "use_docker": False,
+        },
+        llm_config=registry.llm_config,
+        system_message="""Reply TERMINATE if the task has been solved at full satisfaction
+        otherwise, reply CONTINUE, or the reason why the task is not solved yet."""
+    )
 
-user_proxy = UserProxyAgent(
-    name="user_proxy",
-    human_input_mode="ALWAYS",
-    max_consecutive_auto_reply=3,
-    is_termination_msg=lambda x: x.get("content", "").rstrip().endswith("TERMINATE"),
-    code_execution_config={
-        "last_n_messages": 3,
-        "work_dir": "code",
-        "use_docker": False,
-    },
-    llm_config=llm_config,
-    system_message="""Reply TERMINATE if the task has been solved at full satisfaction
-    otherwise, reply CONTINUE, or the reason why the task is not solved yet."""
-)
+    user_proxy.register_for_llm(name="verify_email_with_prove_api", description="verify email's dkim using prove api verify_email_with_prove_api")(verify_email_with_prove_api)
+    user_proxy.register_for_execution(name="verify_email_with_prove_api")(verify_email_with_prove_api)
 
+    user_proxy.register_for_llm(name="verify_tlsn_proof", description="verify tlsn json proof")(verify_tlsn_proof)
+    user_proxy.register_for_execution(name="verify_tlsn_proof")(verify_tlsn_proof)
+    return user_proxy
 
+def __getattr__(name: str):
+    # `from main import front_desk_assistant` etc. still work, and build the agent on access
+    if name == "llm_config":
+        return registry.llm_config
+    if name in registry:
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-user_proxy.register_for_llm(name="verify_email_with_prove_api", description="verify email's dkim using prove api verify_email_with_prove_api")(verify_email_with_prove_api)
-user_proxy.register_for_execution(name="verify_email_with_prove_api")(verify_email_with_prove_api)
+def load_application(path: str = os.path.join("code", "bank.json")) -> dict:
+    """
+    Load the application the front desk assistant saved during intake
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Could not load the application from {path}: {str(e)}")
+        return {}
 
-user_proxy.register_for_llm(name="verify_tlsn_proof", description="verify tlsn json proof")(verify_tlsn_proof)
-user_proxy.register_for_execution(name="verify_tlsn_proof")(verify_tlsn_proof)
+def collect_verification_inputs() -> dict:
+    """
+    Ask the applicant for every document up front, so the checks can run concurrently
+    """
+    print("Please provide your documents for verification, leave a field empty to skip it.")
+    inputs = {
+        "email_path": input("Path to your raw email (.eml): ").strip(),
+        "pdf_url": input("URL of your salary slip PDF: ").strip(),
+        "pdf_password": input("Salary slip PDF password (if any): ").strip() or None,
+        "tlsn_proof_path": input("Path to your TLSN proof JSON: ").strip(),
+    }
+    return {key: value for key, value in inputs.items() if value}
 
 def main():
-    # Register the verify_email_with_prove_api function for the email_assistant
-    email_assistant.register_function(
-        function_map={
-            "verify_email_with_prove_api": verify_email_with_prove_api,
-            "verify_tlsn_proof": verify_tlsn_proof
-        }
-    )
-    chat_results = user_proxy.initiate_chats([
-        {
-            "recipient": front_desk_assistant,
-            "message": "I want to apply for a loan, please help me",
-            "silent": False,
-            "summary_method": "reflection_with_llm"
-        },
-        {
-            "recipient": email_assistant,
-            "message": "guide user to paste their raw email and validate with json that you recieved from front_desk_assistant",
-            "silent": False,
-            "summary_method": "reflection_with_llm"
-        },
-        {
-            "recipient": verify_tlsn_proof_assistant,
-            "message": "guide user to provide the tlsn proof",
-            "silent": False,
-            "summary_method": "reflection_with_llm"
-        }
-    ])
+    configure_telemetry()
+    # Intake has to finish first, everything after it depends on bank.json
+    front_desk_assistant = registry.get("front_desk_assistant")
+    with tracer.start_as_current_span("agent.initiate_chats") as span:
+        chat_results = registry.get("user_proxy").initiate_chats([
+            {
+                "recipient": front_desk_assistant,
+                "message": "I want to apply for a loan, please help me",
+                "silent": False,
+                "summary_method": registry.router.summary_method if MODEL_ROUTING else "reflection_with_llm",
+                "cache": get_llm_cache().for_agent(front_desk_assistant.name)
+            }
+        ])
+        for chat_res in chat_results:
+            annotate(chat_result_attributes(chat_res), span)
     # groupchat = autogen.GroupChat(agents=[user_proxy, front_desk_assistant, email_assistant], messages=[], max_round=5)
     # manager = autogen.GroupChatManager(groupchat=groupchat, llm_config=llm_config)
     # chat_results = user_proxy.initiate_chat(manager, message="I want to apply for a loan, please help me")
@@ -102,5 +120,20 @@ def main():
         print("Human input in the middle:", chat_res.human_input)
         print("Conversation cost: ", chat_res.cost)
         print("\n\n")
+    if MODEL_ROUTING:
+        print("Model routes:", json.dumps(registry.router.stats()))
+    print("OpenAI rate limits:", json.dumps(get_rate_limiter().stats()))
+
+    # The email, salary slip and TLSN checks are independent, run them concurrently
+    application = load_application()
+    result = verify_application(application, collect_verification_inputs())
+    for name, outcome in result["outcomes"].items():
+        print(f"{name}: {outcome['status']} in {outcome['duration']:.2f}s")
+    decision = result["decision"]
+    print("Loan approved!" if decision["approved"] else "Loan not approved:")
+    for reason in decision["reasons"]:
+        print(f"- {reason}")
+    print("Verification calls:", json.dumps(get_verification_coordinator().stats()["kinds"]))
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from telemetry import tracer
+
+# Per agent, per turn model routing over the llm_config config_list.
+#
+# Every config entry belongs to a tier, "fast" or "strong", from its "tags" or
+# else from MODEL_TIERS by model name. An agent's turns go to the entries of
+# its route's tier first, with the other entries behind them as fallbacks, so
+# autogen's own failover (next entry on timeouts and API errors) moves a turn
+# to the other tier. Fast entries get a short timeout, a stalled fast model
+# fails over instead of holding up the conversation.
+#
+# A turn is escalated to the strong tier when it answers a failed tool call,
+# or when the fast model's reply says it isn't sure.
+
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "true").lower() in ("1", "true", "yes")
+FAST_TIMEOUT_SECONDS = float(os.getenv("MODEL_FAST_TIMEOUT_SECONDS", 20))
+TIERS = ("fast", "strong")
+# Model name prefixes, the first match wins. Unknown models count as strong.
+MODEL_TIERS = (
+    ("gpt-4o-mini", "fast"),
+    ("gpt-4.1-mini", "fast"),
+    ("gpt-4.1-nano", "fast"),
+    ("gpt-3.5", "fast"),
+    ("gpt-4", "strong"),
+    ("o1", "strong"),
+    ("o3", "strong"),
+)
+# Agent name (or "summary" for chat summaries) -> tier, MODEL_ROUTES (JSON) overrides entries
+ROUTES = {
+    "front_desk_assistant": "fast",
+    "email_assistant": "strong",
+    "salary_slip_assistant": "strong",
+    "tlsn_assistant": "strong",
+    "verify_tlsn_proof_assistant": "strong",
+    "summary": "fast",
+}
+DEFAULT_ROUTE = "fast"
+LOW_CONFIDENCE = re.compile(r"\b(i'?m not (sure|certain)|i am not (sure|certain)|unable to (verify|determine|confirm)|can(?:no|')t (verify|determine|confirm|tell))\b", re.IGNORECASE)
+TOOL_FAILURE = re.compile(r"\"success\":\s*false|'success':\s*false|^error\b", re.IGNORECASE | re.MULTILINE)
+# Completions kept per model for the latency percentiles
+LATENCY_WINDOW = 500
+
+def config_tier(config: Dict[str, Any]) -> str:
+    """
+    The tier of a config_list entry, from its tags or its model name.
+    """
+    for tag in config.get("tags") or []:
+        if tag in TIERS:
+            return tag
+    model = str(config.get("model", ""))
+    for prefix, tier in MODEL_TIERS:
+        if model.startswith(prefix):
+            return tier
+    return "strong"
+
+def _load_routes() -> Dict[str, str]:
+    routes = dict(ROUTES)
+    try:
+        routes.update(json.loads(os.getenv("MODEL_ROUTES") or "{}"))
+    except ValueError as e:
+        print(f"Ignoring MODEL_ROUTES, it isn't valid JSON: {str(e)}")
+    return routes
+
+def _tool_failed(messages: List[Dict[str, Any]]) -> bool:
+    # The turn answers a tool or function call that came back with an error
+    if not messages:
+        return False
+    last = messages[-1]
+    responses = last.get("tool_responses") or ([last] if last.get("role") in ("tool", "function") else [])
+    return any(TOOL_FAILURE.search(str(response.get("content") or "")) for response in responses)
+
+def _reply_text(reply: Any) -> str:
+    if isinstance(reply, dict):
+        return str(reply.get("content") or "")
+    return str(reply or "")
+
+def _usage_by_model(client) -> Dict[str, Dict[str, float]]:
+    usage = client.total_usage_summary or {}
+    return {model: dict(counts) for model, counts in usage.items() if isinstance(counts, dict)}
+
+class ModelRouter:
+    """
+    Routes each assistant turn to a model tier and keeps per-model latency,
+    cost and token counts so the routes can be tuned.
+
+    attach() swaps an agent's generate_oai_reply for a routed one, and
+    summary_method can be passed to initiate_chat(s) to summarize on the
+    summary route.
+    """
+
+    def __init__(self, llm_config: Dict[str, Any], routes: Dict[str, str] = None, fast_timeout: float = FAST_TIMEOUT_SECONDS):
+        self.llm_config = llm_config
+        self.routes = {**_load_routes(), **(routes or {})}
+        self.fast_timeout = fast_timeout
+        self._clients = {}
+        self._models = {}
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def ordered_config_list(self, tier: str, config_list: List[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        The config_list with the tier's entries first and the rest as fallbacks.
+        """
+        config_list = config_list if config_list is not None else self.llm_config.get("config_list") or []
+        ordered = [config for config in config_list if config_tier(config) == tier] + [config for config in config_list if config_tier(config) != tier]
+        # Failing over is the retry for fast entries
+        return [{"timeout": self.fast_timeout, "max_retries": 0, **config} if config_tier(config) == "fast" else config for config in ordered]
+
+    def route(self, agent_name: str, messages: List[Dict[str, Any]], turn: str = "reply") -> Tuple[str, str]:
+        """
+        The tier for a turn and why: "route", or "tool_failure" when escalated.
+        """
+        tier = self.routes.get("summary" if turn == "summary" else agent_name, DEFAULT_ROUTE)
+        if tier != "strong" and turn == "reply" and _tool_failed(messages):
+            return "strong", "tool_failure"
+        return tier, "route"
+
+    def client(self, agent, tier: str):
+        """
+        An OpenAIWrapper for the agent's llm_config on the tier, built once per
+        agent, tier and set of registered tools.
+        """
+        llm_config = self._agent_llm_config(agent)
+        key = (agent.name, tier, json.dumps(llm_config.get("tools"), sort_keys=True, default=str))
+        with self._lock:
+            client = self._clients.get(key)
+        if client is None:
+            from autogen import OpenAIWrapper
+            client = OpenAIWrapper(**{**llm_config, "config_list": self.ordered_config_list(tier, llm_config.get("config_list"))})
+            with self._lock:
+                client = self._clients.setdefault(key, client)
+        return client
+
+    def _agent_llm_config(self, agent) -> Dict[str, Any]:
+        return agent.llm_config if isinstance(getattr(agent, "llm_config", None), dict) else self.llm_config
+
+    def attach(self, agent) -> None:
+        """
+        Route the agent's LLM replies, sync and async, through this router.
+        """
+        from autogen import ConversableAgent
+
+        def generate_routed_reply(recipient, messages=None, sender=None, config=None):
+            if recipient.client is None:
+                return False, None
+            if messages is None:
+                messages = recipient.chat_messages.get(sender, [])
+            reply = self._routed_reply(recipient, messages, sender)
+            return (False, None) if reply is None else (True, reply)
+
+        async def a_generate_routed_reply(recipient, messages=None, sender=None, config=None):
+            return await asyncio.to_thread(generate_routed_reply, recipient, messages, sender, config)
+
+        agent.replace_reply_func(ConversableAgent.generate_oai_reply, generate_routed_reply)
+        agent.replace_reply_func(ConversableAgent.a_generate_oai_reply, a_generate_routed_reply)
+
+    def _routed_reply(self, agent, messages: List[Dict[str, Any]], sender) -> Any:
+        tier, reason = self.route(agent.name, messages)
+
+        def call(client):
+            return agent.generate_oai_reply(messages, sender, config=client)[1]
+
+        reply = self._complete(agent, "reply", tier, reason, call)
+        if tier == "fast" and reply is not None and LOW_CONFIDENCE.search(_reply_text(reply)):
+            reply = self._complete(agent, "reply", "strong", "low_confidence", call)
+        return reply
+
+    def summary_method(self, sender, recipient, summary_args: Dict[str, Any]) -> str:
+        """
+        A reflection_with_llm summary on the summary route, for initiate_chat(s)'s summary_method.
+        """
+        from autogen import ConversableAgent
+
+        agent = recipient if recipient is not None else sender
+        prompt = summary_args.get("summary_prompt") or ConversableAgent.DEFAULT_SUMMARY_PROMPT
+        messages = recipient.chat_messages_for_summary(sender) + [{"role": summary_args.get("summary_role") or "system", "content": prompt}]
+        tier, reason = self.route(agent.name, messages, turn="summary")
+
+        def call(client):
+            response = client.create(messages=messages, cache=summary_args.get("cache"), agent=agent)
+            return client.extract_text_or_completion_object(response)[0]
+
+        try:
+            return _reply_text(self._complete(agent, "summary", tier, reason, call))
+        except Exception as e:
+            print(f"Could not summarize the chat: {str(e)}")
+            return ""
+
+    def _complete(self, agent, turn: str, tier: str, reason: str, call: Callable[[Any], Any]) -> Any:
+        client = self.client(agent, tier)
+        ordered = self.ordered_config_list(tier, self._agent_llm_config(agent).get("config_list"))
+        preferred = str(ordered[0].get("model", "")) if ordered else ""
+        with tracer.start_as_current_span("llm.route", attributes={"agent.name": agent.name, "route.turn": turn, "route.tier": tier, "route.reason": reason}):
+            before = _usage_by_model(client)
+            start = time.perf_counter()
+            try:
+                reply = call(client)
+            except Exception:
+                self._record(agent.name, turn, tier, reason, time.perf_counter() - start, None, preferred)
+                raise
+            latency = time.perf_counter() - start
+            after = _usage_by_model(client)
+        # Usage that moved during the call shows which model answered, approximate
+        # when the same agent and tier serve several chats at once
+        served = {model: {key: counts.get(key, 0) - before.get(model, {}).get(key, 0) for key in ("cost", "prompt_tokens", "completion_tokens")} for model, counts in after.items() if counts != before.get(model)}
+        self._record(agent.name, turn, tier, reason, latency, served, preferred)
+        return reply
+
+    def _record(self, agent_name: str, turn: str, tier: str, reason: str, latency: float, served: Optional[Dict[str, Dict[str, float]]], preferred: str) -> None:
+        with self._lock:
+            route = self._routes.setdefault(f"{agent_name}:{turn}", {"fast": 0, "strong": 0, "escalations": 0, "failovers": 0, "errors": 0})
+            route[tier] += 1
+            if reason != "route":
+                route["escalations"] += 1
+            if served is None:
+                route["errors"] += 1
+                return
+            if served and preferred not in served:
+                route["failovers"] += 1
+            for model, usage in served.items():
+                stats = self._models.setdefault(model, {"calls": 0, "cost": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "latencies": deque(maxlen=LATENCY_WINDOW)})
+                stats["calls"] += 1
+                stats["cost"] += usage["cost"]
+                stats["prompt_tokens"] += usage["prompt_tokens"]
+                stats["completion_tokens"] += usage["completion_tokens"]
+                stats["latencies"].append(latency)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        {"models": per model calls, cost, tokens and latency, "routes": per agent and turn tier counts}
+        """
+        with self._lock:
+            models = {}
+            for model, stats in self._models.items():
+                latencies = sorted(stats["latencies"])
+                models[model] = {
+                    "calls": stats["calls"],
+                    "cost": round(stats["cost"], 6),
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "completion_tokens": stats["completion_tokens"],
+                    "latency_p50": round(statistics.median(latencies), 3) if latencies else None,
+                    "latency_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3) if latencies else None,
+                }
+            return {"models": models, "routes": {name: dict(route) for name, route in self._routes.items()}}
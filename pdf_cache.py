@@ -0,0 +1,144 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Optional
+
+import diskcache
+
+from app_paths import data_path, install_secret, private_dir
+
+# Disk tier location, by default pdf_cache in the app's private data directory
+# (see app_paths). It holds the text of decrypted statements, so it is kept
+# readable by its owner only. Set PDF_CACHE_DIR to an empty string to keep the
+# cache in memory only.
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR")
+MEMORY_LIMIT_BYTES = 64 * 1024 * 1024
+DISK_LIMIT_BYTES = 1024 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def content_hash(pdf_file: BinaryIO) -> str:
+    """
+    Compute the SHA-256 of a binary buffer without loading it all at once.
+    The buffer is rewound to the start afterwards.
+    """
+    digest = hashlib.sha256()
+    pdf_file.seek(0)
+    for chunk in iter(lambda: pdf_file.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    pdf_file.seek(0)
+    return digest.hexdigest()
+
+def file_content_hash(file_path: str) -> str:
+    with open(file_path, "rb") as f:
+        return content_hash(f)
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    return len(json.dumps(entry, default=str))
+
+class PdfCache:
+    """
+    Two tier cache for PDF processing results, keyed on a content hash.
+
+    The memory tier is an LRU bounded by the approximate size of the stored
+    entries, the disk tier is a diskcache.Cache with its own size limit and
+    least-recently-used eviction. Entries are plain dicts, e.g. extracted page
+    text, page count, metadata and signature status. Without a `directory`
+    there is no disk tier, a directory that is given is made owner-only.
+    """
+
+    def __init__(self, directory: Optional[str] = None, memory_limit_bytes: int = MEMORY_LIMIT_BYTES, disk_limit_bytes: int = DISK_LIMIT_BYTES):
+        self.memory_limit_bytes = memory_limit_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._disk = None
+        if directory:
+            self._disk = diskcache.Cache(private_dir(directory), size_limit=disk_limit_bytes, eviction_policy="least-recently-used")
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return entry[0]
+
+        entry = self._disk.get(key) if self._disk is not None else None
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+            self._store_in_memory(key, entry)
+        return entry
+
+    def set(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._stats["sets"] += 1
+            self._store_in_memory(key, entry)
+        if self._disk is not None:
+            self._disk.set(key, entry)
+
+    def _store_in_memory(self, key: str, entry: Dict[str, Any]) -> None:
+        size = _entry_size(entry)
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[1]
+        if size > self.memory_limit_bytes:
+            # Too big for the memory tier, it only lives on disk
+            return
+        self._memory[key] = (entry, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_limit_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+        if self._disk is not None:
+            stats["disk_bytes"] = self._disk.volume()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+def get_pdf_cache() -> PdfCache:
+    """
+    Return the process wide PDF cache, creating it on first use.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PdfCache(data_path("pdf_cache") if PDF_CACHE_DIR is None else PDF_CACHE_DIR)
+        return _default_cache
+
+def text_cache_key(digest: str, password: Optional[str] = None) -> str:
+    # Text of an encrypted PDF is only served again to callers with the same
+    # password. The key holds an HMAC of it under the install secret, per document,
+    # so the cache doesn't give away a hash of the password to guess against.
+    if password is None:
+        return f"{digest}:text"
+    tag = hmac.new(install_secret(), digest.encode("ascii") + b"\0" + password.encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{digest}:text:{tag}"
+
+def integrity_cache_key(digest: str) -> str:
+    return f"{digest}:integrity"
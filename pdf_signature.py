@@ -0,0 +1,518 @@
+import base64
+import hashlib
+import mmap
+import os
+import re
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Annotated, Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from crypto_utils import RSA_ENCRYPTION_OID, der_children, der_elements, der_encode, der_oid, der_read
+from telemetry import annotate, traced_skill
+
+# PDF digital signature verification (ISO 32000 12.8, PKCS#7/CMS detached signatures).
+#
+# Signature dictionaries are found by their /ByteRange in a memory map of the
+# file. The signed bytes are everything but the /Contents hex string, which
+# holds the DER CMS SignedData. The byte ranges of every signature (and, for
+# callers that want them, whole-file hashes) are hashed together in a single
+# pass over the mapping, a chunk at a time, so a large statement is never
+# copied into memory.
+#
+# Certificates are parsed and their signatures checked with cryptography, the
+# CMS structure around them is read here.
+#
+# A signature is "valid" when its digest matches, the CMS signature verifies
+# with the signer's certificate and that certificate chains up to the trust
+# store through CA certificates (basicConstraints cA, keyCertSign when
+# keyUsage is present, within their pathLenConstraint), every certificate of
+# the chain being valid now; "untrusted" when only the chain is
+# missing or broken; "invalid", "unsupported" (algorithm) or "malformed"
+# otherwise.
+
+# A PEM/DER certificate file, or a directory of them, holding the trusted roots
+PDF_TRUST_STORE = os.getenv("PDF_TRUST_STORE", "")
+HASH_CHUNK_SIZE = 1024 * 1024
+# How far around /Contents the rest of the signature dictionary is looked for
+SIGNATURE_DICT_WINDOW = 2048
+MAX_CHAIN_LENGTH = 8
+
+SIGNED_DATA_OID = "1.2.840.113549.1.7.2"
+MESSAGE_DIGEST_OID = "1.2.840.113549.1.9.4"
+SIGNING_TIME_OID = "1.2.840.113549.1.9.5"
+EC_PUBLIC_KEY_OID = "1.2.840.10045.2.1"
+DIGEST_OIDS = {
+    "1.3.14.3.2.26": "sha1",
+    "2.16.840.1.101.3.4.2.1": "sha256",
+    "2.16.840.1.101.3.4.2.2": "sha384",
+    "2.16.840.1.101.3.4.2.3": "sha512",
+}
+# Signature algorithm -> hash, None when the hash comes from the digest algorithm
+RSA_SIGNATURE_OIDS = {
+    RSA_ENCRYPTION_OID: None,
+    "1.2.840.113549.1.1.5": "sha1",
+    "1.2.840.113549.1.1.11": "sha256",
+    "1.2.840.113549.1.1.12": "sha384",
+    "1.2.840.113549.1.1.13": "sha512",
+}
+ECDSA_SIGNATURE_OIDS = {
+    "1.2.840.10045.4.3.2": "sha256",
+    "1.2.840.10045.4.3.3": "sha384",
+    "1.2.840.10045.4.3.4": "sha512",
+}
+HASHES = {"sha1": hashes.SHA1, "sha256": hashes.SHA256, "sha384": hashes.SHA384, "sha512": hashes.SHA512}
+# Worst first, the document's status is its worst signature's
+STATUS_ORDER = ("invalid", "malformed", "unsupported", "untrusted", "valid")
+
+BYTE_RANGE = re.compile(rb"/ByteRange\s*\[\s*(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s*\]")
+SUB_FILTER = re.compile(rb"/SubFilter\s*/([A-Za-z0-9.#_-]+)")
+SIGNER_NAME = re.compile(rb"/Name\s*\(((?:[^()\\]|\\.)*)\)")
+SIGNING_TIME = re.compile(rb"/M\s*\(D:(\d{4,14})")
+PEM_CERTIFICATE = re.compile(r"-----BEGIN CERTIFICATE-----(.+?)-----END CERTIFICATE-----", re.S)
+
+_trust_store_cache = {}
+
+@contextmanager
+def map_pdf(pdf_file: Union[str, BinaryIO]) -> Iterator[Union[mmap.mmap, memoryview]]:
+    """
+    A read-only view of a PDF's bytes without reading them in: a memory map of
+    a path or file, or the buffer of an in-memory one. A spooled temporary file
+    that is still in memory is rolled over to disk to be mapped.
+    """
+    if isinstance(pdf_file, str):
+        with open(pdf_file, "rb") as f, _map_file(f) as data:
+            yield data
+        return
+    if hasattr(pdf_file, "getbuffer"):
+        view = pdf_file.getbuffer()
+        try:
+            yield view
+        finally:
+            view.release()
+        return
+    with _map_file(pdf_file) as data:
+        yield data
+
+@contextmanager
+def _map_file(f: BinaryIO) -> Iterator[Union[mmap.mmap, memoryview]]:
+    f.flush()
+    if os.fstat(f.fileno()).st_size == 0:
+        # An empty file can't be mapped
+        yield memoryview(b"")
+        return
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mmap, "MADV_SEQUENTIAL"):
+        # Read ahead, and let pages already hashed go first
+        data.madvise(mmap.MADV_SEQUENTIAL)
+    try:
+        yield data
+    finally:
+        data.close()
+
+def hash_ranges(data: Union[mmap.mmap, memoryview, bytes], ranges: Dict[Any, Tuple[str, List[Tuple[int, int]]]]) -> Dict[Any, bytes]:
+    """
+    Hash several sets of byte ranges of `data` in one pass.
+
+    Args:
+        data: The mapped file
+        ranges: {key: (hash name, [(start, end), ...])}, the ranges of a key in file order
+
+    Returns:
+        Dict[Any, bytes]: {key: digest}
+    """
+    hashers = {key: hashlib.new(name) for key, (name, _) in ranges.items()}
+    spans = [(start, end, key) for key, (_, key_ranges) in ranges.items() for start, end in key_ranges if start < end]
+    end_of_data = max((end for _, end, _ in spans), default=0)
+    view = memoryview(data)
+    try:
+        for offset in range(0, end_of_data, HASH_CHUNK_SIZE):
+            chunk_end = min(offset + HASH_CHUNK_SIZE, end_of_data)
+            for start, end, key in spans:
+                low, high = max(start, offset), min(end, chunk_end)
+                if low < high:
+                    hashers[key].update(view[low:high])
+    finally:
+        view.release()
+    return {key: hasher.digest() for key, hasher in hashers.items()}
+
+def _time(tag: int, content: bytes) -> datetime:
+    text = content.decode("ascii").rstrip("Z")
+    if tag == 0x17:
+        # UTCTime, two digit years 50-99 are 19xx
+        text = ("19" if int(text[:2]) >= 50 else "20") + text
+    return datetime.strptime(text[:14], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+
+def _extension(certificate: x509.Certificate, extension_type):
+    try:
+        return certificate.extensions.get_extension_for_class(extension_type).value
+    except x509.ExtensionNotFound:
+        return None
+
+def parse_certificate(der: bytes) -> Dict[str, Any]:
+    """
+    The parts of an X.509 certificate needed to verify signatures with it and
+    to build a chain. Names and keys are kept as their DER encoding.
+
+    Raises:
+        ValueError: The certificate or its extensions can't be parsed
+    """
+    try:
+        certificate = x509.load_der_x509_certificate(bytes(der))
+        basic_constraints = _extension(certificate, x509.BasicConstraints)
+        key_usage = _extension(certificate, x509.KeyUsage)
+        key_identifier = _extension(certificate, x509.SubjectKeyIdentifier)
+        public_key = certificate.public_key()
+    except UnsupportedAlgorithm as e:
+        raise ValueError(f"Unsupported certificate key: {str(e)}")
+    common_names = certificate.subject.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+    return {
+        "certificate": certificate,
+        "der": bytes(der),
+        "serial": certificate.serial_number,
+        "issuer": certificate.issuer.public_bytes(),
+        "subject": certificate.subject.public_bytes(),
+        "public_key": public_key.public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo),
+        "key_identifier": key_identifier.digest if key_identifier is not None else x509.SubjectKeyIdentifier.from_public_key(public_key).digest,
+        "not_before": certificate.not_valid_before_utc,
+        "not_after": certificate.not_valid_after_utc,
+        "ca": basic_constraints is not None and basic_constraints.ca,
+        "path_length": basic_constraints.path_length if basic_constraints is not None else None,
+        # None when the certificate has no keyUsage, which doesn't restrict it
+        "key_cert_sign": key_usage.key_cert_sign if key_usage is not None else None,
+        "common_name": str(common_names[0].value) if common_names else "",
+    }
+
+def verify_with_certificate(certificate: Dict[str, Any], algorithm: str, message: bytes, signature: bytes, digest_name: str = None, digest: bytes = None) -> Optional[bool]:
+    """
+    Check a signature with the certificate's public key. `digest` is the hash
+    of `message` when the caller already has it. None when the key type or
+    algorithm isn't supported.
+    """
+    key = certificate["certificate"].public_key()
+    if isinstance(key, rsa.RSAPublicKey) and algorithm in RSA_SIGNATURE_OIDS:
+        hash_name = RSA_SIGNATURE_OIDS[algorithm] or digest_name
+    elif isinstance(key, ec.EllipticCurvePublicKey) and (algorithm in ECDSA_SIGNATURE_OIDS or algorithm == EC_PUBLIC_KEY_OID):
+        hash_name = ECDSA_SIGNATURE_OIDS.get(algorithm) or digest_name
+    else:
+        return None
+    if hash_name not in HASHES:
+        return None
+    hash_algorithm = HASHES[hash_name]()
+    if digest is not None and hash_name == digest_name:
+        message, hash_algorithm = digest, Prehashed(hash_algorithm)
+    try:
+        if isinstance(key, rsa.RSAPublicKey):
+            key.verify(signature, message, padding.PKCS1v15(), hash_algorithm)
+        else:
+            key.verify(signature, message, ec.ECDSA(hash_algorithm))
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+def parse_signed_data(der: bytes) -> Dict[str, Any]:
+    """
+    The certificates and the first signer of a DER CMS ContentInfo holding
+    SignedData (RFC 5652).
+    """
+    _, content, _ = der_read(der)
+    content_type, signed_data = der_children(content)[:2]
+    if der_oid(content_type[1]) != SIGNED_DATA_OID:
+        raise ValueError("The signature isn't CMS SignedData")
+    _, signed_data, _ = der_read(signed_data[1])
+    fields = der_elements(signed_data)
+    certificates = []
+    signer_infos = None
+    for tag, value, _ in fields[3:]:
+        if tag == 0xA0:
+            certificates = [parse_certificate(raw) for child_tag, _, raw in der_elements(value) if child_tag == 0x30]
+        elif tag == 0x31:
+            signer_infos = der_children(value)
+    if not signer_infos:
+        raise ValueError("The signature has no signer")
+
+    signer = der_elements(signer_infos[0][1])
+    sid, digest_algorithm = signer[1], signer[2]
+    rest = signer[3:]
+    signed_attributes = None
+    if rest and rest[0][0] == 0xA0:
+        signed_attributes, rest = rest[0][1], rest[1:]
+    signature_algorithm, signature = rest[0], rest[1]
+
+    attributes = {}
+    for _, attribute in der_children(signed_attributes or b""):
+        oid, values = der_children(attribute)
+        attributes[der_oid(oid[1])] = der_children(values[1])[0]
+    return {
+        "certificates": certificates,
+        "sid": sid,
+        "digest_algorithm": DIGEST_OIDS.get(der_oid(der_children(digest_algorithm[1])[0][1])),
+        "signed_attributes": None if signed_attributes is None else der_encode(0x31, signed_attributes),
+        "message_digest": attributes[MESSAGE_DIGEST_OID][1] if MESSAGE_DIGEST_OID in attributes else None,
+        "signing_time": _time(*attributes[SIGNING_TIME_OID]) if SIGNING_TIME_OID in attributes else None,
+        "signature_algorithm": der_oid(der_children(signature_algorithm[1])[0][1]),
+        "signature": signature[1],
+    }
+
+def _signer_certificate(signed_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    tag, value, _ = signed_data["sid"]
+    if tag == 0x30:
+        issuer, serial = der_elements(value)[:2]
+        for certificate in signed_data["certificates"]:
+            if certificate["issuer"] == issuer[2] and certificate["serial"] == int.from_bytes(serial[1], "big"):
+                return certificate
+    elif tag == 0x80:
+        for certificate in signed_data["certificates"]:
+            if certificate["key_identifier"] == value:
+                return certificate
+    return None
+
+def _is_anchor(certificate: Dict[str, Any], anchors: List[Dict[str, Any]]) -> bool:
+    return any(certificate["subject"] == anchor["subject"] and certificate["public_key"] == anchor["public_key"] for anchor in anchors)
+
+def _valid_at(certificate: Dict[str, Any], at: datetime) -> bool:
+    return certificate["not_before"] <= at <= certificate["not_after"]
+
+def _issued_by(certificate: Dict[str, Any], issuer: Dict[str, Any], below: int) -> bool:
+    """
+    Whether `issuer` signed `certificate` and may issue certificates: a CA
+    with keyCertSign (when it has keyUsage) whose pathLenConstraint allows
+    the `below` CA certificates already between it and the signer.
+    """
+    if issuer is certificate or issuer["subject"] != certificate["issuer"]:
+        return False
+    if not issuer["ca"] or issuer["key_cert_sign"] is False:
+        return False
+    if issuer["path_length"] is not None and below > issuer["path_length"]:
+        return False
+    try:
+        certificate["certificate"].verify_directly_issued_by(issuer["certificate"])
+    except (InvalidSignature, TypeError, ValueError, UnsupportedAlgorithm):
+        return False
+    return True
+
+def _chain_to_trust_store(certificate: Dict[str, Any], intermediates: List[Dict[str, Any]], anchors: List[Dict[str, Any]], at: datetime) -> Tuple[bool, str]:
+    """
+    Walk from the signer's certificate up to a trust anchor, every
+    certificate on the way being valid at `at`.
+    """
+    for below in range(MAX_CHAIN_LENGTH):
+        if not _valid_at(certificate, at):
+            return False, f"certificate '{certificate['common_name']}' isn't valid on {at:%Y-%m-%d}"
+        if _is_anchor(certificate, anchors):
+            return True, ""
+        issuers = [candidate for candidate in anchors + intermediates if _issued_by(certificate, candidate, below)]
+        if not issuers:
+            if any(candidate["subject"] == certificate["issuer"] and candidate is not certificate for candidate in anchors + intermediates):
+                return False, f"the issuer of '{certificate['common_name']}' isn't a CA allowed to issue it"
+            if certificate["subject"] == certificate["issuer"]:
+                return False, f"self-signed certificate '{certificate['common_name']}' isn't in the trust store"
+            return False, f"no trusted issuer for '{certificate['common_name']}'"
+        # Of cross-signed or renewed issuers, one valid at the time
+        certificate = next((issuer for issuer in issuers if _valid_at(issuer, at)), issuers[0])
+    return False, "certificate chain is too long"
+
+def load_trust_store(source: str = None) -> List[Dict[str, Any]]:
+    """
+    Load the trusted certificates from PDF_TRUST_STORE (or `source`), a PEM
+    bundle or DER certificate, or a directory of them.
+    """
+    source = PDF_TRUST_STORE if source is None else source
+    if source not in _trust_store_cache:
+        paths = []
+        if source and os.path.isdir(source):
+            paths = [os.path.join(source, name) for name in sorted(os.listdir(source)) if os.path.isfile(os.path.join(source, name))]
+        elif source:
+            paths = [source]
+        certificates = []
+        for path in paths:
+            with open(path, "rb") as f:
+                data = f.read()
+            blocks = PEM_CERTIFICATE.findall(data.decode("latin-1"))
+            for der in [base64.b64decode("".join(block.split())) for block in blocks] or [data]:
+                try:
+                    certificates.append(parse_certificate(der))
+                except (ValueError, IndexError):
+                    print(f"Ignoring a certificate in {path} that could not be parsed")
+        _trust_store_cache[source] = certificates
+    return _trust_store_cache[source]
+
+def _dictionary_text(data, start: int, end: int) -> bytes:
+    # The signature dictionary around a /Contents string, bounded by its object
+    before = bytes(data[max(0, start - SIGNATURE_DICT_WINDOW):start])
+    after = bytes(data[end:end + SIGNATURE_DICT_WINDOW])
+    obj = before.rfind(b" obj")
+    endobj = after.find(b"endobj")
+    return before[obj + 1 if obj >= 0 else 0:] + after[:endobj if endobj >= 0 else len(after)]
+
+def _pdf_date(value: bytes) -> Optional[str]:
+    digits = value.decode("ascii")
+    try:
+        return datetime.strptime(digits.ljust(14, "0")[:14], "%Y%m%d%H%M%S").isoformat()
+    except ValueError:
+        return None
+
+def find_signatures(data) -> List[Dict[str, Any]]:
+    """
+    The signature dictionaries of a mapped PDF, in file order, with their
+    byte range, /SubFilter, /Name, /M and the DER bytes of /Contents.
+    """
+    size = len(data)
+    signatures = []
+    for match in BYTE_RANGE.finditer(data):
+        start1, length1, start2, length2 = (int(group) for group in match.groups())
+        signature = {"byte_range": [start1, length1, start2, length2], "status": "malformed", "reason": ""}
+        signatures.append(signature)
+        gap_start, gap_end = start1 + length1, start2
+        if start1 != 0 or gap_start >= gap_end or start2 + length2 > size:
+            signature["reason"] = "the byte range doesn't fit the file"
+            continue
+        # The only bytes left unsigned must be the /Contents hex string
+        if data[gap_start:gap_start + 1] != b"<" or data[gap_end - 1:gap_end] != b">":
+            signature["reason"] = "the byte range leaves more than the signature unsigned"
+            continue
+        dictionary = _dictionary_text(data, gap_start, gap_end)
+        sub_filter = SUB_FILTER.search(dictionary)
+        name = SIGNER_NAME.search(dictionary)
+        signing_time = SIGNING_TIME.search(dictionary)
+        signature.update({
+            "sub_filter": sub_filter.group(1).decode("latin-1") if sub_filter else None,
+            "name": name.group(1).decode("latin-1") if name else None,
+            "signing_time": _pdf_date(signing_time.group(1)) if signing_time else None,
+            "covers_whole_file": start2 + length2 == size,
+        })
+        hex_digits = re.sub(rb"\s", b"", bytes(data[gap_start + 1:gap_end - 1]))
+        try:
+            signature["contents"] = bytes.fromhex((hex_digits + b"0" * (len(hex_digits) % 2)).decode("ascii"))
+        except ValueError:
+            signature["reason"] = "/Contents isn't a hex string"
+            continue
+        signature["status"] = ""
+    return signatures
+
+def _verify_signature(signature: Dict[str, Any], digest: bytes, anchors: List[Dict[str, Any]]) -> None:
+    signed_data = signature["signed_data"]
+    certificate = _signer_certificate(signed_data)
+    if certificate is None:
+        signature.update(status="malformed", reason="the signer's certificate isn't in the signature")
+        return
+    signature["signer"] = certificate["common_name"]
+    if signed_data["signing_time"] is not None:
+        signature["signing_time"] = signed_data["signing_time"].replace(tzinfo=None).isoformat()
+
+    if signed_data["signed_attributes"] is not None:
+        if signed_data["message_digest"] != digest:
+            signature.update(status="invalid", reason="the document was changed after it was signed")
+            return
+        verified = verify_with_certificate(certificate, signed_data["signature_algorithm"], signed_data["signed_attributes"], signed_data["signature"], signed_data["digest_algorithm"])
+    else:
+        # Without signed attributes the signature is over the document digest itself
+        verified = verify_with_certificate(certificate, signed_data["signature_algorithm"], b"", signed_data["signature"], signed_data["digest_algorithm"], digest)
+    if verified is None:
+        signature.update(status="unsupported", reason=f"signature algorithm {signed_data['signature_algorithm']} isn't supported")
+        return
+    if not verified:
+        signature.update(status="invalid", reason="the signature doesn't match the signer's certificate")
+        return
+
+    # The chain is checked now. signingTime is chosen by the signer, so it
+    # can't vouch for a certificate that has since expired; only a trusted
+    # RFC 3161 timestamp could, and those aren't verified here.
+    trusted, reason = _chain_to_trust_store(certificate, signed_data["certificates"], anchors, datetime.now(timezone.utc))
+    signature.update(status="valid" if trusted else "untrusted", reason=reason)
+
+def check_signatures(data, trust_store: List[Dict[str, Any]] = None, file_hashes: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Verify every signature of a mapped PDF.
+
+    Args:
+        data: The mapped file, see map_pdf()
+        trust_store: Trusted certificates, load_trust_store() by default
+        file_hashes: Hash names whose whole-file digests to compute in the same pass, e.g. ("md5", "sha256")
+
+    Returns:
+        Dict[str, Any]: {"signed", "status", "signatures": per signature status and details, "hashes": {name: hex}}
+    """
+    anchors = load_trust_store() if trust_store is None else trust_store
+    signatures = find_signatures(data)
+    ranges = {name: (name, [(0, len(data))]) for name in file_hashes}
+    for index, signature in enumerate(signatures):
+        if signature["status"]:
+            continue
+        try:
+            signature["signed_data"] = parse_signed_data(signature["contents"])
+        except (ValueError, IndexError, KeyError) as e:
+            signature.update(status="malformed", reason=f"the signature couldn't be parsed: {str(e) or type(e).__name__}")
+            continue
+        digest_name = signature["signed_data"]["digest_algorithm"]
+        if digest_name is None:
+            signature.update(status="unsupported", reason="unsupported digest algorithm")
+            continue
+        start1, length1, start2, length2 = signature["byte_range"]
+        ranges[index] = (digest_name, [(start1, start1 + length1), (start2, start2 + length2)])
+
+    digests = hash_ranges(data, ranges)
+    for index, signature in enumerate(signatures):
+        if index in digests:
+            _verify_signature(signature, digests[index], anchors)
+        signature.pop("contents", None)
+        signature.pop("signed_data", None)
+
+    return {
+        "signed": bool(signatures),
+        "status": signature_status(signatures),
+        "signatures": signatures,
+        "hashes": {name: digests[name].hex() for name in file_hashes},
+    }
+
+def signature_status(signatures: List[Dict[str, Any]]) -> str:
+    """
+    The document's status: "unsigned", its worst signature's status, or
+    "modified" when every signature is valid but bytes were added after the
+    last one.
+    """
+    if not signatures:
+        return "unsigned"
+    status = min((signature["status"] for signature in signatures), key=STATUS_ORDER.index)
+    if status == "valid" and not any(signature.get("covers_whole_file") for signature in signatures):
+        return "modified"
+    return status
+
+def format_signatures(status: str, signatures: List[Dict[str, Any]]) -> str:
+    """
+    The signature check as text for the UI.
+    """
+    if status == "unsigned":
+        return "Signature: the PDF isn't digitally signed."
+    lines = [f"Signature: {status}" + (", the document was changed after the last signature" if status == "modified" else "")]
+    for signature in signatures:
+        signer = signature.get("signer") or signature.get("name") or "unknown signer"
+        when = f" on {signature['signing_time']}" if signature.get("signing_time") else ""
+        reason = f" ({signature['reason']})" if signature.get("reason") else ""
+        lines.append(f"- {signer}{when}: {signature['status']}{reason}")
+    return "\n".join(lines)
+
+@traced_skill("pdf.verify_signatures", lambda result: {"success": result["success"], "pdf.signature_status": result.get("status")})
+def verify_pdf_signatures(pdf_file: Annotated[str, "local pdf file path"]) -> Dict[str, Any]:
+    """
+    Verify the digital signatures of a local PDF against the trust store.
+
+    Args:
+        pdf_file (str): The PDF file path
+
+    Returns:
+        Dict[str, Any]: {"success", "signed", "status", "signatures"}, or {"success": False, "error"}
+    """
+    try:
+        with map_pdf(pdf_file) as data:
+            result = check_signatures(data)
+    except (OSError, ValueError) as e:
+        return {"success": False, "error": str(e)}
+    result.pop("hashes")
+    annotate({"pdf.signatures": len(result["signatures"])})
+    return {"success": True, **result}
@@ -0,0 +1,225 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from dkim_verify import verify_dkim_signature
+from email_digest import from_addresses
+from extract_pdf_skill import process_local_pdf, process_signed_pdf_from_url
+from field_extractor import extract_fields, field_values
+from pdf_signature import verify_pdf_signatures
+from telemetry import annotate, stage_duration, tracer
+from verify_tlsn_proof import verify_tlsn_proof
+from tlsn_proof import parse_proof_file, parse_proof_text
+
+# Seconds each verification stage may take before it is cancelled
+STAGE_TIMEOUTS = {
+    "email": 30,
+    "salary_slip": 120,
+    "tlsn": 60,
+}
+STAGE_WORKERS = 16
+
+# Sync stages run here rather than on asyncio's default executor, so a stage
+# that was abandoned after a timeout doesn't hold up asyncio.run() on exit
+_stage_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="verification-stage")
+
+def email_stage(inputs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Verify the applicant's email DKIM signature, from `raw_email` or `email_path`,
+    with the email's From addresses for the decision to match against the application.
+    """
+    raw_email = inputs.get("raw_email")
+    if raw_email is None and inputs.get("email_path"):
+        with open(inputs["email_path"], "rb") as f:
+            raw_email = f.read()
+    if raw_email is None:
+        return None
+    return {**verify_dkim_signature(raw_email), "from": from_addresses(raw_email)}
+
+def salary_slip_stage(inputs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Extract the salary slip text and its fields and check its signatures, from `pdf_url` or `pdf_path`.
+    """
+    password = inputs.get("pdf_password")
+    if inputs.get("pdf_path"):
+        text = process_local_pdf(inputs["pdf_path"], password)
+        signature_status = verify_pdf_signatures(inputs["pdf_path"]).get("status")
+    elif inputs.get("pdf_url"):
+        pdf = process_signed_pdf_from_url(inputs["pdf_url"], password)
+        text, signature_status = pdf.get("text"), pdf.get("signature_status")
+    else:
+        return None
+    if not text:
+        return {"success": False, "error": "Failed to extract text from the PDF"}
+    fields = extract_fields(text, inputs.get("bank"))
+    return {"success": True, "text_length": len(text), "text": text, "signature_status": signature_status, "document": fields["document"], "fields": field_values(fields), "low_confidence": fields["low_confidence"]}
+
+def tlsn_stage(inputs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Verify the TLSN proof, from `tlsn_proof` (JSON text) or `tlsn_proof_path`.
+    """
+    try:
+        if inputs.get("tlsn_proof") is not None:
+            proof = parse_proof_text(inputs["tlsn_proof"])
+        elif inputs.get("tlsn_proof_path"):
+            proof = parse_proof_file(inputs["tlsn_proof_path"])
+        else:
+            return None
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    return {**verify_tlsn_proof(proof), "digest": proof.digest}
+
+DEFAULT_STAGES = {
+    "email": email_stage,
+    "salary_slip": salary_slip_stage,
+    "tlsn": tlsn_stage,
+}
+
+class VerificationPipeline:
+    """
+    Run independent verification stages concurrently and join the results.
+
+    A stage takes the application inputs and returns a result dict with a
+    "success" key, or None when its input wasn't provided. Sync stages run on
+    worker threads, coroutine stages are awaited directly. Each stage has its
+    own timeout; with `fail_fast` the remaining stages are cancelled as soon
+    as a required stage fails. A cancelled thread is abandoned rather than
+    interrupted, its result is simply discarded. Sync stages share the module
+    executor unless the pipeline is given its own.
+    """
+
+    def __init__(self, stages: Dict[str, Callable[[Dict[str, Any]], Any]] = None, timeouts: Dict[str, float] = None, required: Iterable[str] = None, fail_fast: bool = False, executor: Executor = None):
+        self.stages = stages if stages is not None else dict(DEFAULT_STAGES)
+        self.timeouts = {**STAGE_TIMEOUTS, **(timeouts or {})}
+        self.required = set(required if required is not None else self.stages)
+        self.fail_fast = fail_fast
+        self.executor = executor or _stage_executor
+
+    async def _run_stage(self, name: str, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        stage = self.stages[name]
+        start = time.perf_counter()
+        with tracer.start_as_current_span("pipeline.stage", attributes={"stage": name}) as span:
+            try:
+                if inspect.iscoroutinefunction(stage):
+                    call: Awaitable = stage(inputs)
+                else:
+                    # Executor threads don't inherit contextvars, carry the span over so skill spans nest under it
+                    run = functools.partial(contextvars.copy_context().run, stage, inputs)
+                    call = asyncio.get_running_loop().run_in_executor(self.executor, run)
+                result = await asyncio.wait_for(call, timeout=self.timeouts.get(name))
+                if result is None:
+                    status = "skipped"
+                else:
+                    status = "passed" if result.get("success") else "failed"
+            except asyncio.TimeoutError:
+                result, status = {"success": False, "error": f"{name} timed out after {self.timeouts.get(name)}s"}, "timeout"
+            except asyncio.CancelledError:
+                result, status = {"success": False, "error": f"{name} was cancelled"}, "cancelled"
+            except Exception as e:
+                result, status = {"success": False, "error": str(e)}, "error"
+            duration = time.perf_counter() - start
+            annotate({"stage.status": status}, span)
+        stage_duration.record(duration, {"stage": name, "status": status})
+        return {"stage": name, "status": status, "duration": duration, "result": result}
+
+    async def run(self, inputs: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        Run every stage and return {stage name: outcome}.
+        """
+        tasks = {asyncio.ensure_future(self._run_stage(name, inputs)): name for name in self.stages}
+        outcomes = {}
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                outcome = task.result()
+                outcomes[outcome["stage"]] = outcome
+                if self.fail_fast and outcome["stage"] in self.required and outcome["status"] not in ("passed", "skipped"):
+                    for other in pending:
+                        other.cancel()
+        # Cancelled tasks still report an outcome
+        for task, name in tasks.items():
+            if name not in outcomes:
+                outcomes[name] = await task
+        return outcomes
+
+def make_decision(application: Dict[str, Any], outcomes: Dict[str, Dict[str, Any]], required: Iterable[str] = None) -> Dict[str, Any]:
+    """
+    Join the stage outcomes and the application record into a final decision.
+
+    Every required stage must pass, the salary slip's PDF signature must be
+    valid, and the details the proofs disclose must match what the applicant
+    told the front desk.
+    """
+    required = set(required if required is not None else outcomes)
+    reasons = []
+    for name in sorted(required):
+        outcome = outcomes.get(name)
+        if outcome is None or outcome["status"] == "skipped":
+            reasons.append(f"{name}: not provided")
+        elif outcome["status"] != "passed":
+            reasons.append(f"{name}: {outcome['result'].get('error', outcome['status'])}")
+
+    email = str(application.get("email", "")).lower()
+    email_result = outcomes.get("email", {}).get("result") or {}
+    if email_result.get("success"):
+        # DKIM signatures always cover From, the verified sender is its one address
+        senders = email_result.get("from") or []
+        sender_domain = senders[0].rpartition("@")[2] if len(senders) == 1 else ""
+        signing_domains = [str(signature.get("domain", "")).lower() for signature in email_result.get("signatures", []) if signature.get("signature_valid")]
+        if len(senders) != 1:
+            reasons.append(f"email: expected one From address, found {len(senders)}")
+        elif senders[0] != email:
+            reasons.append(f"email: sent from {senders[0]}, which doesn't match {email}")
+        elif not any(sender_domain == domain or sender_domain.endswith("." + domain) for domain in signing_domains):
+            reasons.append(f"email: signed by {email_result.get('domain')}, which doesn't match {senders[0]}")
+
+    salary_result = outcomes.get("salary_slip", {}).get("result") or {}
+    if salary_result.get("success") and salary_result.get("signature_status") != "valid":
+        # The text was extracted, but only a signed, unmodified and trusted slip counts
+        reasons.append(f"salary_slip: the PDF signature status is {salary_result.get('signature_status') or 'unknown'}, a valid signature is required")
+
+    tlsn_result = outcomes.get("tlsn", {}).get("result") or {}
+    if tlsn_result.get("success"):
+        disclosed_name = str(tlsn_result.get("name", "")).lower()
+        for part in (application.get("first_name"), application.get("last_name")):
+            if part and str(part).lower() not in disclosed_name:
+                reasons.append(f"tlsn: disclosed name '{tlsn_result.get('name')}' doesn't match the application")
+                break
+        country = str(application.get("country", "")).lower()
+        if country and tlsn_result.get("country", "Not found") != "Not found" and str(tlsn_result["country"]).lower() != country:
+            reasons.append(f"tlsn: disclosed country '{tlsn_result['country']}' doesn't match the application")
+
+    return {
+        "approved": not reasons,
+        "reasons": reasons,
+        "stages": {name: {"status": o["status"], "duration": round(o["duration"], 3)} for name, o in outcomes.items()},
+        "wall_clock": round(max((o["duration"] for o in outcomes.values()), default=0.0), 3),
+    }
+
+async def verify_application_async(application: Dict[str, Any], inputs: Dict[str, Any], pipeline: VerificationPipeline = None) -> Dict[str, Any]:
+    pipeline = pipeline or VerificationPipeline()
+    # The salary slip stage picks its extraction profile by the applicant's bank
+    inputs = {"bank": application.get("bank"), **inputs}
+    with tracer.start_as_current_span("pipeline.run", attributes={"pipeline.stages": len(pipeline.stages)}) as span:
+        outcomes = await pipeline.run(inputs)
+        decision = make_decision(application, outcomes, pipeline.required)
+        annotate({"decision.approved": decision["approved"], "decision.reasons": len(decision["reasons"])}, span)
+    return {"decision": decision, "outcomes": outcomes}
+
+def verify_application(application: Dict[str, Any], inputs: Dict[str, Any], pipeline: VerificationPipeline = None) -> Dict[str, Any]:
+    """
+    Run the verification pipeline for one application from sync code.
+
+    Args:
+        application (Dict[str, Any]): The application record (bank.json fields)
+        inputs (Dict[str, Any]): raw_email/email_path, pdf_url/pdf_path/pdf_password, tlsn_proof/tlsn_proof_path
+
+    Returns:
+        Dict[str, Any]: The decision and the per-stage outcomes
+    """
+    return asyncio.run(verify_application_async(application, inputs, pipeline))
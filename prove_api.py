@@ -0,0 +1,143 @@
+import asyncio
+import os
+import threading
+import time
+import httpx
+import http_client
+from telemetry import annotate, traced_skill
+from typing import Any, Dict, Optional
+
+# Base URL of the Prove Email key archive, point it at a local stand-in for testing
+PROVE_API_URL = os.getenv("PROVE_API_URL", "https://archive.prove.email/api/key")
+KEY_TTL_SECONDS = 6 * 60 * 60
+# Unknown domains are remembered for a shorter time so a newly archived key shows up soon
+NEGATIVE_TTL_SECONDS = 10 * 60
+REQUEST_TIMEOUT_SECONDS = 10
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+class _InFlightLookup:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class ProveKeyCache:
+    """
+    Domain to DKIM key cache in front of the Prove Email API.
+
+    Keys are kept for `ttl` seconds, domains the archive doesn't know are
+    cached as misses for `negative_ttl` seconds. All lookups go through the
+    shared keep-alive http_client and concurrent lookups for the same domain
+    are collapsed into a single request.
+    """
+
+    def __init__(self, api_url: str = PROVE_API_URL, ttl: float = KEY_TTL_SECONDS, negative_ttl: float = NEGATIVE_TTL_SECONDS, timeout: float = REQUEST_TIMEOUT_SECONDS):
+        self.api_url = api_url
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self._entries = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "requests": 0, "coalesced": 0, "errors": 0}
+
+    @traced_skill("prove.lookup", lambda keys: {"prove.found": keys is not None})
+    def lookup(self, domain: str) -> Optional[Any]:
+        """
+        Return the archived keys for a domain, or None if there are none.
+        """
+        domain = domain.strip().lower().rstrip(".")
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry is not None and entry[0] > time.monotonic():
+                outcome = "hit" if entry[1] is not None else "negative_hit"
+                self._stats[outcome + "s"] += 1
+                annotate({"prove.domain": domain, "prove.cache": outcome})
+                return entry[1]
+
+            in_flight = self._in_flight.get(domain)
+            if in_flight is not None:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                self._stats["misses"] += 1
+                in_flight = self._in_flight[domain] = _InFlightLookup()
+                leader = True
+        annotate({"prove.domain": domain, "prove.cache": "miss" if leader else "coalesced"})
+
+        if not leader:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.result
+
+        try:
+            in_flight.result = self._fetch(domain)
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[domain]
+            in_flight.done.set()
+        return in_flight.result
+
+    async def lookup_async(self, domain: str) -> Optional[Any]:
+        """
+        Awaitable lookup, runs on a worker thread so it shares the cache and
+        the single-flight bookkeeping with lookup().
+        """
+        return await asyncio.to_thread(self.lookup, domain)
+
+    def _fetch(self, domain: str) -> Optional[Any]:
+        with self._lock:
+            self._stats["requests"] += 1
+        try:
+            response = http_client.get(self.api_url, params={"domain": domain}, timeout=self.timeout)
+        except httpx.HTTPError:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+
+        annotate({"http.status_code": response.status_code})
+        if response.status_code == 200:
+            keys = response.json()
+            # An empty answer means the archive has no key for the domain
+            ttl = self.ttl if keys else self.negative_ttl
+            result = keys or None
+        elif response.status_code == 404:
+            ttl, result = self.negative_ttl, None
+        else:
+            # Upstream trouble, don't remember anything
+            with self._lock:
+                self._stats["errors"] += 1
+            return None
+
+        with self._lock:
+            self._entries[domain] = (time.monotonic() + ttl, result)
+        return result
+
+    def invalidate(self, domain: str = None) -> None:
+        with self._lock:
+            if domain is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(domain.strip().lower().rstrip("."), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        return stats
+
+def get_prove_key_cache() -> ProveKeyCache:
+    """
+    Return the process wide key cache, creating it on first use.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ProveKeyCache()
+        return _default_cache
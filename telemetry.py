@@ -0,0 +1,184 @@
+import functools
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from opentelemetry import metrics, trace
+
+# OpenTelemetry instrumentation for the skills, verification stages and agent
+# chats. The code only talks to the opentelemetry API, which is a no-op until
+# configure_telemetry() installs the SDK providers:
+#
+#   LUCID_TELEMETRY=none     nothing is exported (default)
+#   LUCID_TELEMETRY=console  spans and metrics are printed to stderr
+#   LUCID_TELEMETRY=file     spans and metrics are appended as JSON lines to LUCID_TELEMETRY_FILE
+#   LUCID_TELEMETRY=otlp     exported to an OTLP/HTTP collector (OTEL_EXPORTER_OTLP_ENDPOINT)
+#
+# Exporting needs opentelemetry-sdk, otlp also needs opentelemetry-exporter-otlp-proto-http.
+
+LUCID_TELEMETRY = os.getenv("LUCID_TELEMETRY", "none").lower()
+LUCID_TELEMETRY_FILE = os.getenv("LUCID_TELEMETRY_FILE", "telemetry.jsonl")
+METRICS_EXPORT_INTERVAL_MS = int(os.getenv("LUCID_METRICS_INTERVAL_MS", 10000))
+SERVICE_NAME = "lucid-loan-machine"
+
+tracer = trace.get_tracer("lucid")
+meter = metrics.get_meter("lucid")
+
+skill_duration = meter.create_histogram("lucid.skill.duration", unit="s", description="Duration of skill calls")
+stage_duration = meter.create_histogram("lucid.stage.duration", unit="s", description="Duration of verification pipeline stages")
+llm_duration = meter.create_histogram("lucid.llm.duration", unit="s", description="Duration of model completions")
+llm_tokens = meter.create_counter("lucid.llm.tokens", unit="{token}", description="Tokens used by model completions")
+llm_cost = meter.create_counter("lucid.llm.cost", unit="USD", description="Cost of model completions")
+
+_configured = False
+_autogen_instrumented = False
+_lock = threading.Lock()
+
+def _clean(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    # OpenTelemetry attributes must be str, bool, int, float or sequences of them
+    cleaned = {}
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        cleaned[key] = value if isinstance(value, (str, bool, int, float)) else str(value)
+    return cleaned
+
+@contextmanager
+def skill_span(name: str, **attributes) -> Iterator[trace.Span]:
+    """
+    Span around a skill call, its duration also goes into lucid.skill.duration.
+    Exceptions are recorded on the span and re-raised.
+    """
+    start = time.perf_counter()
+    status = "ok"
+    with tracer.start_as_current_span(name, attributes=_clean(attributes)) as span:
+        try:
+            yield span
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            skill_duration.record(time.perf_counter() - start, {"skill": name, "status": status})
+
+def traced_skill(name: str, result_attributes: Callable[[Any], Dict[str, Any]] = None):
+    """
+    Decorator form of skill_span(). `result_attributes` maps the return value
+    to extra span attributes, e.g. success and payload sizes.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with skill_span(name) as span:
+                result = func(*args, **kwargs)
+                if result_attributes is not None and span.is_recording():
+                    try:
+                        annotate(result_attributes(result), span)
+                    except Exception:
+                        pass
+                return result
+        return wrapper
+    return decorator
+
+def annotate(attributes: Dict[str, Any], span: Optional[trace.Span] = None) -> None:
+    """
+    Add attributes to a span, the current one by default.
+    """
+    span = span or trace.get_current_span()
+    if span.is_recording():
+        span.set_attributes(_clean(attributes))
+
+def traced_chat(sender, recipient, **kwargs):
+    """
+    sender.initiate_chat(recipient, **kwargs) inside an agent.chat span carrying
+    the number of turns and the cost of the conversation.
+    """
+    with tracer.start_as_current_span("agent.chat", attributes=_clean({"agent.sender": sender.name, "agent.recipient": recipient.name})) as span:
+        result = sender.initiate_chat(recipient, **kwargs)
+        annotate(chat_result_attributes(result), span)
+        return result
+
+def chat_result_attributes(result) -> Dict[str, Any]:
+    """
+    Span attributes for an autogen ChatResult: turns, summary size and cost.
+    """
+    attributes = {"chat.turns": len(getattr(result, "chat_history", None) or []), "chat.summary_chars": len(str(getattr(result, "summary", "") or ""))}
+    cost = getattr(result, "cost", None) or {}
+    usage = cost.get("usage_including_cached_inference") or {}
+    attributes["chat.cost"] = float(usage.get("total_cost", 0.0))
+    for model, model_usage in usage.items():
+        if isinstance(model_usage, dict):
+            attributes["chat.prompt_tokens"] = attributes.get("chat.prompt_tokens", 0) + model_usage.get("prompt_tokens", 0)
+            attributes["chat.completion_tokens"] = attributes.get("chat.completion_tokens", 0) + model_usage.get("completion_tokens", 0)
+    return attributes
+
+def _exporters(mode: str):
+    from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    if mode == "console":
+        return ConsoleSpanExporter(out=sys.stderr), ConsoleMetricExporter(out=sys.stderr)
+    if mode == "file":
+        out = open(LUCID_TELEMETRY_FILE, "a", encoding="utf-8")
+        return (
+            ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n"),
+            ConsoleMetricExporter(out=out, formatter=lambda data: data.to_json(indent=None) + "\n"),
+        )
+    if mode == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(), OTLPMetricExporter()
+    raise ValueError(f"Unknown LUCID_TELEMETRY exporter: {mode}")
+
+def configure_telemetry(mode: str = None) -> bool:
+    """
+    Install the OpenTelemetry SDK providers for the given exporter (LUCID_TELEMETRY by default).
+
+    Returns:
+        bool: Whether telemetry is being exported
+    """
+    global _configured
+    mode = (mode or LUCID_TELEMETRY).lower()
+    with _lock:
+        # Only an installed exporter is final, "none" or a missing SDK can be
+        # followed by a call that does export
+        if _configured:
+            return True
+        if mode in ("", "none", "off"):
+            return False
+        try:
+            from opentelemetry.sdk.metrics import MeterProvider
+            from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            span_exporter, metric_exporter = _exporters(mode)
+        except ImportError as e:
+            print(f"Telemetry is disabled, {mode} export needs the OpenTelemetry SDK: {str(e)}")
+            return False
+
+        resource = Resource.create({"service.name": SERVICE_NAME})
+        tracer_provider = TracerProvider(resource=resource)
+        tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+        trace.set_tracer_provider(tracer_provider)
+        reader = PeriodicExportingMetricReader(metric_exporter, export_interval_millis=METRICS_EXPORT_INTERVAL_MS)
+        metrics.set_meter_provider(MeterProvider(resource=resource, metric_readers=[reader]))
+        _configured = True
+    return True
+
+def instrument_autogen() -> None:
+    """
+    Record every model completion and tool call as a span, through autogen's
+    runtime logging hooks. A no-op unless telemetry has been configured.
+    """
+    global _autogen_instrumented
+    with _lock:
+        if not _configured or _autogen_instrumented:
+            return
+        _autogen_instrumented = True
+    from autogen import runtime_logging
+    from autogen_telemetry import OpenTelemetryLogger, instrument_tool_execution
+    runtime_logging.start(logger=OpenTelemetryLogger())
+    instrument_tool_execution()
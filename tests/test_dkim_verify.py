@@ -0,0 +1,97 @@
+import hashlib
+
+import pytest
+
+from benchmarks import fixtures
+from crypto_utils import DIGEST_INFO_PREFIXES, load_rsa_public_key_b64, rsa_pkcs1v15_verify
+from dkim_verify import verify_dkim_signature
+
+DOMAIN = "bank.example.com"
+SELECTOR = "s1"
+
+@pytest.fixture(scope="module")
+def rsa_key():
+    return fixtures.generate_rsa_key(2048)
+
+def _email() -> bytes:
+    return fixtures.make_email(f"jane@{DOMAIN}", "loans@lucid.example", "Your monthly statement", body_lines=20)
+
+def _verify(raw_email: bytes, key) -> dict:
+    record = fixtures.dkim_key_record(key[0], key[1])
+    return verify_dkim_signature(raw_email, resolver=lambda domain, selector: record if (domain, selector) == (DOMAIN, SELECTOR) else None)
+
+def test_valid_signature(rsa_key):
+    result = _verify(fixtures.dkim_sign(_email(), rsa_key, DOMAIN, SELECTOR), rsa_key)
+    assert result["success"]
+    assert result["domain"] == DOMAIN
+    assert result["signatures"][0]["body_hash_valid"]
+
+@pytest.mark.parametrize("canonicalization", ["simple/simple", "relaxed/relaxed"])
+def test_tampered_body_fails(rsa_key, canonicalization):
+    signed = fixtures.dkim_sign(_email(), rsa_key, DOMAIN, SELECTOR, canonicalization=canonicalization)
+    result = _verify(signed.replace(b"EUR 12.50", b"EUR 99.50"), rsa_key)
+    assert not result["success"]
+    assert not result["signatures"][0]["body_hash_valid"]
+
+def test_tampered_header_fails(rsa_key):
+    signed = fixtures.dkim_sign(_email(), rsa_key, DOMAIN, SELECTOR)
+    result = _verify(signed.replace(b"Subject: Your monthly statement", b"Subject: Your yearly statement"), rsa_key)
+    assert not result["success"]
+    assert result["signatures"][0]["body_hash_valid"]
+    assert result["error"] == "RSA signature verification failed"
+
+def test_relaxed_header_whitespace_still_verifies(rsa_key):
+    signed = fixtures.dkim_sign(_email(), rsa_key, DOMAIN, SELECTOR, canonicalization="relaxed/relaxed")
+    assert _verify(signed.replace(b"Subject: Your monthly", b"Subject:   Your  monthly"), rsa_key)["success"]
+
+def test_wrong_key_fails(rsa_key):
+    other_key = fixtures.generate_rsa_key(1024)
+    signed = fixtures.dkim_sign(_email(), rsa_key, DOMAIN, SELECTOR)
+    assert not _verify(signed, other_key)["success"]
+
+def test_body_length_covers_only_the_signed_prefix(rsa_key):
+    email = _email()
+    # relaxed body canonicalization keeps these first lines as they are
+    body_length = len(b"Transaction 0: EUR 0.00 to merchant 0\r\n")
+    signed = fixtures.dkim_sign(email, rsa_key, DOMAIN, SELECTOR, body_length=body_length)
+    assert b" l=%d;" % body_length in signed
+    assert _verify(signed, rsa_key)["success"]
+    # Bytes after l= aren't signed, changing them leaves the signature valid
+    assert _verify(signed.replace(b"Transaction 5:", b"Transaction X:"), rsa_key)["success"]
+    # but the signed prefix is still protected
+    assert not _verify(signed.replace(b"Transaction 0:", b"Transaction X:"), rsa_key)["success"]
+
+def test_short_rsa_key_is_rejected():
+    short_key = fixtures.generate_rsa_key(768)
+    result = _verify(fixtures.dkim_sign(_email(), short_key, DOMAIN, SELECTOR), short_key)
+    assert not result["success"]
+    assert not result["signatures"][0]["signature_valid"]
+    assert "768 bits" in result["error"]
+
+@pytest.mark.parametrize("bits, valid", [(768, False), (1024, True)])
+def test_rsa_verify_enforces_the_minimum_key_size(bits, valid):
+    n, e, d = fixtures.generate_rsa_key(bits)
+    digest = hashlib.sha256(b"message").digest()
+    encoded = DIGEST_INFO_PREFIXES["sha256"] + digest
+    k = (n.bit_length() + 7) // 8
+    padded = b"\x00\x01" + b"\xff" * (k - len(encoded) - 3) + b"\x00" + encoded
+    signature = pow(int.from_bytes(padded, "big"), d, n).to_bytes(k, "big")
+    public_key = load_rsa_public_key_b64(fixtures.dkim_key_record(n, e).split("p=", 1)[1])
+    assert rsa_pkcs1v15_verify(public_key, signature, digest, "sha256") is valid
+
+def test_from_not_in_signed_headers_fails(rsa_key):
+    signed = fixtures.dkim_sign(_email(), rsa_key, DOMAIN, SELECTOR, signed_headers=("to", "subject", "date", "message-id"))
+    result = _verify(signed, rsa_key)
+    assert not result["success"]
+    assert result["error"] == "DKIM-Signature does not cover the From header"
+
+def test_missing_key_fails(rsa_key):
+    signed = fixtures.dkim_sign(_email(), rsa_key, "other.example.com", SELECTOR)
+    result = _verify(signed, rsa_key)
+    assert not result["success"]
+    assert result["error"].startswith("No DKIM key found")
+
+def test_unsigned_email_fails(rsa_key):
+    result = _verify(_email(), rsa_key)
+    assert not result["success"]
+    assert result["error"] == "The email has no DKIM-Signature header"
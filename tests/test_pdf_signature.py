@@ -0,0 +1,113 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.hazmat.primitives.serialization import Encoding
+
+from benchmarks import fixtures
+from pdf_signature import check_signatures, parse_certificate
+from pipeline import make_decision
+
+BYTE_RANGE = re.compile(rb"/ByteRange \[0 (\d{10}) (\d{10}) (\d{10})\]")
+
+def _key():
+    return ec.generate_private_key(ec.SECP256R1())
+
+@pytest.fixture(scope="module")
+def ca():
+    root_key, intermediate_key = _key(), _key()
+    root = fixtures.make_certificate("Root", root_key, "Root", root_key, ca=True)
+    intermediate = fixtures.make_certificate("Intermediate", intermediate_key, "Root", root_key, ca=True)
+    return {"root_key": root_key, "root": root, "intermediate_key": intermediate_key, "intermediate": intermediate,
+            "anchors": [parse_certificate(root.public_bytes(Encoding.DER))]}
+
+@pytest.fixture(scope="module")
+def statement():
+    return fixtures.make_pdf(["Salary slip", "Net pay EUR 3,100.00"])
+
+def _signed(statement, ca, signer_key=None, **certificate_args):
+    signer_key = signer_key or _key()
+    leaf = fixtures.make_certificate("Bank", signer_key, "Intermediate", ca["intermediate_key"], **certificate_args)
+    return fixtures.sign_pdf(statement, signer_key, [leaf, ca["intermediate"]])
+
+def _status(pdf, anchors):
+    result = check_signatures(pdf, anchors)
+    return result["status"], result["signatures"][0]["reason"] if result["signatures"] else ""
+
+def _with_byte_range(pdf: bytes, change) -> bytes:
+    match = BYTE_RANGE.search(pdf)
+    numbers = change(*(int(group) for group in match.groups()))
+    return pdf[:match.start()] + b"/ByteRange [0 %010d %010d %010d]" % numbers + pdf[match.end():]
+
+def test_valid_signature(statement, ca):
+    result = check_signatures(_signed(statement, ca), ca["anchors"])
+    assert result["status"] == "valid"
+    assert result["signatures"][0]["signer"] == "Bank"
+    assert result["signatures"][0]["covers_whole_file"]
+
+def test_rsa_signer_is_valid(statement, ca):
+    assert _status(_signed(statement, ca, rsa.generate_private_key(public_exponent=65537, key_size=2048)), ca["anchors"])[0] == "valid"
+
+def test_unsigned_pdf(statement, ca):
+    assert check_signatures(statement, ca["anchors"])["status"] == "unsigned"
+
+def test_changed_content_is_invalid(statement, ca):
+    pdf = _signed(statement, ca).replace(b"3,100.00", b"9,100.00")
+    assert _status(pdf, ca["anchors"]) == ("invalid", "the document was changed after it was signed")
+
+def test_byte_range_that_leaves_content_unsigned_is_malformed(statement, ca):
+    # Move the end of the first range back, so the bytes before /Contents are outside the signature
+    pdf = _with_byte_range(_signed(statement, ca), lambda length1, start2, length2: (length1 - 10, start2, length2))
+    assert _status(pdf, ca["anchors"]) == ("malformed", "the byte range leaves more than the signature unsigned")
+
+def test_byte_range_past_the_end_is_malformed(statement, ca):
+    pdf = _with_byte_range(_signed(statement, ca), lambda length1, start2, length2: (length1, start2, length2 + 100))
+    assert _status(pdf, ca["anchors"]) == ("malformed", "the byte range doesn't fit the file")
+
+def test_appended_bytes_are_reported_as_modified(statement, ca):
+    pdf = _signed(statement, ca) + b"1 0 obj\n<< /Type /Catalog >>\nendobj\n"
+    result = check_signatures(pdf, ca["anchors"])
+    assert result["signatures"][0]["status"] == "valid"
+    assert result["status"] == "modified"
+
+def test_unknown_root_is_untrusted(statement, ca):
+    other_key = _key()
+    other_root = fixtures.make_certificate("Root", other_key, "Root", other_key, ca=True)
+    status, _ = _status(_signed(statement, ca), [parse_certificate(other_root.public_bytes(Encoding.DER))])
+    assert status == "untrusted"
+
+def test_empty_trust_store_is_untrusted(statement, ca):
+    assert _status(_signed(statement, ca), [])[0] == "untrusted"
+
+def test_expired_certificate_is_untrusted(statement, ca):
+    now = datetime.now(timezone.utc)
+    status, reason = _status(_signed(statement, ca, not_before=now - timedelta(days=30), not_after=now - timedelta(days=1)), ca["anchors"])
+    assert status == "untrusted"
+    assert "isn't valid" in reason
+
+def test_not_yet_valid_certificate_is_untrusted(statement, ca):
+    now = datetime.now(timezone.utc)
+    assert _status(_signed(statement, ca, not_before=now + timedelta(days=1)), ca["anchors"])[0] == "untrusted"
+
+def test_expired_intermediate_is_untrusted(statement, ca):
+    now = datetime.now(timezone.utc)
+    expired = fixtures.make_certificate("Intermediate", ca["intermediate_key"], "Root", ca["root_key"], ca=True,
+                                        not_before=now - timedelta(days=30), not_after=now - timedelta(days=1))
+    signer_key = _key()
+    leaf = fixtures.make_certificate("Bank", signer_key, "Intermediate", ca["intermediate_key"])
+    assert _status(fixtures.sign_pdf(statement, signer_key, [leaf, expired]), ca["anchors"])[0] == "untrusted"
+
+def test_certificate_issued_by_an_end_entity_is_untrusted(statement, ca):
+    # A leaf of the trusted CA may not issue certificates of its own
+    end_entity_key, signer_key = _key(), _key()
+    end_entity = fixtures.make_certificate("Shop", end_entity_key, "Intermediate", ca["intermediate_key"])
+    forged = fixtures.make_certificate("Bank", signer_key, "Shop", end_entity_key)
+    status, reason = _status(fixtures.sign_pdf(statement, signer_key, [forged, end_entity, ca["intermediate"]]), ca["anchors"])
+    assert status == "untrusted"
+    assert "isn't a CA" in reason
+
+@pytest.mark.parametrize("signature_status, approved", [("valid", True), ("unsigned", False), ("modified", False), ("untrusted", False), ("invalid", False)])
+def test_decision_requires_a_valid_salary_slip_signature(signature_status, approved):
+    outcomes = {"salary_slip": {"status": "passed", "duration": 0.1, "result": {"success": True, "signature_status": signature_status}}}
+    assert make_decision({"email": "jane@bank.example.com"}, outcomes)["approved"] is approved
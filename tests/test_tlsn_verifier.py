@@ -0,0 +1,114 @@
+import copy
+import json
+
+import pytest
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+from benchmarks import fixtures
+from tlsn_proof import parse_proof_text
+from tlsn_verifier import canonical_json, is_local_proof, merkle_root, parse_notary_keys, verify_proof_locally
+
+@pytest.fixture(scope="module")
+def notary_key():
+    return fixtures.generate_notary_key()
+
+@pytest.fixture
+def proof(notary_key):
+    sent, received = fixtures.make_http_transcript("Jane Doe", "NL", "NL00BANK0123456789")
+    return fixtures.create_synthetic_proof(notary_key, "bank.example.com", sent, received)
+
+def _verify(proof, notary_key):
+    return verify_proof_locally(proof, [notary_key.public_key()])
+
+def test_valid_proof(proof, notary_key):
+    result = _verify(proof, notary_key)
+    assert result["success"]
+    assert result["verified_by"] == "local"
+    assert result["name"] == "Jane Doe"
+    assert result["country"] == "NL"
+
+def test_notary_keys_in_every_encoding(proof, notary_key):
+    public_key = notary_key.public_key()
+    text = "\n".join([
+        public_key.public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo).decode("ascii"),
+        public_key.public_bytes(Encoding.X962, PublicFormat.CompressedPoint).hex(),
+        fixtures.notary_key_hex(notary_key),
+    ])
+    keys = parse_notary_keys(text)
+    assert len(keys) == 3
+    assert all(verify_proof_locally(proof, [key])["success"] for key in keys)
+
+def test_key_off_the_curve_is_rejected():
+    with pytest.raises(ValueError):
+        parse_notary_keys("04" + "01" * 64)
+
+def test_untrusted_notary_key(proof):
+    other = fixtures.generate_notary_key()
+    assert _verify(proof, other)["error"] == "The proof was notarized by an untrusted notary"
+
+def test_signature_from_an_untrusted_key_without_a_claimed_key(proof):
+    other = fixtures.generate_notary_key()
+    del proof["notary_key"]
+    assert _verify(proof, other)["error"] == "Invalid notary signature"
+
+def test_claimed_key_must_have_signed(proof, notary_key):
+    # The proof names the trusted notary but was signed by another key
+    other = fixtures.generate_notary_key()
+    proof["session"]["signature"] = fixtures.p256_sign(other, canonical_json(proof["session"]["header"])).hex()
+    assert _verify(proof, notary_key)["error"] == "Invalid notary signature"
+
+def test_tampered_header(proof, notary_key):
+    proof["session"]["header"]["server_name"] = "evil.example.com"
+    assert _verify(proof, notary_key)["error"] == "Invalid notary signature"
+
+def test_tampered_commitment_breaks_the_root(proof, notary_key):
+    commitments = proof["substrings"]["commitments"]
+    commitments[0] = "00" * 32
+    assert _verify(proof, notary_key)["error"] == "Commitments do not match the signed commitment root"
+
+def test_dropped_commitment_breaks_the_root(proof, notary_key):
+    proof["substrings"]["commitments"].pop()
+    assert _verify(proof, notary_key)["error"] == "Commitments do not match the signed commitment root"
+
+def test_opening_with_changed_data(proof, notary_key):
+    opening = proof["substrings"]["openings"][-1]
+    opening["data"] = opening["data"].replace("Jane Doe", "John Roe")
+    assert "does not match its commitment" in _verify(proof, notary_key)["error"]
+
+def test_opening_pointing_at_another_commitment(proof, notary_key):
+    openings = proof["substrings"]["openings"]
+    openings[0]["index"], openings[1]["index"] = openings[1]["index"], openings[0]["index"]
+    assert "does not match its commitment" in _verify(proof, notary_key)["error"]
+
+def test_opening_outside_the_transcript(proof, notary_key):
+    opening = proof["substrings"]["openings"][-1]
+    opening["end"] += 10
+    assert "is outside the received transcript" in _verify(proof, notary_key)["error"]
+
+def test_merkle_root_depends_on_leaf_order():
+    leaves = [bytes([i]) * 32 for i in range(5)]
+    assert merkle_root(leaves) != merkle_root(leaves[::-1])
+    assert merkle_root(leaves) != merkle_root(leaves[:4])
+
+def test_only_the_local_layout_is_verified_locally(proof):
+    assert is_local_proof(proof)
+    tlsnotary = copy.deepcopy(proof)
+    tlsnotary["session"]["signature"] = {"P256": [1, 2, 3]}
+    assert not is_local_proof(tlsnotary)
+    assert not is_local_proof({"version": "0.1"})
+    assert not is_local_proof([proof])
+
+def test_parsed_proof_digest_ignores_formatting(proof):
+    compact = parse_proof_text(json.dumps(proof, separators=(",", ":")))
+    indented = parse_proof_text(json.dumps(proof, indent=2))
+    assert compact.digest == indented.digest
+    assert compact.summary()["format"] == "local"
+
+@pytest.mark.parametrize("text", ["not json", "[1, 2]"])
+def test_parse_proof_text_rejects_non_objects(text):
+    with pytest.raises(ValueError):
+        parse_proof_text(text)
+
+def test_parse_proof_text_enforces_the_size_limit(proof):
+    with pytest.raises(ValueError):
+        parse_proof_text(json.dumps(proof), max_bytes=100)
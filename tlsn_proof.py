@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+from typing import Any, BinaryIO, Dict, Optional, Union
+
+from tlsn_verifier import is_local_proof
+
+# A TLSN proof decoded once. Proofs carrying full transcripts run to several
+# MB, so the upload handlers parse a proof into a ParsedProof and hand that
+# same object to save_tlsn_proof, verify_tlsn_proof and the UI instead of
+# passing the JSON text along to be decoded again at every step.
+#
+# Files at least TLSN_STREAM_THRESHOLD bytes are parsed incrementally with
+# ijson when it is installed (pip install ijson), so the text is never held in
+# memory and the limits are enforced while reading. Without it they are read
+# and decoded in one go, after the size check.
+
+MAX_PROOF_BYTES = int(os.getenv("TLSN_MAX_PROOF_BYTES", 16 * 1024 * 1024))
+MAX_PROOF_COMMITMENTS = int(os.getenv("TLSN_MAX_PROOF_COMMITMENTS", 65536))
+MAX_PROOF_OPENINGS = int(os.getenv("TLSN_MAX_PROOF_OPENINGS", 65536))
+TLSN_STREAM_THRESHOLD = int(os.getenv("TLSN_STREAM_THRESHOLD", 1024 * 1024))
+READ_CHUNK_SIZE = 64 * 1024
+
+class ParsedProof:
+    """
+    The decoded proof (`data`) with the size of its JSON encoding. The text
+    is kept when the proof came in as text, so saving it doesn't encode it
+    again. `digest` is the SHA-256 of the canonical JSON (sorted keys, no
+    whitespace), the same for any formatting of the same proof.
+    """
+
+    __slots__ = ("data", "size", "_text", "_digest")
+
+    def __init__(self, data: Dict[str, Any], size: int, text: Optional[str] = None):
+        self.data = data
+        self.size = size
+        self._text = text
+        self._digest = None
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            # Encoded in pieces, a multi-MB proof isn't copied into one string to be hashed
+            sha256 = hashlib.sha256()
+            for chunk in json.JSONEncoder(sort_keys=True, separators=(",", ":"), ensure_ascii=False).iterencode(self.data):
+                sha256.update(chunk.encode("utf-8"))
+            self._digest = sha256.hexdigest()
+        return self._digest
+
+    def to_json(self) -> str:
+        """
+        The proof as JSON text, the original text when there is one.
+        """
+        if self._text is not None:
+            return self._text
+        return json.dumps(self.data, separators=(",", ":"), ensure_ascii=False)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        What the proof claims, without its transcript data, for display and for the agents.
+        """
+        summary = {"digest": self.digest, "bytes": self.size, "format": "local" if is_local_proof(self.data) else "explorer"}
+        if summary["format"] == "local":
+            header = self.data["session"]["header"]
+            openings = self.data["substrings"].get("openings") or []
+            summary.update({
+                "server_name": header.get("server_name"),
+                "time": header.get("time"),
+                "commitments": len(self.data["substrings"].get("commitments") or []),
+                "openings": len(openings),
+                "disclosed_bytes": sum(len(str(opening.get("data", ""))) for opening in openings if isinstance(opening, dict)),
+            })
+        return summary
+
+def _check_limits(data: Any) -> None:
+    if not isinstance(data, dict):
+        raise ValueError("A TLSN proof must be a JSON object")
+    substrings = data.get("substrings")
+    if isinstance(substrings, dict):
+        if len(substrings.get("commitments") or []) > MAX_PROOF_COMMITMENTS:
+            raise ValueError(f"The proof has more than {MAX_PROOF_COMMITMENTS} commitments")
+        if len(substrings.get("openings") or []) > MAX_PROOF_OPENINGS:
+            raise ValueError(f"The proof has more than {MAX_PROOF_OPENINGS} openings")
+
+def parse_proof_text(text: str, max_bytes: int = MAX_PROOF_BYTES) -> ParsedProof:
+    """
+    Decode a proof pasted or passed as text.
+
+    Raises:
+        ValueError: The proof is too large, isn't valid JSON or is over a limit
+    """
+    # A character is at least one byte, so this never lets an oversized proof through
+    if len(text) > max_bytes:
+        raise ValueError(f"The proof is larger than the limit of {max_bytes} bytes")
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        raise ValueError("Invalid JSON format")
+    _check_limits(data)
+    return ParsedProof(data, len(text), text)
+
+def parse_proof_file(path: str, max_bytes: int = MAX_PROOF_BYTES) -> ParsedProof:
+    """
+    Decode a proof file, streaming large ones when ijson is available.
+
+    Raises:
+        ValueError: The proof is too large, isn't valid JSON or is over a limit
+    """
+    size = os.path.getsize(path)
+    if size > max_bytes:
+        raise ValueError(f"The proof is larger than the limit of {max_bytes} bytes")
+    with open(path, "rb") as f:
+        if size >= TLSN_STREAM_THRESHOLD:
+            try:
+                import ijson
+            except ImportError:
+                ijson = None
+            if ijson is not None:
+                return ParsedProof(_stream_parse(ijson, f, max_bytes), size)
+        try:
+            data = json.loads(f.read())
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ValueError("Invalid JSON format")
+    _check_limits(data)
+    return ParsedProof(data, size)
+
+class _LimitedReader:
+    # Stops a file that grows while it is read at max_bytes
+    def __init__(self, f: BinaryIO, max_bytes: int):
+        self.f = f
+        self.remaining = max_bytes
+
+    def read(self, size: int = READ_CHUNK_SIZE) -> bytes:
+        chunk = self.f.read(size)
+        self.remaining -= len(chunk)
+        if self.remaining < 0:
+            raise ValueError("The proof is larger than the limit")
+        return chunk
+
+def _stream_parse(ijson, f: BinaryIO, max_bytes: int) -> Dict[str, Any]:
+    # Build the object from parse events, counting commitments and openings as they arrive
+    builder = ijson.ObjectBuilder()
+    counts = {"substrings.commitments.item": 0, "substrings.openings.item": 0}
+    limits = {"substrings.commitments.item": MAX_PROOF_COMMITMENTS, "substrings.openings.item": MAX_PROOF_OPENINGS}
+    try:
+        for prefix, event, value in ijson.parse(_LimitedReader(f, max_bytes), buf_size=READ_CHUNK_SIZE, use_float=True):
+            if prefix in counts and event in ("start_map", "string"):
+                counts[prefix] += 1
+                if counts[prefix] > limits[prefix]:
+                    raise ValueError(f"The proof has more than {limits[prefix]} {prefix.split('.')[1]}")
+            builder.event(event, value)
+    except ijson.JSONError:
+        raise ValueError("Invalid JSON format")
+    if not hasattr(builder, "value"):
+        raise ValueError("Invalid JSON format")
+    _check_limits(builder.value)
+    return builder.value
+
+def as_proof(proof: Union[str, ParsedProof]) -> ParsedProof:
+    """
+    The ParsedProof for a proof given either way, text is decoded here.
+    """
+    return proof if isinstance(proof, ParsedProof) else parse_proof_text(proof)
@@ -0,0 +1,276 @@
+import base64
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat, load_der_public_key
+
+# In-process verification of TLSN proofs against a set of trusted notaries.
+#
+# This is NOT the TLSNotary proof format: it is a simplified layout of this
+# project's own (a canonical JSON header signed with a hex ECDSA signature and
+# a plain SHA-256 Merkle tree over salted commitment leaves). Anything that
+# doesn't match it exactly, including real TLSNotary presentations whose
+# signature is e.g. {"P256": [...]}, is left to the explorer.
+#
+# Proof layout:
+# {
+#   "version": "0.1",
+#   "notary_key": "<hex SEC1 P-256 key, optional>",
+#   "session": {
+#     "header": {"server_name": str, "time": int, "sent_len": int, "recv_len": int, "commitment_root": "<hex>"},
+#     "signature": "<hex ECDSA P-256 signature over the canonical header JSON>"
+#   },
+#   "substrings": {
+#     "commitments": ["<hex leaf>", ...],
+#     "openings": [{"index": int, "direction": "sent" | "received", "start": int, "end": int, "data": str, "salt": "<hex>"}]
+#   }
+# }
+#
+# The notary signs the header, whose commitment_root is the Merkle root of
+# every transcript commitment. Each opening discloses one committed range of
+# the sent or received transcript.
+
+# Comma separated hex keys, or a path to a file with one hex or PEM key per entry
+TLSN_TRUSTED_NOTARY_KEYS = os.getenv("TLSN_TRUSTED_NOTARY_KEYS", "")
+
+NAME_KEYS = ("name", "full_name", "fullName", "account_holder", "accountHolder", "holder_name")
+COUNTRY_KEYS = ("country", "country_code", "countryCode")
+ACCOUNT_KEYS = ("account_number", "accountNumber", "iban", "account_no")
+
+_trusted_keys_cache = {}
+_PEM_BLOCK = re.compile(r"-----BEGIN PUBLIC KEY-----(.+?)-----END PUBLIC KEY-----", re.S)
+
+def decode_notary_key(data: bytes) -> ec.EllipticCurvePublicKey:
+    """
+    Decode a P-256 key from a SEC1 point (compressed or uncompressed) or a DER SubjectPublicKeyInfo.
+    """
+    try:
+        if data[:1] == b"\x30":
+            key = load_der_public_key(data)
+        else:
+            key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), data)
+    except (ValueError, UnsupportedAlgorithm) as e:
+        raise ValueError(f"Unrecognised P-256 public key: {str(e)}")
+    if not isinstance(key, ec.EllipticCurvePublicKey) or not isinstance(key.curve, ec.SECP256R1):
+        raise ValueError("Not a P-256 public key")
+    return key
+
+def encode_notary_key(key: ec.EllipticCurvePublicKey) -> bytes:
+    """
+    SEC1 uncompressed encoding, 0x04 || X || Y.
+    """
+    return key.public_bytes(Encoding.X962, PublicFormat.UncompressedPoint)
+
+def verify_notary_signature(key: ec.EllipticCurvePublicKey, message: bytes, signature: bytes) -> bool:
+    """
+    Verify a 64 byte r || s or DER encoded ECDSA P-256/SHA-256 signature over message.
+    """
+    if len(signature) == 64:
+        signature = encode_dss_signature(int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big"))
+    try:
+        key.verify(signature, message, ec.ECDSA(hashes.SHA256()))
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+def parse_notary_keys(text: str) -> List[ec.EllipticCurvePublicKey]:
+    """
+    Parse PEM blocks and/or hex encoded P-256 keys separated by commas or newlines.
+    """
+    keys = [decode_notary_key(base64.b64decode("".join(block.split()))) for block in _PEM_BLOCK.findall(text)]
+    for entry in re.split(r"[,\s]+", _PEM_BLOCK.sub("", text)):
+        if entry:
+            keys.append(decode_notary_key(bytes.fromhex(entry)))
+    return keys
+
+def load_trusted_notary_keys(source: str = None) -> List[ec.EllipticCurvePublicKey]:
+    """
+    Load the trusted notary keys from TLSN_TRUSTED_NOTARY_KEYS (or `source`),
+    which is either the keys themselves or a path to a file holding them.
+    """
+    source = TLSN_TRUSTED_NOTARY_KEYS if source is None else source
+    if source not in _trusted_keys_cache:
+        text = source
+        if source and os.path.isfile(source):
+            with open(source, "r") as f:
+                text = f.read()
+        _trusted_keys_cache[source] = parse_notary_keys(text)
+    return _trusted_keys_cache[source]
+
+def canonical_json(value: Any) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def commitment_leaf(direction: str, start: int, end: int, salt: bytes, data: bytes) -> bytes:
+    return hashlib.sha256(b"tlsn-commitment:" + direction.encode("ascii") + b":" + start.to_bytes(8, "big") + end.to_bytes(8, "big") + salt + data).digest()
+
+def merkle_root(leaves: List[bytes]) -> bytes:
+    """
+    Root of a binary Merkle tree, an odd node at the end of a level is carried up unchanged.
+    """
+    if not leaves:
+        return hashlib.sha256(b"").digest()
+    level = list(leaves)
+    while len(level) > 1:
+        next_level = [hashlib.sha256(b"\x01" + level[i] + level[i + 1]).digest() for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+    return level[0]
+
+def _is_hex(value: Any) -> bool:
+    return isinstance(value, str) and re.fullmatch(r"(?:[0-9a-fA-F]{2})+", value) is not None
+
+def is_local_proof(proof_data: Any) -> bool:
+    """
+    Whether a parsed proof uses exactly the local layout above. Other proofs,
+    TLSNotary's included, are for the explorer to verify.
+    """
+    if not isinstance(proof_data, dict) or proof_data.get("version") != "0.1":
+        return False
+    session, substrings = proof_data.get("session"), proof_data.get("substrings")
+    if not isinstance(session, dict) or not isinstance(substrings, dict):
+        return False
+    header = session.get("header")
+    if not isinstance(header, dict) or not _is_hex(session.get("signature")) or not _is_hex(header.get("commitment_root")):
+        return False
+    if not all(isinstance(header.get(key), int) and not isinstance(header.get(key), bool) for key in ("sent_len", "recv_len")):
+        return False
+    if "notary_key" in proof_data and not _is_hex(proof_data["notary_key"]):
+        return False
+    commitments, openings = substrings.get("commitments"), substrings.get("openings")
+    return (
+        isinstance(commitments, list) and all(isinstance(leaf, str) for leaf in commitments)
+        and isinstance(openings, list) and all(isinstance(opening, dict) for opening in openings)
+    )
+
+def verify_proof_locally(proof_data: Dict[str, Any], trusted_keys: Optional[List[ec.EllipticCurvePublicKey]] = None) -> Dict[str, Any]:
+    """
+    Verify a TLSN proof in process.
+
+    Checks the notary signature over the session header against the trusted
+    notary keys, the commitment root, and every disclosed transcript range,
+    then pulls name, country and account number out of the received data.
+
+    Args:
+        proof_data (Dict[str, Any]): The parsed proof
+        trusted_keys (List[EllipticCurvePublicKey]): Trusted notary keys, defaults to load_trusted_notary_keys()
+
+    Returns:
+        Dict[str, Any]: A dictionary containing the verification result
+    """
+    trusted_keys = load_trusted_notary_keys() if trusted_keys is None else trusted_keys
+    if not trusted_keys:
+        return {"success": False, "error": "No trusted notary keys are configured"}
+
+    try:
+        header = proof_data["session"]["header"]
+        signature = bytes.fromhex(proof_data["session"]["signature"])
+        commitments = [bytes.fromhex(leaf) for leaf in proof_data["substrings"]["commitments"]]
+        openings = proof_data["substrings"]["openings"]
+        transcript_lengths = {"sent": int(header["sent_len"]), "received": int(header["recv_len"])}
+        commitment_root = bytes.fromhex(header["commitment_root"])
+    except (KeyError, TypeError, ValueError) as e:
+        return {"success": False, "error": f"Malformed TLSN proof: {str(e)}"}
+
+    candidates = trusted_keys
+    if proof_data.get("notary_key"):
+        try:
+            claimed_key = encode_notary_key(decode_notary_key(bytes.fromhex(proof_data["notary_key"])))
+        except ValueError as e:
+            return {"success": False, "error": f"Invalid notary key: {str(e)}"}
+        candidates = [key for key in trusted_keys if encode_notary_key(key) == claimed_key]
+        if not candidates:
+            return {"success": False, "error": "The proof was notarized by an untrusted notary"}
+
+    header_bytes = canonical_json(header)
+    notary_key = next((key for key in candidates if verify_notary_signature(key, header_bytes, signature)), None)
+    if notary_key is None:
+        return {"success": False, "error": "Invalid notary signature"}
+
+    if merkle_root(commitments) != commitment_root:
+        return {"success": False, "error": "Commitments do not match the signed commitment root"}
+
+    disclosed = {"sent": [], "received": []}
+    for opening in openings:
+        try:
+            direction = opening["direction"]
+            start, end = int(opening["start"]), int(opening["end"])
+            data = opening["data"].encode("utf-8")
+            leaf = commitment_leaf(direction, start, end, bytes.fromhex(opening["salt"]), data)
+            index = int(opening["index"])
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return {"success": False, "error": f"Malformed transcript opening: {str(e)}"}
+        if direction not in transcript_lengths:
+            return {"success": False, "error": f"Unknown transcript direction: {direction}"}
+        if not (0 <= start < end <= transcript_lengths[direction]) or len(data) != end - start:
+            return {"success": False, "error": f"Opening {start}..{end} is outside the {direction} transcript"}
+        if not (0 <= index < len(commitments)) or commitments[index] != leaf:
+            return {"success": False, "error": f"Opening {start}..{end} does not match its commitment"}
+        disclosed[direction].append((start, end, opening["data"]))
+
+    fields = extract_disclosed_fields([text for _, _, text in sorted(disclosed["received"])])
+    return {
+        "success": True,
+        "verified_by": "local",
+        "verification_result": {
+            "server_name": header.get("server_name"),
+            "time": header.get("time"),
+            "notary_key": encode_notary_key(notary_key).hex(),
+            "sent_ranges": [[start, end] for start, end, _ in sorted(disclosed["sent"])],
+            "received_ranges": [[start, end] for start, end, _ in sorted(disclosed["received"])],
+        },
+        **fields
+    }
+
+def _find_key(value: Any, keys: Tuple[str, ...]) -> Optional[str]:
+    if isinstance(value, dict):
+        for key in keys:
+            if isinstance(value.get(key), (str, int)) and value[key] != "":
+                return str(value[key])
+        for child in value.values():
+            found = _find_key(child, keys)
+            if found is not None:
+                return found
+    elif isinstance(value, list):
+        for child in value:
+            found = _find_key(child, keys)
+            if found is not None:
+                return found
+    return None
+
+def extract_disclosed_fields(received_texts: List[str]) -> Dict[str, str]:
+    """
+    Pull name, country and account number out of disclosed response data.
+
+    JSON bodies are searched structurally, anything else falls back to
+    matching "key": "value" pairs in the raw text.
+    """
+    documents = []
+    for text in received_texts:
+        body = text.split("\r\n\r\n", 1)[1] if "\r\n\r\n" in text else text
+        try:
+            documents.append(json.loads(body))
+        except ValueError:
+            continue
+
+    joined = "\n".join(received_texts)
+    fields = {}
+    for field, keys in (("name", NAME_KEYS), ("country", COUNTRY_KEYS), ("account_number", ACCOUNT_KEYS)):
+        value = next((found for found in (_find_key(doc, keys) for doc in documents) if found is not None), None)
+        if value is None:
+            pattern = r'"(?:%s)"\s*:\s*"([^"]+)"' % "|".join(re.escape(key) for key in keys)
+            match = re.search(pattern, joined)
+            value = match.group(1) if match else None
+        if value is None and field == "name":
+            first = next((found for found in (_find_key(doc, ("first_name", "firstName")) for doc in documents) if found), None)
+            last = next((found for found in (_find_key(doc, ("last_name", "lastName")) for doc in documents) if found), None)
+            value = " ".join(part for part in (first, last) if part) or None
+        fields[field] = value if value is not None else "Not found"
+    return fields
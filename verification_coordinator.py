@@ -0,0 +1,171 @@
+import asyncio
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from telemetry import annotate
+
+# Verifications are expensive and the same one is often asked for twice: an
+# agent calls a skill as a tool and the handler calls it again, or the user
+# double-clicks. The coordinator runs a verification once per request key
+# (the proof digest, the email hash, the PDF URL): concurrent calls with the
+# same key wait for the one in flight and share its result, and successful
+# results are remembered for VERIFY_MEMO_SECONDS. Failed results are only
+# shared with the calls that were waiting, so a transient error isn't
+# repeated back for the whole window.
+
+VERIFY_MEMO_SECONDS = float(os.getenv("VERIFY_MEMO_SECONDS", 5 * 60))
+MAX_MEMO_ENTRIES = 1024
+COUNTERS = ("calls", "executions", "coalesced", "memo_hits", "errors")
+
+_default_coordinator = None
+_default_coordinator_lock = threading.Lock()
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class VerificationCoordinator:
+    """
+    Single-flight and memo in front of the verification skills, keyed on
+    (kind, key). stats() has the counters per kind: calls, executions (the
+    verifications actually run), coalesced (calls that joined one in
+    flight), memo_hits and errors.
+    """
+
+    def __init__(self, memo_seconds: float = VERIFY_MEMO_SECONDS, max_entries: int = MAX_MEMO_ENTRIES):
+        self.memo_seconds = memo_seconds
+        self.max_entries = max_entries
+        self._memo = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _count(self, kind: str, counter: str) -> None:
+        # Caller holds self._lock
+        stats = self._stats.get(kind)
+        if stats is None:
+            stats = self._stats[kind] = dict.fromkeys(COUNTERS, 0)
+        stats[counter] += 1
+
+    def _join(self, kind: str, key: str):
+        # (memoized result, None, False), (None, flight to wait for, False) or (None, flight to run, True)
+        with self._lock:
+            self._count(kind, "calls")
+            entry = self._memo.get((kind, key))
+            if entry is not None and entry[0] > time.monotonic():
+                self._memo.move_to_end((kind, key))
+                self._count(kind, "memo_hits")
+                annotate({"verify.dedup": "memo"})
+                return entry[1], None, False
+            in_flight = self._in_flight.get((kind, key))
+            if in_flight is not None:
+                self._count(kind, "coalesced")
+                annotate({"verify.dedup": "coalesced"})
+                return None, in_flight, False
+            self._count(kind, "executions")
+            in_flight = self._in_flight[(kind, key)] = _InFlight()
+        annotate({"verify.dedup": "miss"})
+        return None, in_flight, True
+
+    def _complete(self, kind: str, key: str, in_flight: _InFlight) -> None:
+        with self._lock:
+            del self._in_flight[(kind, key)]
+            if in_flight.error is not None:
+                self._count(kind, "errors")
+            elif self.memo_seconds > 0 and isinstance(in_flight.result, dict) and in_flight.result.get("success"):
+                self._memo[(kind, key)] = (time.monotonic() + self.memo_seconds, in_flight.result)
+                self._memo.move_to_end((kind, key))
+                while len(self._memo) > self.max_entries:
+                    self._memo.popitem(last=False)
+        in_flight.done.set()
+
+    @staticmethod
+    def _shared(result: Any) -> Any:
+        # Every caller gets its own top level dict, so adding keys doesn't leak between them
+        return copy.copy(result) if isinstance(result, dict) else result
+
+    def run(self, kind: str, key: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        func(*args, **kwargs), or the result of the same (kind, key) call in
+        flight or memoized. An exception is raised to every caller that waited for it.
+        """
+        memoized, in_flight, leader = self._join(kind, key)
+        if in_flight is None:
+            return self._shared(memoized)
+        if not leader:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return self._shared(in_flight.result)
+        try:
+            in_flight.result = func(*args, **kwargs)
+        except BaseException as e:
+            in_flight.error = e if isinstance(e, Exception) else RuntimeError("The verification was interrupted")
+            raise
+        finally:
+            self._complete(kind, key, in_flight)
+        return self._shared(in_flight.result)
+
+    async def run_async(self, kind: str, key: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        run() for a coroutine function, sharing flights and the memo with run().
+        """
+        memoized, in_flight, leader = self._join(kind, key)
+        if in_flight is None:
+            return self._shared(memoized)
+        if not leader:
+            await asyncio.to_thread(in_flight.done.wait)
+            if in_flight.error is not None:
+                raise in_flight.error
+            return self._shared(in_flight.result)
+        try:
+            in_flight.result = await func(*args, **kwargs)
+        except BaseException as e:
+            # A cancelled leader still releases the callers waiting on it
+            in_flight.error = e if isinstance(e, Exception) else RuntimeError("The verification was cancelled")
+            raise
+        finally:
+            self._complete(kind, key, in_flight)
+        return self._shared(in_flight.result)
+
+    def invalidate(self, kind: str = None, key: str = None) -> None:
+        with self._lock:
+            if kind is None:
+                self._memo.clear()
+            elif key is None:
+                for memo_key in [memo_key for memo_key in self._memo if memo_key[0] == kind]:
+                    del self._memo[memo_key]
+            else:
+                self._memo.pop((kind, key), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {kind: dict(counters) for kind, counters in self._stats.items()}
+            memo_entries = len(self._memo)
+            in_flight = len(self._in_flight)
+        for counters in stats.values():
+            counters["deduplicated"] = counters["coalesced"] + counters["memo_hits"]
+        return {"kinds": stats, "memo_entries": memo_entries, "in_flight": in_flight}
+
+def get_verification_coordinator() -> VerificationCoordinator:
+    """
+    Return the process wide coordinator, creating it on first use.
+    """
+    global _default_coordinator
+    with _default_coordinator_lock:
+        if _default_coordinator is None:
+            _default_coordinator = VerificationCoordinator()
+        return _default_coordinator
+
+def request_key(*parts: Optional[str]) -> str:
+    """
+    A key for a request made of strings, e.g. a URL and a password, that keeps none of them.
+    """
+    return hashlib.sha256("\0".join(part or "" for part in parts).encode("utf-8")).hexdigest()
@@ -1,70 +1,139 @@
-import json
-import requests
-from typing import Dict, Any, Annotated
+import os
+import httpx
+import http_client
+from typing import Dict, Any, Annotated, Optional, Union
+from application_store import get_application_store
+from telemetry import annotate, traced_skill
+from tlsn_proof import ParsedProof, as_proof
+from verification_coordinator import get_verification_coordinator
+from tlsn_verifier import is_local_proof, load_trusted_notary_keys, verify_proof_locally
 
+TLSN_EXPLORER_URL = os.getenv("TLSN_EXPLORER_URL", "https://explorer.tlsn.org")
+# Upload to the explorer when a proof can't be verified in process, either
+# because no trusted notary keys are configured or the proof format is unknown
+TLSN_REMOTE_FALLBACK = os.getenv("TLSN_REMOTE_FALLBACK", "true").lower() in ("1", "true", "yes")
+TLSN_VERIFY_TIMEOUT = httpx.Timeout(connect=5.0, read=60.0, write=30.0, pool=10.0)
+
+@traced_skill("tlsn.verify", lambda result: {"success": result["success"], "tlsn.verified_by": result.get("verified_by")})
 def verify_tlsn_proof(proof_json: Annotated[str, "JSON content of the TLSN proof"]) -> Dict[str, Any]:
     """
-    Verify a TLSN proof by uploading it to explorer.tlsn.org
+    Verify a TLSN proof against the trusted notary keys, falling back to
+    uploading it to explorer.tlsn.org when it can't be verified locally
     
     Args:
-        proof_json (str): The JSON content of the TLSN proof
+        proof_json (str): The JSON content of the TLSN proof, or the ParsedProof
+            of an upload that has already been decoded
         
     Returns:
         Dict[str, Any]: A dictionary containing the verification result
     """
     try:
-        # Parse the JSON to ensure it's valid
-        proof_data = json.loads(proof_json)
-        
-        # Upload to explorer.tlsn.org
-        # This is a simplified implementation - you may need to adjust based on actual API
-        response = requests.post(
-            "https://explorer.tlsn.org/api/verify",
-            json=proof_data,
-            headers={"Content-Type": "application/json"}
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            # Extract relevant information like name and country
-            return {
-                "success": True,
-                "verification_result": result,
-                "name": result.get("name", "Not found"),
-                "country": result.get("country", "Not found"),
-                "account_number": result.get("account_number", "Not found")
-            }
-        else:
-            return {
-                "success": False,
-                "error": f"Verification failed: {response.status_code}",
-                "message": response.text
-            }
-    except json.JSONDecodeError:
-        return {"success": False, "error": "Invalid JSON format"}
+        proof = as_proof(proof_json)
+        annotate({"tlsn.proof_bytes": proof.size})
+        # The same proof verified again, e.g. by the assistant and the handler, shares one verification
+        return get_verification_coordinator().run("tlsn", proof.digest, _verify_proof, proof.data)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+async def verify_tlsn_proof_async(proof_json: Union[str, ParsedProof]) -> Dict[str, Any]:
+    """
+    Async version of verify_tlsn_proof(), so proofs can be verified concurrently.
+    """
+    try:
+        proof = as_proof(proof_json)
+        return await get_verification_coordinator().run_async("tlsn", proof.digest, _verify_proof_async, proof.data)
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def save_tlsn_proof(proof_json: str) -> Dict[str, Any]:
+def _verify_proof(proof_data: Dict[str, Any]) -> Dict[str, Any]:
+    local_result = _verify_locally(proof_data)
+    if local_result is not None:
+        return local_result
+    
+    # Upload to explorer.tlsn.org
+    # This is a simplified implementation - you may need to adjust based on actual API
+    # Verification has no side effects, so the upload is safe to retry
+    response = http_client.post(
+        f"{TLSN_EXPLORER_URL}/api/verify",
+        json=proof_data,
+        headers={"Content-Type": "application/json"},
+        timeout=TLSN_VERIFY_TIMEOUT,
+        retry=True
+    )
+    return _verification_result(response)
+
+async def _verify_proof_async(proof_data: Dict[str, Any]) -> Dict[str, Any]:
+    local_result = _verify_locally(proof_data)
+    if local_result is not None:
+        return local_result
+    response = await http_client.apost(
+        f"{TLSN_EXPLORER_URL}/api/verify",
+        json=proof_data,
+        headers={"Content-Type": "application/json"},
+        timeout=TLSN_VERIFY_TIMEOUT,
+        retry=True
+    )
+    return _verification_result(response)
+
+def _verify_locally(proof_data: Any) -> Dict[str, Any] | None:
     """
-    Save TLSN proof to a file
+    Verify in process when possible. Returns None when the caller should fall
+    back to the explorer.
+    """
+    if is_local_proof(proof_data) and load_trusted_notary_keys():
+        return verify_proof_locally(proof_data)
+    if TLSN_REMOTE_FALLBACK:
+        return None
+    if not load_trusted_notary_keys():
+        return {"success": False, "error": "No trusted notary keys are configured and remote verification is disabled"}
+    return {"success": False, "error": "Unsupported TLSN proof format and remote verification is disabled"}
+
+def _verification_result(response: httpx.Response) -> Dict[str, Any]:
+    if response.status_code == 200:
+        result = response.json()
+        # Extract relevant information like name and country
+        return {
+            "success": True,
+            "verification_result": result,
+            "name": result.get("name", "Not found"),
+            "country": result.get("country", "Not found"),
+            "account_number": result.get("account_number", "Not found")
+        }
+    else:
+        return {
+            "success": False,
+            "error": f"Verification failed: {response.status_code}",
+            "message": response.text
+        }
+
+def save_tlsn_proof(proof_json: Union[str, ParsedProof], application_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Save TLSN proof to the application store, or to tlsn_proof.json when no
+    application ID is given
     
     Args:
-        proof_json (str): The JSON content of the TLSN proof
+        proof_json (str | ParsedProof): The JSON content of the TLSN proof, or its ParsedProof
+        application_id (str): The application the proof belongs to (optional)
         
     Returns:
-        Dict[str, Any]: Result of the save operation
+        Dict[str, Any]: Result of the save operation, with the proof's canonical digest
     """
     try:
-        # Parse JSON to validate format
-        json.loads(proof_json)
+        # Decoding it also validates the format
+        proof = as_proof(proof_json)
+        
+        if application_id is not None:
+            store = get_application_store()
+            if store.get(application_id) is None:
+                return {"success": False, "error": f"Unknown application: {application_id}"}
+            store.save_artifact(application_id, "tlsn_proof", proof.to_json())
+            store.update(application_id, tlsn_proof_saved=True, tlsn_proof_digest=proof.digest)
+            return {"success": True, "message": "TLSN proof saved successfully", "digest": proof.digest}
         
         # Save to file
         with open("tlsn_proof.json", "w") as f:
-            f.write(proof_json)
+            f.write(proof.to_json())
         
-        return {"success": True, "message": "TLSN proof saved successfully"}
-    except json.JSONDecodeError:
-        return {"success": False, "error": "Invalid JSON format"}
+        return {"success": True, "message": "TLSN proof saved successfully", "digest": proof.digest}
     except Exception as e:
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+        return {"success": False, "error": str(e)}